@@ -0,0 +1,62 @@
+# app/api/conditional.py
+"""
+Suporte a GET condicional (ETag / If-None-Match).
+
+As ETags são fracas e derivadas apenas de carimbos de tempo e contagens obtidos
+com consultas agregadas (sem carregar os objetos completos). Se o cliente já
+possui a versão atual, a resposta 304 é devolvida antes de montar o payload.
+"""
+import hashlib
+from typing import Any, Optional, Tuple
+
+from fastapi import Request, Response, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+
+def _carimbo(model: Any):
+    # data_atualizacao só é preenchida após o primeiro UPDATE
+    return func.coalesce(model.data_atualizacao, model.data_criacao)
+
+
+def versao_registro(db: Session, model: Any, id: Any) -> Optional[Tuple[Any, ...]]:
+    """Versão de um único registro; None se o registro não existir."""
+    return db.query(model.id, _carimbo(model)).filter(model.id == id).first()
+
+
+def versao_objeto(obj: Any) -> Tuple[Any, ...]:
+    """
+    Mesma versão de `versao_registro`, tirada de um objeto já carregado (ex.: do
+    cache), sem consulta ao banco.
+    """
+    return obj.id, obj.data_atualizacao or obj.data_criacao
+
+
+def versao_colecao(db: Session, model: Any, *criterios: Any) -> Tuple[Any, ...]:
+    """Versão de um conjunto filtrado: maior carimbo de tempo e quantidade de registros."""
+    return tuple(db.query(func.max(_carimbo(model)), func.count(model.id)).filter(*criterios).one())
+
+
+def etag_fraco(*partes: Any) -> str:
+    digest = hashlib.blake2b(repr(partes).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_confere(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Comparação fraca: ignora o prefixo W/
+    alvo = etag.removeprefix("W/")
+    return any(candidato.strip().removeprefix("W/") == alvo for candidato in if_none_match.split(","))
+
+
+def resposta_nao_modificada(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Retorna uma resposta 304 se o If-None-Match do cliente confere com a ETag.
+    Caso contrário, anexa a ETag à resposta que o endpoint vai montar e retorna None.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_confere(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
@@ -1,9 +1,8 @@
 # app/api/deps.py
 from typing import Generator, Optional
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
+from fastapi import Depends, HTTPException, Request, Security, status
+from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
@@ -11,11 +10,14 @@ from app.core import security
 from app.core.config import settings
 from app.database import AsyncSessionLocal  # se realmente precisar da factory
 from app.models.usuario import Usuario # Corrected: Models are in app.models.py
-from app.crud import crud_usuario # This should point to the instance in crud_usuario.py
-from app.schemas.token_schemas import TokenData # Corrected: Import TokenData from token_schemas.py
+from app.crud.crud_usuario import crud_usuario
+from app.schemas.token_schemas import UsuarioToken
+from app.services.rate_limiter import ESTADO_TOKEN
+from app.services.refresh_tokens import refresh_token_store
 
 reusable_oauth2 = OAuth2PasswordBearer(
-    tokenUrl=f"{settings.API_V1_STR}/auth/token" # Corrected tokenUrl to match auth endpoint
+    tokenUrl=f"{settings.API_V1_STR}/auth/token", # Corrected tokenUrl to match auth endpoint
+    scopes=security.ESCOPOS
 )
 
 def get_db() -> Generator:
@@ -25,54 +27,68 @@ def get_db() -> Generator:
     finally:
         db.close()
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(reusable_oauth2)
-) -> Usuario:
-    try:
+async def get_token_payload(request: Request, token: str = Depends(reusable_oauth2)) -> dict:
+    """Access token válido e não revogado (assinatura, tipo e época; só CPU e cache local)."""
+    # Os middlewares (limite, idempotência) já podem ter verificado o mesmo token
+    verificado = getattr(request.state, ESTADO_TOKEN, None)
+    if verificado is not None and verificado[0] == token and verificado[1] is not None:
+        payload = verificado[1]
+    else:
         payload = security.decode_token(token)
-        if payload is None:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Could not validate credentials (payload is None)",
-            )
-        # Ensure that the payload keys match what TokenData expects (e.g., 'email' or 'sub')
-        # The TokenData schema expects 'email'. The token is created with 'sub'.
-        # Let's assume 'sub' in payload is the email for TokenData.
-        email_from_payload = payload.get("sub")
-        if email_from_payload is None:
-             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Could not validate credentials (sub is None in token)",
-            )
-        token_data = TokenData(email=email_from_payload)
-
-    except (jwt.JWTError, ValidationError) as e:
+    if payload is None or payload.get("type") == security.TIPO_REFRESH or payload.get("sub") is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials (JWTError or ValidationError)",
+            detail="Could not validate credentials",
         )
-    
-    # token_data.sub was used before, but TokenData has 'email'. 
-    # Assuming token_data.email is the correct field after instantiation.
-    user = crud_usuario.get_by_email(db, email=token_data.email) 
+    # Revogação (logout em todos os dispositivos, usuário desativado): época em cache, sem banco
+    if await refresh_token_store.token_revogado(payload):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Sessão revogada")
+    return payload
+
+async def get_current_user(
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+) -> Usuario:
+    """Linha do usuário no banco; só para rotas que precisam do perfil completo (ex.: /users/me)."""
+    user = crud_usuario.get_by_email(db, email=payload["sub"])
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
-def get_current_active_user(
-    current_user: Usuario = Depends(get_current_user)
-) -> Usuario:
-    if not crud_usuario.is_active(current_user): # crud_usuario is an instance of CRUDUsuario
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
-    return current_user
-
-def get_current_active_superuser(
-    current_user: Usuario = Depends(get_current_active_user)
-) -> Usuario:
-    if not crud_usuario.is_superuser(current_user): # crud_usuario is an instance of CRUDUsuario
+async def get_current_active_user(
+    security_scopes: SecurityScopes,
+    payload: dict = Depends(get_token_payload)
+) -> UsuarioToken:
+    """
+    Usuário autenticado a partir dos claims do token, sem consulta ao banco.
+    Usado com `Security(get_current_active_user, scopes=[...])`, exige os escopos
+    (admin, manager, waiter, cashier) do papel do usuário.
+    """
+    try:
+        current_user = UsuarioToken(
+            id=payload["uid"],
+            email=payload["sub"],
+            papel=payload["role"],
+            escopos=payload.get("scopes", []),
+            is_superuser=payload.get("su", False),
+        )
+    except (KeyError, ValidationError):
+        # Token emitido antes dos claims de autorização: basta logar de novo
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="The user doesn\"t have enough privileges"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token sem claims de autorização; faça login novamente",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    faltando = [escopo for escopo in security_scopes.scopes if escopo not in current_user.escopos]
+    if faltando:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Permissão insuficiente (requer: {', '.join(faltando)})",
+            headers={"WWW-Authenticate": f'Bearer scope="{security_scopes.scope_str}"'},
         )
     return current_user
 
+async def get_current_active_superuser(
+    current_user: UsuarioToken = Security(get_current_active_user, scopes=["admin"])
+) -> UsuarioToken:
+    return current_user
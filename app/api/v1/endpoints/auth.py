@@ -2,15 +2,18 @@
 from datetime import timedelta
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, schemas
 from app.api import deps
-from app.core import security
+from app.schemas.token_schemas import UsuarioToken
+from app.core import jwt_keys, security
 from app.core.config import settings
 from app.models.usuario import Usuario as DBUsuario
+from app.schemas.token_schemas import RefreshTokenRequest
+from app.services.refresh_tokens import SessaoInvalida, SessoesIndisponiveis, refresh_token_store
 from app.schemas.usuario_schemas import UsuarioCreateSchemas, UsuarioUpdateSchemas, UsuarioSchemas, UsuarioInDBBaseSchemas, UsuarioBaseSchemas
 
 router = APIRouter()
@@ -31,15 +34,55 @@ async def login_access_token(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email ou senha incorretos")
     elif not crud.usuario.is_active(user):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuário inativo")
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    try:
+        access_token, refresh_token = await refresh_token_store.emitir(user.email, security.claims_do_usuario(user))
+    except SessoesIndisponiveis as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     return {
-        "access_token": security.create_access_token(
-            user.email, expires_delta=access_token_expires
-        ),
+        "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer",
     }
 
 
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(body: RefreshTokenRequest) -> Any:
+    """
+    Troca o refresh token por um novo par. O refresh token é de uso único:
+    reapresentar um token já trocado revoga todas as sessões derivadas do mesmo login.
+    """
+    try:
+        access_token, refresh_token = await refresh_token_store.rotacionar(body.refresh_token)
+    except SessaoInvalida as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+    except SessoesIndisponiveis as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(body: RefreshTokenRequest) -> None:
+    """Encerra a sessão deste dispositivo (revoga a família do refresh token)."""
+    try:
+        await refresh_token_store.revogar(body.refresh_token)
+    except SessaoInvalida:
+        pass  # Token já inválido: a sessão já está encerrada
+
+
+@router.post("/logout/todos", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_todos(current_user: UsuarioToken = Depends(deps.get_current_active_user)) -> None:
+    """Encerra todas as sessões do usuário; access tokens emitidos antes deixam de valer em segundos."""
+    if await refresh_token_store.revogar_usuario(current_user.email) is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Armazenamento de sessões indisponível")
+
+
+@router.get("/jwks.json")
+async def read_jwks(response: Response) -> Any:
+    """Chaves públicas (JWKS) para verificar os tokens desta API; vazio com HS256."""
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return jwt_keys.jwks()
+
+
 @router.post("/login/test-token", response_model=UsuarioSchemas)
 async def test_token(current_user: DBUsuario = Depends(deps.get_current_user)) -> Any:
     """
@@ -64,16 +107,18 @@ async def create_user_open(
             detail="The user with this email already exists in the system.",
         )
     user_in.is_superuser = False
-    user = await crud.usuario.create(db, obj_in=user_in)
+    # bcrypt no pool limitado, fora do event loop
+    hashed_password = await security.gerar_hash_senha(user_in.password)
+    user = await crud.usuario.create(db, obj_in=user_in, hashed_password=hashed_password)
     return user
 
 
 @router.get("/users/me", response_model=UsuarioSchemas)
 async def read_user_me(
     db: AsyncSession = Depends(deps.get_db),
-    current_user: DBUsuario = Depends(deps.get_current_active_user)
+    current_user: DBUsuario = Depends(deps.get_current_user)
 ) -> Any:
     """
-    Get current user.
+    Get current user (perfil completo, lido do banco).
     """
     return current_user
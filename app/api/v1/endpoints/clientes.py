@@ -2,12 +2,15 @@
 from typing import List, Any, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
-from app.models.usuario import Usuario
+from app.schemas.token_schemas import UsuarioToken
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_objeto
+from app.models.cliente import Cliente
+from app.services.cache_service import cliente_cache
 
 router = APIRouter()
 
@@ -16,7 +19,7 @@ def create_cliente(
     *,
     db: Session = Depends(deps.get_db),
     cliente_in: schemas.ClienteCreate,
-    current_user:Usuario = Depends(deps.get_current_active_user) # Apenas usuários logados podem criar clientes
+    current_user:UsuarioToken = Depends(deps.get_current_active_user) # Apenas usuários logados podem criar clientes
 ) -> Any:
     """
     Cria um novo cliente.
@@ -37,7 +40,7 @@ def read_clientes(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user:Usuario = Depends(deps.get_current_active_user)
+    current_user:UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera a lista de clientes.
@@ -46,17 +49,23 @@ def read_clientes(
     return clientes
 
 @router.get("/{cliente_id}", response_model=schemas.Cliente)
-def read_cliente_by_id(
+async def read_cliente_by_id(
     cliente_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_user:Usuario = Depends(deps.get_current_active_user)
+    current_user:UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera um cliente pelo seu ID.
     """
-    cliente = crud.cliente.get(db=db, id=cliente_id)
+    # A versão da ETag vem do próprio objeto em cache: sem consulta ao banco num acerto
+    cliente = await cliente_cache.get(db, id=cliente_id)
     if not cliente:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cliente não encontrado")
+    nao_modificada = resposta_nao_modificada(request, response, etag_fraco("cliente", versao_objeto(cliente)))
+    if nao_modificada:
+        return nao_modificada
     return cliente
 
 @router.put("/{cliente_id}", response_model=schemas.Cliente)
@@ -65,7 +74,7 @@ def update_cliente(
     db: Session = Depends(deps.get_db),
     cliente_id: uuid.UUID,
     cliente_in: schemas.ClienteUpdate,
-    current_user:Usuario = Depends(deps.get_current_active_user)
+    current_user:UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Atualiza um cliente.
@@ -91,7 +100,7 @@ def delete_cliente(
     *,
     db: Session = Depends(deps.get_db),
     cliente_id: uuid.UUID,
-    current_user:Usuario = Depends(deps.get_current_active_superuser) # Apenas superusuários podem deletar clientes
+    current_user:UsuarioToken = Depends(deps.get_current_active_superuser) # Apenas superusuários podem deletar clientes
 ) -> Any:
     """
     Deleta um cliente.
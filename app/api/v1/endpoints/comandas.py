@@ -1,17 +1,31 @@
 # app/api/v1/endpoints/comandas.py
 import uuid
 from decimal import Decimal
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
+from app.schemas.token_schemas import UsuarioToken
+from app.core.config import settings
+from app.core.qr_token import eh_qr_token, verificar_qr_token
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_colecao, versao_objeto
 from app.schemas.comanda_schemas import StatusComanda # Importar o Enum
 
-from app.models.usuario import Usuario
+from app.models.comanda import Comanda
+from app.models.mesa import Mesa
+from app.models.pagamento import Pagamento
+from app.models.pedido import Pedido
 from app.schemas.comanda_schemas import ComandaDigital
+from app.services.cache_service import comanda_cache
+from app.services.comanda_digital_service import comanda_digital_service
+from app.services.qr_code_filter import qr_code_filter
+from app.services.realtime import SSE_HEADERS, Assinatura, formatar_sse_comanda_digital, realtime_hub, stream_sse, topico_mesa
+from app.services.rate_limiter import ip_do_cliente
 
 # from app.services.redis_service import redis_client # Para publicar eventos no Redis
 # import json # Para formatar mensagens Redis
@@ -24,17 +38,31 @@ router = APIRouter()
 
 @router.get("/", response_model=List[schemas.Comanda])
 def read_comandas(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
     status_comanda: Optional[StatusComanda] = None,
     id_mesa: Optional[uuid.UUID] = None,
     id_cliente: Optional[uuid.UUID] = None,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera a lista de comandas. Pode ser filtrada por status, mesa ou cliente.
+    Responde 304 se o If-None-Match confere com a versão atual da lista.
     """
+    if id_mesa:
+        criterios = [Comanda.id_mesa == id_mesa]
+    elif id_cliente:
+        criterios = [Comanda.id_cliente_associado == id_cliente]
+    else:
+        criterios = [Comanda.status_comanda == status_comanda] if status_comanda else []
+    etag = etag_fraco("comandas", id_mesa, id_cliente, status_comanda, skip, limit, versao_colecao(db, Comanda, *criterios))
+    nao_modificada = resposta_nao_modificada(request, response, etag)
+    if nao_modificada:
+        return nao_modificada
+
     if id_mesa:
         comandas = crud.comanda.get_multi_by_mesa(db, mesa_id=id_mesa, skip=skip, limit=limit)
     elif id_cliente:
@@ -44,18 +72,30 @@ def read_comandas(
     return comandas
 
 @router.get("/{comanda_id}", response_model=schemas.Comanda)
-def read_comanda_by_id(
+async def read_comanda_by_id(
     comanda_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user) # Acesso restrito
+    current_user: UsuarioToken = Depends(deps.get_current_active_user) # Acesso restrito
 ) -> Any:
     """
     Recupera uma comanda pelo seu ID.
     """
-    comanda = crud.comanda.get(db=db, id=comanda_id)
+    # A versão da comanda vem do objeto em cache; pedidos e pagamentos, das agregadas.
+    # Consultas da Session síncrona (agregadas e relacionamentos lazy) vão para o threadpool
+    comanda = await comanda_cache.get(db, id=comanda_id)
     if not comanda:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comanda não encontrada")
-    return comanda
+    versoes = await run_in_threadpool(lambda: (
+        versao_colecao(db, Pedido, Pedido.id_comanda == comanda_id),
+        versao_colecao(db, Pagamento, Pagamento.id_comanda == comanda_id)
+    ))
+    etag = etag_fraco("comanda", versao_objeto(comanda), *versoes)
+    nao_modificada = resposta_nao_modificada(request, response, etag)
+    if nao_modificada:
+        return nao_modificada
+    return await run_in_threadpool(schemas.Comanda.model_validate, comanda)
 
 @router.put("/{comanda_id}", response_model=schemas.Comanda)
 def update_comanda(
@@ -63,7 +103,7 @@ def update_comanda(
     db: Session = Depends(deps.get_db),
     comanda_id: uuid.UUID,
     comanda_in: schemas.ComandaUpdate,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Atualiza uma comanda (ex: status, observações).
@@ -85,7 +125,7 @@ def update_comanda(
 def solicitar_fechamento_comanda(
     comanda_id: uuid.UUID,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user) # Garçom ou cliente (se autenticado)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user) # Garçom ou cliente (se autenticado)
 ) -> Any:
     """
     Cliente ou garçom solicita o fechamento da comanda para pagamento.
@@ -99,46 +139,94 @@ def solicitar_fechamento_comanda(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return comanda
 
+async def _resolver_mesa_qr(db: Session, qr_code_hash: str) -> Tuple[uuid.UUID, Optional[Mesa]]:
+    """
+    Identifica a mesa do QR Code: tokens assinados sem consulta ao banco; hashes
+    legados pela coluna qr_code_hash (a Mesa carregada é retornada para reuso).
+    """
+    mesa_id = verificar_qr_token(qr_code_hash)
+    if mesa_id is not None:
+        return mesa_id, None
+    if eh_qr_token(qr_code_hash) or not await qr_code_filter.pode_existir(db, qr_code_hash):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR Code inválido ou mesa não encontrada.")
+    # Hash legado (anterior aos tokens assinados): resolve pela coluna qr_code_hash
+    mesa = await run_in_threadpool(crud.mesa.get_by_qr_code_hash, db, qr_code_hash=qr_code_hash)
+    if not mesa:
+        qr_code_filter.registrar_ausencia(qr_code_hash)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR Code inválido ou mesa não encontrada.")
+    return mesa.id, mesa
+
 # Endpoint para o cliente visualizar a comanda digital (via QR Code hash)
 # Este endpoint deve ser público ou ter uma forma de autenticação leve para o cliente.
 @router.get("/digital/{qr_code_hash}", response_model=ComandaDigital) # Ajustar response_model para o que o cliente vê
-def get_comanda_digital_via_qr(
+async def get_comanda_digital_via_qr(
     qr_code_hash: str,
     db: Session = Depends(deps.get_db)
 ) -> Any:
     """
     Endpoint público para o cliente visualizar sua comanda via QR Code.
+    O token assinado do QR Code identifica a mesa sem consulta ao banco; o snapshot
+    pré-serializado vem do Redis e, sem snapshot (ou Redis fora), é montado a partir do banco.
     """
-    mesa = crud.mesa.get_by_qr_code_hash(db, qr_code_hash=qr_code_hash)
+    mesa_id, mesa = await _resolver_mesa_qr(db, qr_code_hash)
+
+    snapshot = await comanda_digital_service.obter_snapshot(mesa_id)
+    if snapshot is not None:
+        return Response(content=snapshot, media_type="application/json")
+
+    def montar() -> Tuple[Optional[Mesa], Optional[ComandaDigital]]:
+        # Consultas da Session síncrona: rodam no threadpool, fora do event loop
+        mesa_atual = mesa or crud.mesa.get(db, id=mesa_id)
+        if not mesa_atual:
+            return None, None
+        return mesa_atual, comanda_digital_service.montar_comanda_digital(db, mesa_atual)
+
+    mesa, comanda_digital_data = await run_in_threadpool(montar)
     if not mesa:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR Code inválido ou mesa não encontrada.")
-    
-    comanda_ativa = crud.comanda.get_comanda_ativa_by_mesa(db, mesa_id=mesa.id)
-    if not comanda_ativa:
+
+    if not comanda_digital_data:
         # Se a mesa estiver ocupada mas sem comanda ativa, pode ser um estado de erro ou a mesa acabou de ser aberta
         # Poderia retornar um status indicando para aguardar ou contatar o garçom.
         # Por ora, se não há comanda ativa, não há o que mostrar.
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhuma comanda ativa encontrada para esta mesa.")
 
-    # Calcular valor restante
-    valor_restante = comanda_ativa.valor_total_calculado - comanda_ativa.valor_pago - comanda_ativa.valor_fiado
-    if valor_restante < 0: valor_restante = Decimal("0.00")
-
-    # Montar o schema de ComandaDigital
-    # Precisaria de um schema ItemPedidoComandaDigital e buscar os itens.
-    # Por simplicidade, vamos omitir os itens detalhados por agora.
-    comanda_digital_data = schemas.ComandaDigital(
-        id=comanda_ativa.id,
-        numero_mesa=mesa.numero_identificador,
-        status_comanda=comanda_ativa.status_comanda,
-        valor_total_calculado=comanda_ativa.valor_total_calculado,
-        valor_pago=comanda_ativa.valor_pago,
-        valor_restante=valor_restante,
-        # itens=[], # Preencher com os itens formatados
-        data_abertura=comanda_ativa.data_criacao
-    )
+    # Aquece o cache para as próximas leituras desta mesa
+    await comanda_digital_service.gravar_snapshot(mesa.id, comanda_digital_data)
     return comanda_digital_data
 
+@router.get("/digital/{qr_code_hash}/stream")
+async def stream_comanda_digital_via_qr(
+    qr_code_hash: str,
+    request: Request,
+    db: Session = Depends(deps.get_db)
+) -> Any:
+    """
+    Endpoint público (SSE) com as mudanças da comanda da mesa: itens adicionados,
+    mudanças de status e pagamentos. O cliente carrega a comanda em
+    GET /comandas/digital/{qr_code_hash} e aplica os deltas recebidos aqui.
+    Todas as mesas de um worker compartilham a mesma inscrição no Redis.
+    Conexões simultâneas limitadas por mesa e por IP (429 com Retry-After).
+    """
+    mesa_id, _ = await _resolver_mesa_qr(db, qr_code_hash)
+    # A conexão fica aberta enquanto o cliente olha a comanda; não segura a sessão do banco
+    db.close()
+
+    limites = (settings.COMANDA_DIGITAL_STREAM_MAX_POR_MESA, settings.COMANDA_DIGITAL_STREAM_MAX_POR_IP)
+    assinatura = Assinatura(topico_mesa(mesa_id), origem=ip_do_cliente(request.scope))
+    if realtime_hub.motivo_recusa(assinatura.topico, assinatura.origem, limites) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Conexões demais para esta comanda; tente novamente",
+            headers={"Retry-After": str(settings.REALTIME_HEARTBEAT_SEGUNDOS)}
+        )
+    # Rechecado ao começar a transmitir (outras conexões podem ter entrado nesse meio tempo)
+    return StreamingResponse(
+        stream_sse(assinatura, request.is_disconnected, formatar_sse_comanda_digital, limites),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 # Adicionar outros endpoints relacionados a comanda, como adicionar item (que na verdade é criar Pedido/ItemPedido)
 # ou registrar pagamento (que será em endpoints de Pagamento).
 
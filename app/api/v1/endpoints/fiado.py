@@ -3,15 +3,17 @@ import uuid
 from typing import List, Any, Optional
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Security
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
+from app.schemas.token_schemas import UsuarioToken
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_colecao, versao_registro
 from app.schemas.fiado_schemas import StatusFiado, FiadoSchemas, \
     FiadoUpdateSchemas, FiadoCreateSchemas  # Corrigido para importar StatusFiado e FiadoSchemas corretamente
 
-from app.models.usuario import Usuario
+from app.models.fiado import Fiado
 
 router = APIRouter()
 
@@ -21,7 +23,7 @@ def create_fiado_registro(
     *,
     db: Session = Depends(deps.get_db),
     fiado_in: FiadoCreateSchemas,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["cashier"])
 ) -> Any:
     """
     Registra um novo valor em fiado para um cliente e uma comanda.
@@ -38,31 +40,50 @@ def create_fiado_registro(
 @router.get("/cliente/{cliente_id}", response_model=List[FiadoSchemas])
 def read_fiados_by_cliente(
     cliente_id: uuid.UUID,
+    request: Request,
+    response: Response,
     status_fiado: Optional[StatusFiado] = None,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera a lista de fiados de um cliente específico, opcionalmente filtrada por status.
     """
+    # Cliente inexistente é 404 mesmo com If-None-Match (a coleção vazia teria ETag estável)
     cliente_db = crud.cliente.get(db, id=cliente_id)
     if not cliente_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cliente não encontrado")
-    
+
+    criterios = [Fiado.id_cliente == cliente_id]
+    if status_fiado:
+        criterios.append(Fiado.status_fiado == status_fiado)
+    etag = etag_fraco("fiados", cliente_id, status_fiado, skip, limit, versao_colecao(db, Fiado, *criterios))
+    nao_modificada = resposta_nao_modificada(request, response, etag)
+    if nao_modificada:
+        return nao_modificada
+
     fiados = crud.fiado.get_multi_by_cliente(db, cliente_id=cliente_id, status=status_fiado, skip=skip, limit=limit)
     return fiados
 
 @router.get("/{fiado_id}", response_model=FiadoSchemas)
 def read_fiado_by_id(
     fiado_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera um registro de fiado pelo seu ID.
     """
+    versao = versao_registro(db, Fiado, fiado_id)
+    if versao:
+        nao_modificada = resposta_nao_modificada(request, response, etag_fraco("fiado", versao))
+        if nao_modificada:
+            return nao_modificada
+
     fiado_registro = crud.fiado.get(db=db, id=fiado_id)
     if not fiado_registro:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Registro de fiado não encontrado")
@@ -74,7 +95,7 @@ def registrar_pagamento_de_fiado(
     db: Session = Depends(deps.get_db),
     fiado_id: uuid.UUID,
     valor_pago: Decimal, # Poderia ser um schema FiadoSchemasPagamentoCreate com mais detalhes
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["cashier"])
 ) -> Any:
     """
     Registra um pagamento para um fiado existente.
@@ -91,7 +112,6 @@ def registrar_pagamento_de_fiado(
         )
         if not fiado_atualizado:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Registro de fiado não encontrado para pagamento.")
-        # Notificar no Redis
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return fiado_atualizado
@@ -102,7 +122,7 @@ def update_fiado_registro(
     db: Session = Depends(deps.get_db),
     fiado_id: uuid.UUID,
     fiado_in: FiadoUpdateSchemas, # Usar FiadoSchemasUpdate que não permite pagamento direto por aqui
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["cashier"])
 ) -> Any:
     """
     Atualiza um registro de fiado (ex: observações, data de vencimento, status manual).
@@ -0,0 +1,171 @@
+# app/api/v1/endpoints/kds.py
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from app.api import deps
+from app.schemas.token_schemas import UsuarioToken
+from app.core import security
+from app.core.config import settings
+from app.schemas.evento_schemas import (
+    CANAL_PEDIDOS, ConfirmacaoFilaKds, EntradaFilaKds, EstatisticaPreparoResumo, ItemFilaEstacao, ResumoEstacao
+)
+from app.services.event_codec import SUBPROTOCOLO_BINARIO, codificar_binario
+from app.services.kds_stream import kds_stream_service
+from app.services.prep_time import estatisticas_preparo
+from app.services.refresh_tokens import refresh_token_store
+from app.services.realtime import SSE_HEADERS, Assinatura, filtro_estacao, realtime_hub, stream_sse
+from app.services.station_router import roteador_estacoes
+
+router = APIRouter()
+
+
+def _validar_estacao(estacao: Optional[str]) -> None:
+    if estacao and estacao not in settings.KDS_ESTACOES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Estação '{estacao}' não configurada")
+
+
+@router.get("/estacoes")
+def read_estacoes(current_user: UsuarioToken = Depends(deps.get_current_active_user)) -> Any:
+    """Estações configuradas e as categorias de produto de cada uma."""
+    return settings.KDS_ESTACOES
+
+
+@router.get("/estacoes/resumo", response_model=List[ResumoEstacao])
+def read_resumo_estacoes(current_user: UsuarioToken = Depends(deps.get_current_active_user)) -> Any:
+    """Profundidade da fila e espera do item mais antigo de cada estação."""
+    return [ResumoEstacao(estacao=nome, **dados) for nome, dados in roteador_estacoes.atualizar_metricas().items()]
+
+
+@router.get("/estatisticas/preparo", response_model=List[EstatisticaPreparoResumo])
+def read_estatisticas_preparo(
+    estacao: Optional[str] = Query(None, description="Só os histogramas desta estação"),
+    id_produto: Optional[str] = Query(None, description="Só o histograma deste produto"),
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Tempo do pedido até o item pronto (p50/p90/p99) por estação e por produto,
+    e a fração dentro do SLA da estação. Calculado em memória pelo worker.
+    """
+    _validar_estacao(estacao)
+    return estatisticas_preparo.resumo(estacao=estacao, id_produto=id_produto)
+
+
+@router.get("/{estacao}/prioridades", response_model=List[ItemFilaEstacao])
+def read_prioridades_estacao(
+    estacao: str,
+    limite: int = Query(50, ge=1, le=500),
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Itens abertos da estação na ordem em que devem ser preparados (ver
+    app.services.station_router). Mantida em memória pelo worker, sem consulta ao banco.
+    """
+    _validar_estacao(estacao)
+    return [
+        ItemFilaEstacao(
+            id=item.id, id_pedido=item.id_pedido, id_mesa=item.id_mesa, id_produto=item.id_produto,
+            categoria=item.categoria, quantidade=item.quantidade, status=item.status,
+            recebido_em=datetime.fromtimestamp(item.recebido_em, timezone.utc),
+            tempo_preparo_segundos=item.tempo_preparo,
+            inicio_previsto=datetime.fromtimestamp(item.prioridade, timezone.utc),
+        )
+        for item in roteador_estacoes.fila(estacao, limite)
+    ]
+
+
+@router.get("/stream")
+async def stream_pedidos(
+    request: Request,
+    estacao: Optional[str] = Query(None, description="Estação (ex.: cozinha, bar)"),
+    categoria: Optional[str] = Query(None, description="Categoria de produto"),
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Stream SSE (text/event-stream) das atualizações de pedidos para a tela da cozinha/bar.
+    Para o estado inicial, a tela consulta GET /pedidos/ (pedidos em andamento).
+    """
+    _validar_estacao(estacao)
+    assinatura = Assinatura(CANAL_PEDIDOS, filtro_estacao(estacao, categoria))
+    return StreamingResponse(
+        stream_sse(assinatura, request.is_disconnected), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@router.websocket("/ws")
+async def websocket_pedidos(
+    websocket: WebSocket,
+    token: str = Query(...),
+    estacao: Optional[str] = Query(None),
+    categoria: Optional[str] = Query(None)
+):
+    """
+    WebSocket das atualizações de pedidos. O navegador não envia cabeçalhos em
+    WebSockets, por isso o token de acesso vai na query string.
+
+    Telas nativas podem pedir o subprotocolo `evento.bin.v1` para receber os
+    eventos no formato binário (ver app.services.event_codec; heartbeat é um
+    frame binário vazio); sem ele, as mensagens são JSON.
+    """
+    payload = security.decode_token(token)
+    if (
+        payload is None or payload.get("sub") is None or payload.get("type") == security.TIPO_REFRESH
+        or await refresh_token_store.token_revogado(payload)
+        or (estacao and estacao not in settings.KDS_ESTACOES)
+    ):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    binario = SUBPROTOCOLO_BINARIO in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=SUBPROTOCOLO_BINARIO if binario else None)
+    assinatura = realtime_hub.assinar(Assinatura(CANAL_PEDIDOS, filtro_estacao(estacao, categoria)))
+    try:
+        while True:
+            evento = await assinatura.proximo(timeout=settings.REALTIME_HEARTBEAT_SEGUNDOS)
+            if binario:
+                await websocket.send_bytes(codificar_binario(evento) if evento else b"")
+            elif evento is None:
+                await websocket.send_json({"tipo": "heartbeat"})
+            else:
+                await websocket.send_text(evento.model_dump_json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        realtime_hub.cancelar(assinatura)
+
+
+@router.get("/{estacao}/fila", response_model=List[EntradaFilaKds])
+async def read_fila_estacao(
+    estacao: str,
+    consumidor: str = Query(..., pattern=r"^[\w.-]{1,64}$", description="Identificador estável da tela"),
+    pendentes: bool = Query(False, description="Reentregar as entradas ainda não confirmadas (ao reconectar)"),
+    count: int = Query(100, ge=1, le=500),
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Fila durável da estação (long polling). A tela confirma o que exibiu em
+    POST /kds/{estacao}/fila/ack; o que não for confirmado é reentregue quando
+    a tela reconecta com `pendentes=true`, ou reassumido por outra tela da
+    estação se esta ficar inativa.
+    """
+    _validar_estacao(estacao)
+    entradas = await kds_stream_service.ler(estacao, consumidor, pendentes=pendentes, count=count)
+    if entradas is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Fila da estação indisponível")
+    return entradas
+
+
+@router.post("/{estacao}/fila/ack")
+async def confirmar_fila_estacao(
+    estacao: str,
+    confirmacao: ConfirmacaoFilaKds,
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """Confirma entradas já exibidas pela tela."""
+    _validar_estacao(estacao)
+    confirmadas = await kds_stream_service.confirmar(estacao, confirmacao.ids)
+    if confirmadas is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Fila da estação indisponível")
+    return {"confirmadas": confirmadas}
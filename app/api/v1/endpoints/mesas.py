@@ -4,14 +4,20 @@ from typing import List, Any, Optional
 import qrcode # Para gerar a imagem do QR Code
 import io # Para enviar a imagem do QR Code
 
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Security
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
+from app.schemas.token_schemas import UsuarioToken
+from app.core.qr_token import eh_qr_token, verificar_qr_token
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_objeto
 
+from app.models.mesa import Mesa
 from app.models.usuario import Usuario
 from app.schemas.mesa_schemas import MesaComComandaInfo
+from app.services.cache_service import mesa_cache
+from app.services.qr_code_filter import qr_code_filter
 
 # from app.services.redis_service import redis_client # Para publicar eventos no Redis
 # import json # Para formatar mensagens Redis
@@ -23,13 +29,14 @@ def create_mesa(
     *, 
     db: Session = Depends(deps.get_db),
     mesa_in: schemas.MesaCreate,
-    current_user: Usuario = Depends(deps.get_current_active_superuser) # Apenas superusuários podem criar mesas
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"]) # Gerentes (e admins) podem criar mesas
 ) -> Any:
     """
     Cria uma nova mesa.
     Gera automaticamente um QR Code hash para ela.
     """
     try:
+        # O hash entra no filtro de QR Codes depois do commit (ver qr_code_filter.preparar_registro)
         mesa = crud.mesa.create(db=db, obj_in=mesa_in)
         # Ao criar uma mesa, ela geralmente está disponível, não se abre uma comanda automaticamente aqui.
         # A comanda é aberta através de um endpoint específico de "abrir mesa".
@@ -53,17 +60,23 @@ def create_mesa(
 #     return mesas
 
 @router.get("/{mesa_id}", response_model=schemas.Mesa)
-def read_mesa_by_id(
+async def read_mesa_by_id(
     mesa_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera uma mesa pelo seu ID.
     """
-    mesa = crud.mesa.get(db=db, id=mesa_id)
+    # A versão da ETag vem do próprio objeto em cache: sem consulta ao banco num acerto
+    mesa = await mesa_cache.get(db, id=mesa_id)
     if not mesa:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mesa não encontrada")
+    nao_modificada = resposta_nao_modificada(request, response, etag_fraco("mesa", versao_objeto(mesa)))
+    if nao_modificada:
+        return nao_modificada
     return mesa
 
 @router.put("/{mesa_id}", response_model=schemas.Mesa)
@@ -72,7 +85,7 @@ def update_mesa(
     db: Session = Depends(deps.get_db),
     mesa_id: uuid.UUID,
     mesa_in: schemas.MesaUpdate,
-    current_user: Usuario = Depends(deps.get_current_active_superuser)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"])
 ) -> Any:
     """
     Atualiza uma mesa.
@@ -94,7 +107,7 @@ def delete_mesa(
     *,
     db: Session = Depends(deps.get_db),
     mesa_id: uuid.UUID,
-    current_user: Usuario = Depends(deps.get_current_active_superuser)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"])
 ) -> Any:
     """
     Deleta uma mesa.
@@ -113,7 +126,7 @@ def abrir_mesa_endpoint(
     mesa_id: uuid.UUID,
     db: Session = Depends(deps.get_db),
     id_cliente_associado: Optional[uuid.UUID] = None, # Pode ser passado no corpo da requisição também
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["waiter"])
 ) -> Any:
     """
     Abre uma mesa, mudando seu status para OCUPADA e criando uma nova comanda.
@@ -135,7 +148,7 @@ def abrir_mesa_endpoint(
 def fechar_mesa_endpoint(
     mesa_id: uuid.UUID,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Fecha uma mesa (geralmente após o pagamento da comanda).
@@ -150,6 +163,18 @@ def fechar_mesa_endpoint(
     # await redis_client.publish_message(f"mesa_{mesa.id}_status", json.dumps({"status": "FECHADA"}))
     return mesa
 
+@router.post("/qrcode/reemitir", response_model=dict)
+def reemitir_qr_codes(
+    db: Session = Depends(deps.get_db),
+    current_user: UsuarioToken = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Re-emite os tokens de QR Code de todas as mesas com a versão de chave atual.
+    Usado após rotacionar QR_CODE_KEY_VERSION; os QR Codes impressos precisam ser substituídos.
+    """
+    ids = crud.mesa.reemitir_qr_codes(db)
+    return {"mesas_atualizadas": len(ids)}
+
 @router.get("/{mesa_id}/qrcode", responses={200: {"content": {"image/png": {}}}}, response_class=Response)
 def get_mesa_qrcode(
     mesa_id: uuid.UUID,
@@ -177,7 +202,7 @@ def get_mesa_qrcode(
     return Response(content=buf.getvalue(), media_type="image/png")
 
 @router.get("/qrcode/{qr_code_hash}", response_model=schemas.Mesa) # Endpoint para testar o hash
-def get_mesa_by_qrcode_hash(
+async def get_mesa_by_qrcode_hash(
     qr_code_hash: str,
     db: Session = Depends(deps.get_db)
 ) -> Any:
@@ -185,7 +210,15 @@ def get_mesa_by_qrcode_hash(
     (Para teste) Recupera uma mesa pelo seu qr_code_hash.
     A comanda digital usaria este hash para buscar os dados da comanda associada.
     """
-    mesa = crud.mesa.get_by_qr_code_hash(db, qr_code_hash=qr_code_hash)
+    mesa_id = verificar_qr_token(qr_code_hash)
+    if mesa_id is not None:
+        mesa = crud.mesa.get(db, id=mesa_id)
+    elif eh_qr_token(qr_code_hash) or not await qr_code_filter.pode_existir(db, qr_code_hash):
+        mesa = None
+    else:
+        mesa = crud.mesa.get_by_qr_code_hash(db, qr_code_hash=qr_code_hash)
+        if not mesa:
+            qr_code_filter.registrar_ausencia(qr_code_hash)
     if not mesa:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhuma mesa encontrada para este QR Code hash.")
     return mesa
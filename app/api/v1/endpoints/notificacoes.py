@@ -0,0 +1,26 @@
+# app/api/v1/endpoints/notificacoes.py
+from typing import Any
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from app.api import deps
+from app.schemas.token_schemas import UsuarioToken
+from app.services.realtime import SSE_HEADERS, Assinatura, stream_sse, topico_usuario
+
+router = APIRouter()
+
+
+@router.get("/stream")
+async def stream_notificacoes(
+    request: Request,
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Stream SSE das notificações do usuário logado (ex.: `pedido_pronto` para o
+    garçom que registrou o pedido). Cada tablet do usuário recebe a sua cópia.
+    """
+    assinatura = Assinatura(topico_usuario(current_user.id))
+    return StreamingResponse(
+        stream_sse(assinatura, request.is_disconnected), media_type="text/event-stream", headers=SSE_HEADERS
+    )
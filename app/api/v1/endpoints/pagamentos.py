@@ -2,12 +2,14 @@
 import uuid
 from typing import List, Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Security
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
-from app.models.usuario import Usuario
+from app.schemas.token_schemas import UsuarioToken
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_colecao
+from app.models.pagamento import Pagamento
 
 router = APIRouter()
 
@@ -16,7 +18,7 @@ def create_pagamento(
     *, 
     db: Session = Depends(deps.get_db),
     pagamento_in: schemas.PagamentoCreate,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["cashier"])
 ) -> Any:
     """
     Registra um novo pagamento para uma comanda.
@@ -34,14 +36,21 @@ def create_pagamento(
 @router.get("/comanda/{comanda_id}", response_model=List[schemas.Pagamento])
 def read_pagamentos_by_comanda(
     comanda_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera a lista de pagamentos de uma comanda específica.
     """
+    etag = etag_fraco("pagamentos", comanda_id, skip, limit, versao_colecao(db, Pagamento, Pagamento.id_comanda == comanda_id))
+    nao_modificada = resposta_nao_modificada(request, response, etag)
+    if nao_modificada:
+        return nao_modificada
+
     # Verificar se a comanda existe primeiro
     comanda_db = crud.comanda.get(db, id=comanda_id)
     if not comanda_db:
@@ -54,7 +63,7 @@ def read_pagamentos_by_comanda(
 def read_pagamento_by_id(
     pagamento_id: uuid.UUID,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera um pagamento pelo seu ID.
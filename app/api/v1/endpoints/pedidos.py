@@ -2,20 +2,22 @@
 import uuid
 from typing import List, Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Security
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
-from app.schemas.pedido_schemas import StatusPedido, PedidoSchemas  # Importar o Enum
+from app.schemas.token_schemas import UsuarioToken
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_colecao, versao_registro
+from app.schemas.pedido_schemas import PedidoSchemas
 
-from app.models.usuario import Usuario
+from app.models.pedido import Pedido, ItemPedido as ItemPedidoModel, StatusPedido # Status gravados no banco, como em /status:batch
 from app.schemas import ItemPedido
 
-from app.schemas.pedido_schemas import PedidoCreateSchemas
+from app.schemas.pedido_schemas import PedidoCreateSchemas, StatusLoteRequest, StatusLoteResponse
+from app.services.status_pedido import STATUS_PEDIDO_FINALIZADOS, validar_transicao_status
 
-# from app.services.redis_service import redis_client, get_redis_client # Para publicar eventos no Redis
-# import json # Para formatar mensagens Redis
 # from app.services.pedido_service import update_pedido_status_and_notify # Serviço para encapsular lógica
 
 router = APIRouter()
@@ -25,7 +27,7 @@ def create_pedido(
     *,
     db: Session = Depends(deps.get_db),
     pedido_in: PedidoCreateSchemas,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["waiter"])
 ) -> Any:
     """
     Cria um novo pedido com seus itens.
@@ -34,66 +36,99 @@ def create_pedido(
     try:
         # O id_usuario_registrou é o usuário logado que está fazendo a ação
         pedido = crud.crud_pedido.create(db=db, obj_in=pedido_in, id_usuario_registrou=current_user.id)
-
-        # Publicar evento no Redis sobre o novo pedido (a lógica de publish está comentada no CRUD por enquanto)
-        # comanda_db = crud.comanda.get(db, id=pedido.id_comanda)
-        # redis_msg = {
-        #     "evento": "novo_pedido",
-        #     "pedido_id": str(pedido.id),
-        #     "id_comanda": str(pedido.id_comanda),
-        #     "id_mesa": str(comanda_db.id_mesa) if comanda_db else None,
-        #     "itens_count": len(pedido.itens),
-        #     "timestamp": pedido.data_criacao.isoformat()
-        # }
-        # await redis_client.publish_message(channel="pedidos_novos", message=json.dumps(redis_msg))
-        # # Notificar cozinha/bar
-        # await redis_client.publish_message(channel="cozinha_pedidos", message=json.dumps(redis_msg))
-
+        # A notificação da cozinha/bar é gravada no outbox pelo CRUD, na mesma transação
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return pedido
 
 @router.get("/", response_model=List[PedidoSchemas])
 def read_pedidos(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
     id_comanda: Optional[uuid.UUID] = None,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera a lista de pedidos, opcionalmente filtrada por comanda.
+    Sem comanda, lista os pedidos ainda em andamento.
     """
     if id_comanda:
+        etag = etag_fraco(
+            "pedidos", id_comanda, skip, limit,
+            versao_colecao(db, Pedido, Pedido.id_comanda == id_comanda),
+            versao_colecao(db, ItemPedidoModel, ItemPedidoModel.id_comanda == id_comanda)
+        )
+        nao_modificada = resposta_nao_modificada(request, response, etag)
+        if nao_modificada:
+            return nao_modificada
         pedidos = crud.crud_pedido.get_multi_by_comanda(db, comanda_id=id_comanda, skip=skip, limit=limit)
     else:
-        # Implementar crud.pedido.get_multi(db, skip=skip, limit=limit) se necessário listar todos os pedidos
-        # Por ora, vamos focar em pedidos por comanda.
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID da comanda é obrigatório para listar pedidos por enquanto.")
+        # Sem comanda: pedidos em andamento (telas de produção e salão). Os itens
+        # entram só os desses pedidos, não a tabela inteira com todo o histórico
+        em_andamento = Pedido.status_geral_pedido.notin_(STATUS_PEDIDO_FINALIZADOS)
+        etag = etag_fraco(
+            "pedidos-ativos", skip, limit,
+            versao_colecao(db, Pedido, em_andamento),
+            versao_colecao(db, ItemPedidoModel, ItemPedidoModel.id_pedido.in_(select(Pedido.id).where(em_andamento)))
+        )
+        nao_modificada = resposta_nao_modificada(request, response, etag)
+        if nao_modificada:
+            return nao_modificada
+        pedidos = crud.crud_pedido.get_multi_ativos(db, skip=skip, limit=limit)
     return pedidos
 
 @router.get("/{pedido_id}", response_model=PedidoSchemas)
 def read_pedido_by_id(
     pedido_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Recupera um pedido pelo seu ID.
     """
+    versao = versao_registro(db, Pedido, pedido_id)
+    if versao:
+        etag = etag_fraco("pedido", versao, versao_colecao(db, ItemPedidoModel, ItemPedidoModel.id_pedido == pedido_id))
+        nao_modificada = resposta_nao_modificada(request, response, etag)
+        if nao_modificada:
+            return nao_modificada
+
     pedido = crud.crud_pedido.get(db=db, id=pedido_id)
     if not pedido:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pedido não encontrado")
     return pedido
 
+@router.put("/status:batch", response_model=StatusLoteResponse)
+def update_status_lote(
+    *,
+    db: Session = Depends(deps.get_db),
+    lote: StatusLoteRequest,
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
+) -> Any:
+    """
+    Atualiza o status de vários pedidos e/ou itens numa requisição (ex.: a tela
+    da cozinha avançando vários tickets). Transições inválidas voltam em
+    `rejeitados` sem impedir as demais; as telas recebem um único evento em lote.
+    """
+    pedidos, itens = {}, {}
+    for atualizacao in lote.atualizacoes:
+        (itens if atualizacao.tipo == "item" else pedidos)[atualizacao.id] = atualizacao.status
+    return crud.crud_pedido.update_status_lote(db, pedidos=pedidos, itens=itens)
+
+
 @router.put("/{pedido_id}/status", response_model=PedidoSchemas)
-async def update_pedido_status(
+def update_pedido_status(
     *,
     db: Session = Depends(deps.get_db),
     # redis: aioredis.Redis = Depends(get_redis_client), # Se for injetar o cliente redis
     pedido_id: uuid.UUID,
     novo_status: StatusPedido, # Receber o novo status como query parameter ou no corpo
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Atualiza o status geral de um pedido e seus itens (se aplicável).
@@ -102,44 +137,34 @@ async def update_pedido_status(
     pedido = crud.crud_pedido.get(db=db, id=pedido_id)
     if not pedido:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pedido não encontrado")
+    # Mesmas regras de transição do lote; repetir o status atual não é erro
+    if pedido.status_geral_pedido != novo_status:
+        erro = validar_transicao_status(pedido.status_geral_pedido, novo_status)
+        if erro:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=erro)
 
     # Usar o serviço que encapsula a lógica de atualização e notificação
     # updated_pedido, error_message = await update_pedido_status_and_notify(
     #     db=db, pedido_id=pedido_id, status_novo=novo_status, current_user=current_user
     # )
     # A função update_pedido_status_and_notify precisa ser ajustada para não cometer o db dentro dela se o crud_pedido já faz.
-    # Por agora, chamaremos o CRUD diretamente e a lógica de Redis está comentada no CRUD.
+    # Por agora, chamaremos o CRUD diretamente; o evento para o Redis é gravado no outbox pelo CRUD.
 
     updated_pedido = crud.crud_pedido.update_status_geral(db=db, pedido_id=pedido_id, novo_status=novo_status)
     if not updated_pedido:
         # Isso não deveria acontecer se o pedido foi encontrado acima, a menos que update_status_geral retorne None em erro
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao atualizar status do pedido.")
 
-    # A lógica de publicação no Redis está comentada dentro do crud_pedido.update_status_geral
-    # Se for movida para cá ou para um serviço, seria chamada aqui.
-    # Exemplo:
-    # comanda_db = crud.comanda.get(db, id=updated_pedido.id_comanda)
-    # redis_msg = {
-    #     "evento": "status_pedido_atualizado",
-    #     "pedido_id": str(updated_pedido.id),
-    #     "novo_status_geral": novo_status.value,
-    #     "id_comanda": str(updated_pedido.id_comanda),
-    #     "id_mesa": str(comanda_db.id_mesa) if comanda_db else None,
-    #     "timestamp": datetime.utcnow().isoformat() # Precisa importar datetime
-    # }
-    # await redis_client.publish_message(channel="pedidos_status_updates", message=json.dumps(redis_msg))
-    # await redis_client.publish_message(channel=f"comanda_{updated_pedido.id_comanda}_updates", message=json.dumps(redis_msg))
-
     return updated_pedido
 
 
 @router.put("/itens/{item_pedido_id}/status", response_model=ItemPedido)
-async def update_item_pedido_status(
+def update_item_pedido_status(
     *,
     db: Session = Depends(deps.get_db),
     item_pedido_id: uuid.UUID,
     novo_status: StatusPedido,
-    current_user: Usuario = Depends(deps.get_current_active_user)
+    current_user: UsuarioToken = Depends(deps.get_current_active_user)
 ) -> Any:
     """
     Atualiza o status de um item de pedido específico.
@@ -148,26 +173,15 @@ async def update_item_pedido_status(
     item_pedido = crud.crud_item_pedido.get(db=db, id=item_pedido_id)
     if not item_pedido:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item do pedido não encontrado")
+    if item_pedido.status_item_pedido != novo_status:
+        erro = validar_transicao_status(item_pedido.status_item_pedido, novo_status)
+        if erro:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=erro)
 
     updated_item = crud.crud_item_pedido.update_status(db=db, item_pedido_id=item_pedido_id, novo_status=novo_status)
     if not updated_item:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao atualizar status do item do pedido.")
 
-    # A lógica de publicação no Redis está comentada dentro do crud_item_pedido.update_status
-    # Exemplo:
-    # comanda_db = crud.comanda.get(db, id=updated_item.id_comanda)
-    # redis_msg = {
-    #     "evento": "status_item_pedido_atualizado",
-    #     "item_pedido_id": str(updated_item.id),
-    #     "pedido_id": str(updated_item.id_pedido),
-    #     "novo_status_item": novo_status.value,
-    #     "id_comanda": str(updated_item.id_comanda),
-    #     "id_mesa": str(comanda_db.id_mesa) if comanda_db else None,
-    #     "timestamp": datetime.utcnow().isoformat()
-    # }
-    # await redis_client.publish_message(channel="pedidos_status_updates", message=json.dumps(redis_msg))
-    # await redis_client.publish_message(channel=f"comanda_{updated_item.id_comanda}_updates", message=json.dumps(redis_msg))
-
     # Após atualizar um item, pode ser necessário reavaliar o status_geral_pedido do Pedido pai.
     # Ex: se todos os itens estão "Pronto para Entrega", o pedido geral pode mudar para "Pronto para Entrega".
     # Esta lógica pode ficar no CRUD ou em um serviço.
@@ -2,12 +2,16 @@
 from typing import List, Any, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Security
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
+from app.schemas.token_schemas import UsuarioToken
+from app.api.conditional import etag_fraco, resposta_nao_modificada, versao_colecao, versao_objeto
+from app.models.produto import Produto
 from app.models.usuario import Usuario
+from app.services.cache_service import produto_cache
 
 router = APIRouter()
 
@@ -17,7 +21,7 @@ def create_produto(
         *,
         db: Session = Depends(deps.get_db),
         produto_in: schemas.ProdutoCreate,
-        current_user: Usuario = Depends(deps.get_current_active_superuser)  # Remove this if not used
+        current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"])  # Remove this if not used
 ) -> Any:
     """
     Cria um novo produto.
@@ -34,6 +38,8 @@ def create_produto(
 
 @router.get("/", response_model=List[schemas.Produto])
 def read_produtos(
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
@@ -43,6 +49,12 @@ def read_produtos(
     """
     Recupera a lista de produtos. Pode ser filtrada por categoria.
     """
+    criterios = [Produto.categoria == categoria] if categoria else []
+    etag = etag_fraco("produtos", categoria, skip, limit, versao_colecao(db, Produto, *criterios))
+    nao_modificada = resposta_nao_modificada(request, response, etag)
+    if nao_modificada:
+        return nao_modificada
+
     if categoria:
         produtos = crud.produto.get_multi_by_categoria(db, categoria=categoria, skip=skip, limit=limit)
     else:
@@ -50,17 +62,23 @@ def read_produtos(
     return produtos
 
 @router.get("/{produto_id}", response_model=schemas.Produto)
-def read_produto_by_id(
+async def read_produto_by_id(
     produto_id: uuid.UUID,
+    request: Request,
+    response: Response,
     db: Session = Depends(deps.get_db)
     # current_user: Usuario = Depends(deps.get_current_active_user) # Ver um produto específico pode ser público
 ) -> Any:
     """
     Recupera um produto pelo seu ID.
     """
-    produto = crud.produto.get(db=db, id=produto_id)
+    # A versão da ETag vem do próprio objeto em cache: sem consulta ao banco num acerto
+    produto = await produto_cache.get(db, id=produto_id)
     if not produto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Produto não encontrado")
+    nao_modificada = resposta_nao_modificada(request, response, etag_fraco("produto", versao_objeto(produto)))
+    if nao_modificada:
+        return nao_modificada
     return produto
 
 @router.put("/{produto_id}", response_model=schemas.Produto)
@@ -69,7 +87,7 @@ def update_produto(
     db: Session = Depends(deps.get_db),
     produto_id: uuid.UUID,
     produto_in: schemas.ProdutoUpdate,
-    current_user: Usuario = Depends(deps.get_current_active_superuser) # Apenas superusuários podem atualizar produtos
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"]) # Gerentes (e admins) podem atualizar produtos
 ) -> Any:
     """
     Atualiza um produto.
@@ -88,7 +106,7 @@ def delete_produto(
     *,
     db: Session = Depends(deps.get_db),
     produto_id: uuid.UUID,
-    current_user: Usuario = Depends(deps.get_current_active_superuser) # Apenas superusuários podem deletar produtos
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"]) # Gerentes (e admins) podem deletar produtos
 ) -> Any:
     """
     Deleta um produto.
@@ -2,12 +2,12 @@
 from typing import Any
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Security
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models # Ajuste os caminhos de importação
 from app.api import deps # Ajuste os caminhos de importação
-from app.models.usuario import Usuario
+from app.schemas.token_schemas import UsuarioToken
 from app.schemas.relatorio_schemas import RelatorioFiadoSchemas
 
 router = APIRouter()
@@ -17,7 +17,7 @@ def get_relatorio_fiado_endpoint(
     data_inicio: date, # Query parameter
     data_fim: date,    # Query parameter
     db: Session = Depends(deps.get_db),
-    current_user: Usuario = Depends(deps.get_current_active_superuser) # Apenas superusuários podem ver relatórios
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["manager"]) # Gerentes (e admins) podem ver relatórios
 ) -> Any:
     """
     Gera um relatório de fiados pendentes e parcialmente pagos.
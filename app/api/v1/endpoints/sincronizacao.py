@@ -0,0 +1,29 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, Security
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.schemas.token_schemas import UsuarioToken
+from app.schemas.sincronizacao_schemas import SincronizacaoRequest, SincronizacaoResponse
+from app.services.sincronizacao import sincronizador_offline
+
+router = APIRouter()
+
+@router.post("/", response_model=SincronizacaoResponse)
+def sincronizar(
+    *,
+    db: Session = Depends(deps.get_db),
+    lote: SincronizacaoRequest,
+    current_user: UsuarioToken = Security(deps.get_current_active_user, scopes=["waiter"])
+) -> Any:
+    """
+    Recebe a fila de operações feitas pelo tablet sem rede (abrir mesa, criar
+    pedido, adicionar item, registrar pagamento) e as aplica na ordem, em
+    poucas transações. Devolve o resultado de cada operação e o que mudou no
+    servidor desde o `cursor` enviado; `operacoes` vazio só busca as mudanças.
+    Síncrono: o lote e o delta rodam no threadpool, fora do event loop. Caches e
+    comandas digitais das mesas afetadas são atualizados a cada commit do lote.
+    """
+    resultados = sincronizador_offline.aplicar(db, lote.operacoes, current_user)
+    return {"resultados": resultados, **sincronizador_offline.delta(db, lote.cursor)}
@@ -1,8 +1,50 @@
-from fastapi import APIRouter
+import uuid
+from typing import Any
+
+from anyio import from_thread
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.security import gerar_hash_senha
+from app.crud.crud_usuario import crud_usuario
+from app.schemas.token_schemas import UsuarioToken
+from app.schemas.usuario_schemas import UsuarioSchemas, UsuarioUpdateSchemas
+from app.services.refresh_tokens import refresh_token_store
 
 router = APIRouter()
 
+# Mudanças que alteram o que os tokens já emitidos autorizam
+_CAMPOS_QUE_REVOGAM = ("is_active", "is_superuser", "cargo", "password", "email")
+
 @router.get("/")
 async def read_usuarios_root():
     return {"message": "Usuarios endpoint is active"}
 
+
+@router.put("/{usuario_id}", response_model=UsuarioSchemas)
+def update_usuario(
+    *,
+    db: Session = Depends(deps.get_db),
+    usuario_id: uuid.UUID,
+    usuario_in: UsuarioUpdateSchemas,
+    current_user: UsuarioToken = Depends(deps.get_current_active_superuser)
+) -> Any:
+    """
+    Atualiza um usuário (apenas admins). Desativar, trocar cargo/permissões,
+    senha ou e-mail revoga as sessões dele: os tokens emitidos antes deixam de
+    valer em até AUTH_EPOCA_CACHE_SEGUNDOS, sem nenhuma rota consultar o banco.
+
+    Roda no threadpool (Session síncrona); o hash da senha e a revogação vão
+    para o event loop com `from_thread.run`.
+    """
+    usuario = crud_usuario.get(db, id=usuario_id)
+    if not usuario:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+    email_anterior = usuario.email
+    alterados = usuario_in.model_dump(exclude_unset=True)
+    hashed_password = from_thread.run(gerar_hash_senha, alterados["password"]) if alterados.get("password") else None
+    usuario = crud_usuario.update(db, db_obj=usuario, obj_in=usuario_in, hashed_password=hashed_password)
+    if any(campo in alterados for campo in _CAMPOS_QUE_REVOGAM):
+        from_thread.run(refresh_token_store.revogar_usuario, email_anterior)
+    return usuario
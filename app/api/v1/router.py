@@ -11,7 +11,10 @@ from app.api.v1.endpoints import (
     pagamentos,
     relatorios,
     fiado,
-    usuarios
+    usuarios,
+    kds,
+    notificacoes,
+    sincronizacao
 )
 
 api_router_v1 = APIRouter()
@@ -26,7 +29,10 @@ api_router_v1.include_router(pedidos.router, prefix="/pedidos", tags=["Pedidos"]
 api_router_v1.include_router(itens_pedido.router, prefix="/pedidos/{pedido_id}/itens", tags=["Itens de Pedido"])
 api_router_v1.include_router(pagamentos.router, prefix="/pagamentos", tags=["Pagamentos"])
 api_router_v1.include_router(fiado.router, prefix="/fiado", tags=["Fiado"])
+api_router_v1.include_router(kds.router, prefix="/kds", tags=["KDS"])
+api_router_v1.include_router(notificacoes.router, prefix="/notificacoes", tags=["Notificações"])
 api_router_v1.include_router(relatorios.router, prefix="/relatorios", tags=["Relatórios"])
+api_router_v1.include_router(sincronizacao.router, prefix="/sync", tags=["Sincronização"])
 
 @api_router_v1.get("/", tags=["Root V1"])
 async def read_root_v1():
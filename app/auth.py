@@ -3,17 +3,18 @@ from asyncio.log import logger
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Annotated
+from typing import Optional, Annotated, Tuple
 from sqlalchemy.orm import Session
 from pydantic import EmailStr
 
 from app import models, crud # Removed direct import of schemas, will use specific imports if needed or rely on what crud returns
+from app.core import jwt_keys, security
 from app.core.config import settings
 from .database import get_db
 # Import specific schemas that are used for type hinting or direct instantiation
 from app.schemas.token_schemas import Token, TokenData # Corrected import
+from app.services.refresh_tokens import SessaoInvalida, SessoesIndisponiveis, refresh_token_store
 from app.schemas.usuario_schemas import UsuarioSchemas # Assuming UsuarioSchemas is the correct one for current_user
 
 # Security configurations
@@ -22,31 +23,26 @@ ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context (mesmo contexto de app.core.security: custo e rehash centralizados)
+pwd_context = security.pwd_context
 
 # OAuth2 schemes
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/token", # Adjusted to include API_V1_STR prefix
-    scopes={
-        "admin": "Administrator access",
-        "manager": "Manager access",
-        "waiter": "Waiter access",
-        "cashier": "Cashier access"
-    }
+    scopes=security.ESCOPOS
 )
 
 
 class AuthService:
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """Verify a password against a hash."""
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password against a hash, off the event loop. Returns (valid, new_hash or None)."""
+        return await security.verificar_senha(plain_password, hashed_password)
 
     @staticmethod
-    def get_password_hash(password: str) -> str:
-        """Generate a password hash."""
-        return pwd_context.hash(password)
+    async def get_password_hash(password: str) -> str:
+        """Generate a password hash, off the event loop."""
+        return await security.gerar_hash_senha(password)
 
     @staticmethod
     def create_access_token(
@@ -58,7 +54,7 @@ class AuthService:
         expire = datetime.now(timezone.utc) + (
             expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
         to_encode.update({"exp": expire, "type": "access"})
-        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        return jwt_keys.assinar(to_encode)
 
     @staticmethod
     def create_refresh_token(
@@ -71,13 +67,13 @@ class AuthService:
             expires_delta if expires_delta
             else timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
         to_encode.update({"exp": expire, "type": "refresh"})
-        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        return jwt_keys.assinar(to_encode)
 
     @staticmethod
     def decode_token(token: str) -> dict:
         """Decode a JWT token."""
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = jwt_keys.verificar(token)
             return payload
         except JWTError as e:
             logger.error(f"Token decode error: {str(e)}")
@@ -98,9 +94,15 @@ class AuthService:
         if not user:
             logger.warning(f"Login attempt with non-existent email: {email}")
             return None
-        if not AuthService.verify_password(password, user.hashed_password):
+        valid, new_hash = await AuthService.verify_password(password, user.hashed_password)
+        if not valid:
             logger.warning(f"Invalid password attempt for user: {email}")
             return None
+        if new_hash:
+            # Stored hash uses outdated parameters (e.g. lower bcrypt cost): rehash transparently
+            user.hashed_password = new_hash
+            db.add(user)
+            db.commit()
         return user
 
     @staticmethod
@@ -173,17 +175,11 @@ class AuthService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = AuthService.create_access_token(
-            data={"sub": user.email, "scopes": form_data.scopes},
-            expires_delta=access_token_expires
-        )
-
-        refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-        refresh_token = AuthService.create_refresh_token(
-            data={"sub": user.email},
-            expires_delta=refresh_token_expires
-        )
+        # Refresh token registered as a new rotation family (see app.services.refresh_tokens)
+        try:
+            access_token, refresh_token = await refresh_token_store.emitir(user.email, security.claims_do_usuario(user))
+        except SessoesIndisponiveis as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
         logger.info(f"User {user.email} logged in successfully")
         return Token(
@@ -197,45 +193,15 @@ class AuthService:
             db: Session,
             refresh_token: str
     ) -> Token: # Corrected return type
-        """Generate a new access token from a refresh token."""
+        """Rotate a refresh token: one-time use, reuse revokes the whole family."""
         try:
-            payload = AuthService.decode_token(refresh_token)
-            if payload.get("type") != "refresh":
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token type"
-                )
-
-            email_from_payload: str = payload.get("sub")
-            if email_from_payload is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token"
-                )
-
-            user = crud.crud_usuario.get_by_email(db, email=email_from_payload) # Adjusted
-            if user is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="User not found"
-                )
-
-            access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-            new_access_token = AuthService.create_access_token(
-                data={"sub": user.email},
-                expires_delta=access_token_expires
-            )
-            # The Token schema might not have a refresh_token field when returning from refresh.
-            # Adjusting to return only access_token and token_type as per typical refresh responses.
-            return Token(
-                access_token=new_access_token,
-                token_type="bearer"
-                # refresh_token field might not be part of this response, or it could be the same one if it's long-lived.
-                # For simplicity, returning only new access token.
-            )
-        except JWTError:
+            access_token, new_refresh_token = await refresh_token_store.rotacionar(refresh_token)
+        except SessaoInvalida as e:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
+                detail=str(e),
+                headers={"WWW-Authenticate": "Bearer"},
             )
-
+        except SessoesIndisponiveis as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        return Token(access_token=access_token, refresh_token=new_refresh_token, token_type="bearer")
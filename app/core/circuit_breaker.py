@@ -0,0 +1,99 @@
+"""
+Circuit breaker para dependências externas (Redis).
+
+Depois de `limite_falhas` falhas consecutivas o circuito abre e as chamadas
+falham na hora, sem esperar timeouts de rede. Passado `tempo_espera`, uma única
+chamada de sonda é liberada (semiaberto): se der certo o circuito fecha, se
+falhar volta a abrir por mais um período. Sonda que não registra resultado em
+`prazo_sonda` (cancelada, ou um caminho que retorna sem sucesso nem falha)
+conta como falha, para o circuito não ficar semiaberto para sempre.
+"""
+import threading
+import time
+from enum import Enum
+from typing import Callable
+
+from app.core.metrics import Counter, Gauge
+
+circuito_estado = Gauge(
+    "circuit_breaker_estado", "Estado do circuito (0 fechado, 1 semiaberto, 2 aberto)", ["circuito"]
+)
+circuito_transicoes = Counter(
+    "circuit_breaker_transicoes_total", "Mudanças de estado do circuito", ["circuito", "estado"]
+)
+circuito_rejeicoes = Counter(
+    "circuit_breaker_rejeicoes_total", "Chamadas recusadas com o circuito aberto", ["circuito"]
+)
+
+
+class EstadoCircuito(str, Enum):
+    FECHADO = "fechado"
+    SEMIABERTO = "semiaberto"
+    ABERTO = "aberto"
+
+
+_VALOR_METRICA = {EstadoCircuito.FECHADO: 0, EstadoCircuito.SEMIABERTO: 1, EstadoCircuito.ABERTO: 2}
+
+
+class CircuitBreaker:
+    def __init__(
+            self, nome: str, limite_falhas: int, tempo_espera: float, prazo_sonda: float = 10.0,
+            relogio: Callable[[], float] = time.monotonic
+    ):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_espera = tempo_espera
+        self.prazo_sonda = prazo_sonda
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self.estado = EstadoCircuito.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._sonda_em_andamento = False
+        self._sonda_em = 0.0
+        circuito_estado.set(_VALOR_METRICA[self.estado], circuito=nome)
+
+    def _mudar_estado(self, estado: EstadoCircuito) -> None:
+        if estado == self.estado:
+            return
+        self.estado = estado
+        circuito_estado.set(_VALOR_METRICA[estado], circuito=self.nome)
+        circuito_transicoes.inc(circuito=self.nome, estado=estado.value)
+
+    def permite(self) -> bool:
+        """Indica se a chamada pode seguir; com o circuito aberto, retorna False sem custo de rede."""
+        with self._lock:
+            agora = self._relogio()
+            if (
+                self.estado == EstadoCircuito.SEMIABERTO and self._sonda_em_andamento
+                and agora - self._sonda_em >= self.prazo_sonda
+            ):
+                # Sonda sem resultado: conta como falha e o circuito volta a abrir
+                self._sonda_em_andamento = False
+                self._aberto_em = agora
+                self._mudar_estado(EstadoCircuito.ABERTO)
+            if self.estado == EstadoCircuito.ABERTO and agora - self._aberto_em >= self.tempo_espera:
+                self._mudar_estado(EstadoCircuito.SEMIABERTO)
+                self._sonda_em_andamento = False
+            if self.estado == EstadoCircuito.FECHADO:
+                return True
+            if self.estado == EstadoCircuito.SEMIABERTO and not self._sonda_em_andamento:
+                self._sonda_em_andamento = True
+                self._sonda_em = agora
+                return True
+        circuito_rejeicoes.inc(circuito=self.nome)
+        return False
+
+    def registrar_sucesso(self) -> None:
+        with self._lock:
+            self._falhas = 0
+            self._sonda_em_andamento = False
+            self._mudar_estado(EstadoCircuito.FECHADO)
+
+    def registrar_falha(self) -> None:
+        with self._lock:
+            self._falhas += 1
+            self._sonda_em_andamento = False
+            if self.estado == EstadoCircuito.SEMIABERTO or self._falhas >= self.limite_falhas:
+                self._aberto_em = self._relogio()
+                self._mudar_estado(EstadoCircuito.ABERTO)
@@ -1,6 +1,6 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -11,20 +11,144 @@ class Settings(BaseSettings):
 
     # Configurações de segurança
     SECRET_KEY: str = Field(..., env="SECRET_KEY")
-    ALGORITHM: str = Field("HS256", env="ALGORITHM")
+    ALGORITHM: str = Field("HS256", env="ALGORITHM")  # "ES256": assinatura assimétrica (ver app.core.jwt_keys)
+
+    # Chaves ES256 por `kid`. Só quem emite tokens precisa das privadas; as públicas de
+    # chaves anteriores (ou de outros emissores) continuam aceitas até serem removidas.
+    # Rotação: publique a chave nova (pública) em todos os nós, depois troque JWT_KID_ATUAL
+    # e só remova a antiga quando o último refresh token assinado com ela expirar.
+    JWT_KID_ATUAL: Optional[str] = None
+    JWT_CHAVES_PRIVADAS: Dict[str, str] = {}  # kid -> PEM
+    JWT_CHAVES_PUBLICAS: Dict[str, str] = {}  # kid -> PEM (somente verificação)
+    JWT_ACEITAR_HS256: bool = False  # durante a migração, aceita tokens antigos assinados com SECRET_KEY
 
     # Configurações de token
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(..., env="ACCESS_TOKEN_EXPIRE_MINUTES")
     REFRESH_TOKEN_EXPIRE_DAYS: int = Field(..., env="REFRESH_TOKEN_EXPIRE_DAYS")
 
+    # Sessões: refresh tokens rotativos no Redis e época de revogação por usuário
+    AUTH_EPOCA_CACHE_SEGUNDOS: float = 5.0  # atraso máximo para uma revogação valer em outro worker
+    # Papel (admin, manager, waiter, cashier) de cada cargo, em minúsculas; superusuários são admin
+    AUTH_PAPEIS_POR_CARGO: Dict[str, str] = {
+        "admin": "admin", "administrador": "admin",
+        "gerente": "manager",
+        "garçom": "waiter", "garçonete": "waiter", "atendente": "waiter",
+        "caixa": "cashier",
+    }
+    AUTH_PAPEL_PADRAO: str = "waiter"  # usuários sem cargo reconhecido
+
+    # Hash de senhas (bcrypt). Hashes com custo menor são refeitos no próximo login;
+    # meça o custo na máquina de produção com `python -m benchmarks.password_hashing`.
+    BCRYPT_ROUNDS: int = 12
+    SENHA_HASH_CONCORRENCIA: int = 4  # hashes/verificações simultâneos (threads dedicadas)
+
+    # Limite de requisições (token bucket no Redis; políticas por rota em app.services.rate_limiter)
+    RATE_LIMIT_ATIVO: bool = True
+    RATE_LIMIT_CONFIAR_PROXY: bool = False  # usa o 1º IP de X-Forwarded-For (só atrás de proxy confiável)
+    RATE_LIMIT_BALDES_LOCAIS_MAX: int = 10000  # baldes em memória quando o Redis está indisponível
+
+    # Idempotency-Key em POST /pedidos e /pagamentos (app.services.idempotencia)
+    IDEMPOTENCIA_TTL_SEGUNDOS: int = 86400  # por quanto tempo a resposta é repetida
+    IDEMPOTENCIA_TRAVA_SEGUNDOS: int = 60  # validade da reserva se o worker cair no meio da execução
+    IDEMPOTENCIA_ESPERA_MAX_SEGUNDOS: float = 10.0  # espera de uma repetição concorrente antes do 409
+
     # Configurações de banco de dados
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
 
     # Configurações opcionais (com valores padrão)
     ENVIRONMENT: str = "development"
     SUPPORT_EMAIL: str = "support@example.com"
+    # /metrics exige "Authorization: Bearer <METRICS_TOKEN>"; sem token, só responde em desenvolvimento
+    METRICS_TOKEN: Optional[str] = None
+    REDIS_BACKEND: str = "redis"  # "memoria" dispensa o servidor (testes, instalação de um processo)
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
+    REDIS_PASSWORD: Optional[str] = None
+    REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 5.0  # segundos
+    REDIS_CONNECT_TIMEOUT: float = 1.0  # segundos
+    # Leituras bloqueantes de stream (XREADGROUP BLOCK) usam um pool próprio: cada
+    # uma prende a conexão até KDS_STREAM_BLOCK_MS e esgotaria o pool compartilhado
+    REDIS_STREAM_MAX_CONNECTIONS: int = 20
+    REDIS_STREAM_ESPERA_CONEXAO: float = 1.0  # segundos; sem conexão livre, a leitura volta vazia
+    # Circuit breaker: falhas consecutivas até abrir e espera até a chamada de sonda
+    REDIS_CIRCUIT_LIMITE_FALHAS: int = 5
+    REDIS_CIRCUIT_ESPERA_SEGUNDOS: float = 10.0
+    # Sonda do semiaberto sem resultado (cancelada, leitura que voltou vazia) conta como falha depois disto
+    REDIS_CIRCUIT_PRAZO_SONDA_SEGUNDOS: float = 10.0
+
+    # Cache da comanda digital (snapshot por mesa no Redis)
+    COMANDA_DIGITAL_SNAPSHOT_TTL: int = 6 * 60 * 60  # segundos; regravado a cada mudança
+
+    # Cache-aside dos get() de mesas, comandas, produtos e clientes
+    CACHE_TTL: int = 300  # segundos
+    CACHE_NEGATIVE_TTL: int = 15  # segundos; ausências ficam pouco tempo em cache
+    CACHE_EARLY_REFRESH_BETA: float = 1.0  # >1 antecipa mais o refresh probabilístico
+    CACHE_LOCK_TIMEOUT_MS: int = 2000
+    CACHE_LOCK_POLL_MS: int = 25
+
+    # Filtro de Bloom e cache negativo para hashes de QR Code
+    QR_BLOOM_TAXA_FALSO_POSITIVO: float = 0.001
+    QR_BLOOM_CAPACIDADE_MINIMA: int = 1024
+    QR_NEGATIVE_CACHE_TTL: int = 60  # segundos
+    QR_NEGATIVE_CACHE_MAX: int = 10000
+    # Intervalo mínimo entre reconstruções do filtro pedidas por uma consulta (geração desatualizada)
+    QR_BLOOM_RECONSTRUCAO_INTERVALO: float = 5.0  # segundos
+
+    # Tokens de QR Code assinados (HMAC). Versões listadas em QR_CODE_SIGNING_KEYS continuam
+    # válidas durante a rotação; sem configuração, a chave atual é derivada do SECRET_KEY.
+    QR_CODE_KEY_VERSION: int = 1
+    QR_CODE_SIGNING_KEYS: Dict[int, str] = {}
+
+    # Telas da cozinha/bar (KDS): categorias de produto atendidas por cada estação
+    KDS_ESTACOES: Dict[str, List[str]] = {
+        "cozinha": ["Pratos", "Porções", "Lanches", "Sobremesas"],
+        "bar": ["Bebidas", "Drinks", "Cervejas"],
+    }
+    KDS_ESTACAO_PADRAO: str = "cozinha"  # categorias fora das regras acima
+    # Tempo de preparo estimado por categoria (segundos), usado na prioridade das filas
+    KDS_TEMPO_PREPARO_SEGUNDOS: Dict[str, int] = {
+        "Pratos": 900, "Porções": 720, "Lanches": 600, "Sobremesas": 300,
+        "Bebidas": 60, "Drinks": 180, "Cervejas": 30,
+    }
+    KDS_TEMPO_PREPARO_PADRAO: int = 600
+    # Quanto cada segundo de espera da mesa adianta os itens novos dela na fila
+    KDS_PESO_ESPERA_MESA: float = 0.5
+    # SLA de preparo por estação (segundos entre o pedido e o item pronto)
+    KDS_SLA_SEGUNDOS: Dict[str, int] = {"cozinha": 1200, "bar": 300}
+
+    # Histogramas de tempo de preparo (app.services.prep_time)
+    PREPARO_AMOSTRAS_MINIMAS: int = 20  # abaixo disso, usa a estação e depois a categoria
+    PREPARO_JANELA_AMOSTRAS: int = 2000  # ao passar disso, as contagens caem pela metade (esquece o passado)
+    PREPARO_QUANTIL_ETA: float = 0.9  # quantil usado na previsão de entrega dos pedidos
+    PREPARO_PERSISTIR_SEGUNDOS: int = 60
+    REALTIME_BUFFER_MAX: int = 256  # eventos por tela antes de descartar os mais antigos
+    REALTIME_HEARTBEAT_SEGUNDOS: int = 15
+    # Stream público da comanda digital: conexões simultâneas por mesa e por IP (em cada worker)
+    COMANDA_DIGITAL_STREAM_MAX_POR_MESA: int = 20
+    COMANDA_DIGITAL_STREAM_MAX_POR_IP: int = 4
+    # Formato dos eventos publicados no Redis: "binario" (compacto, versionado) ou "json".
+    # Os assinantes reconhecem os dois; navegadores recebem sempre JSON.
+    EVENTOS_FORMATO_REDIS: str = "binario"
+    # Atualizações da mesma mesa/comanda num lote do outbox viram uma só mensagem (último estado)
+    EVENTOS_COALESCER: bool = True
+
+    # Fila durável da cozinha/bar (Redis Streams, um stream e um consumer group por estação)
+    KDS_STREAM_MAXLEN: int = 10000  # entradas mantidas por estação (trim aproximado)
+    KDS_STREAM_BLOCK_MS: int = 4000  # espera máxima de uma leitura sem entradas novas (< REDIS_SOCKET_TIMEOUT)
+    KDS_STREAM_CLAIM_IDLE_MS: int = 60000  # entradas pendentes há mais tempo são reassumidas
+
+    # Outbox transacional: eventos gravados no banco e publicados pelo relay
+    OUTBOX_LOTE: int = 200  # eventos por transação do relay
+    OUTBOX_INTERVALO_SEGUNDOS: float = 1.0  # varredura periódica (commits também acordam o relay)
+    OUTBOX_RETENCAO_HORAS: int = 24  # eventos publicados são removidos depois disso
+    OUTBOX_MAX_TENTATIVAS: int = 5  # envios com erro antes de o evento ir para a fila morta
+
+    # Sincronização offline dos tablets (POST /sync)
+    SYNC_OPERACOES_POR_TRANSACAO: int = 200  # commit a cada N operações do lote
+    SYNC_MARGEM_CURSOR_SEGUNDOS: int = 5  # recuo do cursor devolvido (transações que confirmam depois de começar)
+    SYNC_CURSOR_MAX_HORAS: int = 24  # cursor mais antigo (ou ausente): o cliente recebe o estado completo
 
     # Configurações de CORS
     BACKEND_CORS_ORIGINS: List[str] = []
@@ -0,0 +1,87 @@
+"""
+Chaves de assinatura dos JWT de acesso/refresh.
+
+Com ALGORITHM="HS256" (padrão) tudo continua com o SECRET_KEY compartilhado.
+Com ALGORITHM="ES256", os tokens são assinados com a chave privada de
+JWT_KID_ATUAL e levam o `kid` no cabeçalho; qualquer nó verifica só com as
+chaves públicas (GET /auth/jwks.json), sem conhecer segredo algum.
+
+As chaves são lidas do PEM uma única vez por `kid` e mantidas já construídas:
+o custo de verificar um token é só o da operação de curva elíptica.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWTError
+
+from app.core.config import settings
+
+ALGORITMOS_ASSIMETRICOS = ("ES256",)
+
+
+def assimetrico() -> bool:
+    return settings.ALGORITHM in ALGORITMOS_ASSIMETRICOS
+
+
+@lru_cache(maxsize=None)
+def _chave_privada(kid: str) -> Key:
+    pem = settings.JWT_CHAVES_PRIVADAS.get(kid)
+    if pem is None:
+        raise ValueError(f"Chave privada JWT '{kid}' não configurada em JWT_CHAVES_PRIVADAS")
+    return jwk.construct(pem, settings.ALGORITHM)
+
+
+@lru_cache(maxsize=None)
+def _chave_publica_configurada(kid: str) -> Key:
+    pem = settings.JWT_CHAVES_PUBLICAS.get(kid)
+    if pem is not None:
+        return jwk.construct(pem, settings.ALGORITHM)
+    return _chave_privada(kid).public_key()
+
+
+def chave_publica(kid: str) -> Optional[Key]:
+    """
+    Chave de verificação de um `kid`; None se desconhecido. O `kid` vem do
+    cabeçalho ainda não verificado: só os configurados chegam ao cache.
+    """
+    if kid not in settings.JWT_CHAVES_PUBLICAS and kid not in settings.JWT_CHAVES_PRIVADAS:
+        return None
+    return _chave_publica_configurada(kid)
+
+
+def assinar(claims: Dict[str, Any]) -> str:
+    if not assimetrico():
+        return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    kid = settings.JWT_KID_ATUAL
+    if not kid:
+        raise ValueError("JWT_KID_ATUAL não configurado para ALGORITHM assimétrico")
+    return jwt.encode(claims, _chave_privada(kid), algorithm=settings.ALGORITHM, headers={"kid": kid})
+
+
+def verificar(token: str) -> Dict[str, Any]:
+    """Valida assinatura e expiração; levanta JWTError se o token não for aceito."""
+    if not assimetrico():
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    cabecalho = jwt.get_unverified_header(token)
+    algoritmo = cabecalho.get("alg")
+    if algoritmo == "HS256" and settings.JWT_ACEITAR_HS256:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    chave = chave_publica(cabecalho.get("kid") or "")
+    if algoritmo != settings.ALGORITHM or chave is None:
+        raise JWTError("Token assinado com chave ou algoritmo não aceito")
+    return jwt.decode(token, chave, algorithms=[settings.ALGORITHM])
+
+
+@lru_cache(maxsize=1)
+def jwks() -> Dict[str, List[Dict[str, Any]]]:
+    """Documento JWKS com as chaves públicas aceitas (vazio com HS256)."""
+    if not assimetrico():
+        return {"keys": []}
+    kids = sorted(set(settings.JWT_CHAVES_PUBLICAS) | set(settings.JWT_CHAVES_PRIVADAS))
+    chaves = []
+    for kid in kids:
+        publica = chave_publica(kid).to_dict()
+        chaves.append({**publica, "kid": kid, "use": "sig", "alg": settings.ALGORITHM})
+    return {"keys": chaves}
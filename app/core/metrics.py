@@ -0,0 +1,131 @@
+"""
+Métricas em memória do processo, expostas em formato texto do Prometheus em /metrics.
+
+Implementação mínima (contadores, gauges e histogramas com rótulos) para não
+adicionar dependências; cada worker do uvicorn expõe as próprias métricas.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        registry.registrar(self)
+
+    def _chave(self, valores: Dict[str, str]) -> LabelValues:
+        return tuple(str(valores.get(rotulo, "")) for rotulo in self.rotulos)
+
+    def _formatar_rotulos(self, chave: LabelValues, extra: Optional[Dict[str, str]] = None) -> str:
+        pares = list(zip(self.rotulos, chave)) + list((extra or {}).items())
+        if not pares:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, descricao, rotulos)
+        self._valores: Dict[LabelValues, float] = {}
+
+    def inc(self, valor: float = 1.0, **rotulos: str) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def valor(self, **rotulos: str) -> float:
+        return self._valores.get(self._chave(rotulos), 0.0)
+
+    def render(self) -> List[str]:
+        return [f"{self.nome}{self._formatar_rotulos(chave)} {valor}" for chave, valor in self._valores.items()]
+
+
+class Gauge(_Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nome: str, descricao: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, descricao, rotulos)
+        self._valores: Dict[LabelValues, float] = {}
+
+    def set(self, valor: float, **rotulos: str) -> None:
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+
+    def inc(self, valor: float = 1.0, **rotulos: str) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def dec(self, valor: float = 1.0, **rotulos: str) -> None:
+        self.inc(-valor, **rotulos)
+
+    def valor(self, **rotulos: str) -> float:
+        return self._valores.get(self._chave(rotulos), 0.0)
+
+    def render(self) -> List[str]:
+        return [f"{self.nome}{self._formatar_rotulos(chave)} {valor}" for chave, valor in self._valores.items()]
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(
+            self, nome: str, descricao: str, rotulos: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_LATENCIA
+    ):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets))
+        self._contagens: Dict[LabelValues, List[int]] = {}
+        self._somas: Dict[LabelValues, float] = {}
+
+    def observe(self, valor: float, **rotulos: str) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            contagens = self._contagens.setdefault(chave, [0] * (len(self.buckets) + 1))
+            contagens[bisect.bisect_left(self.buckets, valor)] += 1
+            self._somas[chave] = self._somas.get(chave, 0.0) + valor
+
+    def render(self) -> List[str]:
+        linhas = []
+        for chave, contagens in self._contagens.items():
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += contagem
+                le = "+Inf" if limite == float("inf") else str(limite)
+                linhas.append(f"{self.nome}_bucket{self._formatar_rotulos(chave, {'le': le})} {acumulado}")
+            linhas.append(f"{self.nome}_sum{self._formatar_rotulos(chave)} {self._somas[chave]}")
+            linhas.append(f"{self.nome}_count{self._formatar_rotulos(chave)} {acumulado}")
+        return linhas
+
+
+class Registry:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+
+    def registrar(self, metrica: _Metrica) -> None:
+        self._metricas[metrica.nome] = metrica
+
+    def render(self) -> str:
+        linhas = []
+        for metrica in self._metricas.values():
+            linhas.append(f"# HELP {metrica.nome} {metrica.descricao}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.render())
+        return "\n".join(linhas) + "\n"
+
+
+registry = Registry()
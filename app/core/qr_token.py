@@ -0,0 +1,81 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import uuid
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import settings
+
+# Tamanho (em bytes) da assinatura truncada; 128 bits bastam para um token de mesa
+TAMANHO_ASSINATURA = 16
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode()
+
+
+def _unb64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+@lru_cache(maxsize=8)
+def _chave_derivada(versao: int) -> bytes:
+    return hmac.new(settings.SECRET_KEY.encode(), f"qr-code:{versao}".encode(), hashlib.sha256).digest()
+
+
+def _chave(versao: int) -> Optional[bytes]:
+    """
+    Chave HMAC de uma versão. Versões configuradas em QR_CODE_SIGNING_KEYS têm prioridade;
+    a versão atual, se não configurada, é derivada do SECRET_KEY. A versão vem do QR Code
+    (entrada pública): só as configuradas chegam ao cache, as desconhecidas não ocupam memória.
+    """
+    chaves = settings.QR_CODE_SIGNING_KEYS
+    if versao in chaves:
+        return chaves[versao].encode()
+    if versao == settings.QR_CODE_KEY_VERSION:
+        return _chave_derivada(versao)
+    return None
+
+
+def _assinar(chave: bytes, versao: int, mesa_id_bytes: bytes) -> bytes:
+    mensagem = versao.to_bytes(4, "big") + mesa_id_bytes
+    return hmac.new(chave, mensagem, hashlib.sha256).digest()[:TAMANHO_ASSINATURA]
+
+
+def gerar_qr_token(mesa_id: uuid.UUID, versao: Optional[int] = None) -> str:
+    """Gera o token assinado `<versão>.<id da mesa>.<assinatura>` impresso no QR Code."""
+    versao = settings.QR_CODE_KEY_VERSION if versao is None else versao
+    chave = _chave(versao)
+    if chave is None:
+        raise ValueError(f"Chave de QR Code versão {versao} não configurada.")
+    return f"{versao}.{_b64(mesa_id.bytes)}.{_b64(_assinar(chave, versao, mesa_id.bytes))}"
+
+
+def eh_qr_token(valor: str) -> bool:
+    """Diferencia tokens assinados dos hashes hexadecimais legados."""
+    return valor.count(".") == 2
+
+
+def verificar_qr_token(token: str) -> Optional[uuid.UUID]:
+    """
+    Valida a assinatura do token sem acessar o banco e retorna o id da mesa.
+    Retorna None para tokens malformados, de versões não aceitas ou com assinatura inválida.
+    """
+    try:
+        versao_txt, id_txt, assinatura_txt = token.split(".")
+        versao = int(versao_txt)
+        mesa_id_bytes = _unb64(id_txt)
+        assinatura = _unb64(assinatura_txt)
+    except (ValueError, binascii.Error):
+        return None
+    if len(mesa_id_bytes) != 16:
+        return None
+
+    chave = _chave(versao)
+    if chave is None:
+        return None
+    if not hmac.compare_digest(assinatura, _assinar(chave, versao, mesa_id_bytes)):
+        return None
+    return uuid.UUID(bytes=mesa_id_bytes)
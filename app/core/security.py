@@ -1,38 +1,167 @@
+import asyncio
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Union, Optional
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, Union
 
-from jose import jwt, JWTError
+from jose import JWTError
 from passlib.context import CryptContext
 
+from app.core import jwt_keys
 from app.core.config import settings
+from app.core.metrics import Gauge, Histogram
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds = default_rounds: hashes com custo abaixo do configurado ficam "desatualizados"
+# e são refeitos no login (verify_and_update)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
 
 ALGORITHM = settings.ALGORITHM
 
+senha_hash_duracao = Histogram(
+    "senha_hash_segundos", "Duração de um hash/verificação de senha (bcrypt)", ["operacao"]
+)
+senha_hash_espera = Histogram(
+    "senha_hash_espera_segundos", "Tempo na fila até uma thread de bcrypt ficar livre", ["operacao"]
+)
+senha_hash_em_fila = Gauge("senha_hash_em_fila", "Operações de bcrypt aguardando uma thread")
+
+# O bcrypt libera o GIL: as threads rodam em paralelo sem travar o event loop.
+# O semáforo mantém as requisições excedentes esperando no loop (canceláveis se
+# o cliente desistir) em vez de acumuladas na fila interna do executor.
+_executor_senhas = ThreadPoolExecutor(max_workers=settings.SENHA_HASH_CONCORRENCIA, thread_name_prefix="bcrypt")
+_limites_senhas: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+T = TypeVar("T")
+
+
+TIPO_ACCESS = "access"
+TIPO_REFRESH = "refresh"
+
+# Escopos declarados no OAuth2 (app.auth.oauth2_scheme) e o que cada papel recebe
+ESCOPOS = {
+    "admin": "Administrator access",
+    "manager": "Manager access",
+    "waiter": "Waiter access",
+    "cashier": "Cashier access",
+}
+ESCOPOS_POR_PAPEL: Dict[str, Tuple[str, ...]] = {
+    "admin": ("admin", "manager", "waiter", "cashier"),
+    "manager": ("manager", "waiter", "cashier"),
+    "waiter": ("waiter",),
+    "cashier": ("cashier",),
+}
+
+# Claims de autorização copiadas do access para o refresh token (e de volta, na rotação)
+CLAIMS_AUTORIZACAO = ("uid", "role", "scopes", "su")
+
+
+def papel_do_usuario(usuario) -> str:
+    if usuario.is_superuser:
+        return "admin"
+    cargo = (usuario.cargo or "").strip().lower()
+    return settings.AUTH_PAPEIS_POR_CARGO.get(cargo, settings.AUTH_PAPEL_PADRAO)
+
+
+def claims_do_usuario(usuario) -> Dict[str, Any]:
+    """Claims que bastam para autorizar uma requisição sem consultar o banco."""
+    papel = papel_do_usuario(usuario)
+    return {
+        "uid": str(usuario.id),
+        "role": papel,
+        "scopes": list(ESCOPOS_POR_PAPEL.get(papel, ())),
+        "su": bool(usuario.is_superuser),
+    }
+
+
 def create_access_token(
-    subject: Union[str, Any], expires_delta: Optional[timedelta] = None
+    subject: Union[str, Any], expires_delta: Optional[timedelta] = None, epoca: int = 0,
+    claims: Optional[Dict[str, Any]] = None
 ) -> str:
+    """
+    `epoca` é a época de revogação do usuário na emissão (ver app.services.refresh_tokens);
+    `claims` são os de `claims_do_usuario` (papel e escopos).
+    """
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject), "type": TIPO_ACCESS, "epc": epoca}
+    return jwt_keys.assinar(to_encode)
+
+
+def create_refresh_token(
+    subject: Union[str, Any], jti: str, familia: str, epoca: int = 0, claims: Optional[Dict[str, Any]] = None
+) -> str:
+    """Refresh token de uso único: `jti` identifica o token e `fam` a cadeia de rotações do login."""
+    expire = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = {
+        **(claims or {}),
+        "exp": expire, "sub": str(subject), "type": TIPO_REFRESH, "jti": jti, "fam": familia, "epc": epoca
+    }
+    return jwt_keys.assinar(to_encode)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Versão síncrona; em código async use `verificar_senha`."""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
+    """Versão síncrona; em código async use `gerar_hash_senha`."""
     return pwd_context.hash(password)
 
+
+def _limite_do_loop(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    # Um semáforo por event loop (o asyncio.Semaphore fica preso ao loop do primeiro uso)
+    limite = _limites_senhas.get(loop)
+    if limite is None:
+        limite = _limites_senhas[loop] = asyncio.Semaphore(settings.SENHA_HASH_CONCORRENCIA)
+    return limite
+
+
+async def _em_thread_bcrypt(operacao: str, funcao: Callable[..., T], *args: Any) -> T:
+    loop = asyncio.get_running_loop()
+    limite = _limite_do_loop(loop)
+    entrada = time.perf_counter()
+    senha_hash_em_fila.inc()
+    try:
+        await limite.acquire()
+    finally:
+        senha_hash_em_fila.dec()
+    try:
+        inicio = time.perf_counter()
+        senha_hash_espera.observe(inicio - entrada, operacao=operacao)
+        resultado = await loop.run_in_executor(_executor_senhas, funcao, *args)
+        senha_hash_duracao.observe(time.perf_counter() - inicio, operacao=operacao)
+        return resultado
+    finally:
+        limite.release()
+
+
+async def verificar_senha(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica a senha fora do event loop. Retorna (válida, novo_hash): novo_hash
+    vem preenchido quando a senha confere mas o hash armazenado usa parâmetros
+    desatualizados (ex.: BCRYPT_ROUNDS aumentou) e deve ser regravado.
+    """
+    return await _em_thread_bcrypt("verificar", pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def gerar_hash_senha(password: str) -> str:
+    """Gera o hash da senha fora do event loop."""
+    return await _em_thread_bcrypt("hash", pwd_context.hash, password)
+
 def decode_token(token: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt_keys.verificar(token)
         return payload
     except JWTError:
         return None
-
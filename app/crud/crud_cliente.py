@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 
 from app.db.models.cliente import Cliente
 from app.schemas.cliente import ClienteCreateSchemas, ClienteUpdateSchemas
+from app.services.pos_commit import marcar_alteracao
 
 class CRUDCliente:
     def get(self, db: Session, id: uuid.UUID) -> Optional[Cliente]:
@@ -42,6 +43,7 @@ class CRUDCliente:
                 setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
+        marcar_alteracao(db, "cliente", db_obj.id)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -53,6 +55,7 @@ class CRUDCliente:
             # if obj.comandas_fiado and any(fiado.status != "Pago Totalmente" for fiado in obj.comandas_fiado):
             #     raise ValueError("Cliente possui fiados pendentes e não pode ser removido.")
             db.delete(obj)
+            marcar_alteracao(db, "cliente", obj.id)
             db.commit()
         return obj
 
@@ -9,8 +9,10 @@ from sqlalchemy import func, or_
 from app.db.models.comanda import Comanda, StatusComanda
 from app.db.models.mesa import Mesa, StatusMesa # Para atualizar status da mesa
 from app.schemas.comanda import ComandaCreateSchemas, ComandaUpdateSchemas
-# from app.services.redis_service import redis_client # Para publicar eventos
-# import json
+from app.schemas.evento_schemas import TipoEvento
+from app.services.event_bus import evento_de_comanda, evento_de_mesa
+from app.services.outbox import registrar_evento
+from app.services.pos_commit import marcar_alteracao
 
 class CRUDComanda:
     def get(self, db: Session, id: uuid.UUID) -> Optional[Comanda]:
@@ -29,10 +31,15 @@ class CRUDComanda:
     def get_multi_by_cliente(self, db: Session, *, cliente_id: uuid.UUID, skip: int = 0, limit: int = 100) -> List[Comanda]:
         return db.query(Comanda).filter(Comanda.id_cliente_associado == cliente_id).order_by(Comanda.data_criacao.desc()).offset(skip).limit(limit).all()
 
-    def create_comanda_para_mesa(self, db: Session, *, mesa_id: uuid.UUID, id_cliente_associado: Optional[uuid.UUID] = None) -> Comanda:
+    def create_comanda_para_mesa(
+            self, db: Session, *, mesa_id: uuid.UUID, id_cliente_associado: Optional[uuid.UUID] = None,
+            id: Optional[uuid.UUID] = None, commit: bool = True
+    ) -> Comanda:
         """
         Cria uma nova comanda para uma mesa. 
         Esta função é chamada quando uma mesa é aberta.
+        `id` permite usar o UUID gerado pelo cliente (sincronização offline);
+        com commit=False a comanda só é enviada ao banco (flush), na transação de quem chamou.
         """
         # Verificar se já existe uma comanda ativa para esta mesa
         comanda_ativa_existente = self.get_comanda_ativa_by_mesa(db, mesa_id=mesa_id)
@@ -43,11 +50,12 @@ class CRUDComanda:
             pass # A lógica de abrir mesa no crud_mesa já deve ter mudado o status da mesa.
 
         obj_in_data = {"id_mesa": mesa_id, "id_cliente_associado": id_cliente_associado}
+        if id:
+            obj_in_data["id"] = id
         db_obj = Comanda(**obj_in_data)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        
+        db.flush()
+
         # Atualizar status da mesa para OCUPADA, se não estiver
         mesa = db.query(Mesa).filter(Mesa.id == mesa_id).first()
         if mesa and mesa.status != StatusMesa.OCUPADA:
@@ -55,10 +63,15 @@ class CRUDComanda:
             if id_cliente_associado and not mesa.id_cliente_associado:
                  mesa.id_cliente_associado = id_cliente_associado
             db.add(mesa)
-            db.commit()
+            registrar_evento(db, evento_de_mesa(mesa))
 
-        # Publicar evento no Redis
-        # await redis_client.publish_message(f"mesa_{mesa_id}_comandas", json.dumps({"evento": "comanda_criada", "comanda_id": str(db_obj.id)}))
+        # Comanda, mesa e eventos (outbox) confirmados em um único commit
+        registrar_evento(db, evento_de_comanda(TipoEvento.COMANDA_ATUALIZADA, db_obj, {"evento": "comanda_criada"}))
+        if commit:
+            db.commit()
+            db.refresh(db_obj)
+        else:
+            db.flush()
         return db_obj
 
     def update(self, db: Session, *, db_obj: Comanda, obj_in: Union[ComandaUpdateSchemas, Dict[str, Any]]) -> Comanda:
@@ -72,14 +85,15 @@ class CRUDComanda:
                 setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
+        if "status_comanda" in update_data:
+            registrar_evento(db, evento_de_comanda(TipoEvento.COMANDA_ATUALIZADA, db_obj))
+        else:
+            marcar_alteracao(db, "comanda", db_obj.id)
         db.commit()
         db.refresh(db_obj)
-        # Publicar evento no Redis se o status da comanda mudar
-        # if "status_comanda" in update_data:
-        #     await redis_client.publish_message(f"comanda_{db_obj.id}_status", json.dumps({"status": db_obj.status_comanda.value}))
         return db_obj
 
-    def recalcular_total_comanda(self, db: Session, *, comanda_id: uuid.UUID) -> Comanda:
+    def recalcular_total_comanda(self, db: Session, *, comanda_id: uuid.UUID, commit: bool = True) -> Comanda:
         comanda = self.get(db, id=comanda_id)
         if not comanda:
             raise ValueError("Comanda não encontrada para recalcular totais.")
@@ -93,14 +107,12 @@ class CRUDComanda:
         # A lógica de fechar comanda ou registrar fiado deve garantir consistência.
 
         db.add(comanda)
-        db.commit()
-        db.refresh(comanda)
-        # Publicar atualização de valores no Redis
-        # await redis_client.publish_message(f"comanda_{comanda.id}_valores", json.dumps({
-        #     "total_calculado": str(comanda.valor_total_calculado),
-        #     "valor_pago": str(comanda.valor_pago),
-        #     "valor_fiado": str(comanda.valor_fiado)
-        # }))
+        registrar_evento(db, evento_de_comanda(TipoEvento.COMANDA_ATUALIZADA, comanda))
+        if commit:
+            db.commit()
+            db.refresh(comanda)
+        else:
+            db.flush()
         return comanda
 
     def fechar_comanda_para_pagamento(self, db: Session, *, comanda_id: uuid.UUID) -> Comanda:
@@ -113,9 +125,9 @@ class CRUDComanda:
         comanda = self.recalcular_total_comanda(db, comanda_id=comanda_id)
         comanda.status_comanda = StatusComanda.FECHADA
         db.add(comanda)
+        registrar_evento(db, evento_de_comanda(TipoEvento.COMANDA_ATUALIZADA, comanda))
         db.commit()
         db.refresh(comanda)
-        # Publicar no Redis
         return comanda
 
     # Outras funções CRUD (get_multi, delete se necessário) podem ser adicionadas.
@@ -12,9 +12,11 @@ from app.db.models.comanda import Comanda, StatusComanda # Para atualizar status
 from app.db.models.cliente import Cliente # Para relatório
 from app.schemas.fiado import FiadoCreate, FiadoUpdate
 from app.schemas.relatorio import RelatorioFiado, RelatorioFiadoItem # Para o relatório
-# from app.services.redis_service import redis_client
-# import json
-# from datetime import datetime
+from app.db.models.mesa import StatusMesa
+from app.schemas.evento_schemas import TipoEvento
+from app.services.event_bus import evento_de_comanda, evento_de_mesa
+from app.services.outbox import registrar_evento
+from app.services.pos_commit import marcar_alteracao
 
 class CRUDFiado:
     def get(self, db: Session, id: uuid.UUID) -> Optional[Fiado]:
@@ -80,22 +82,19 @@ class CRUDFiado:
                 if comanda_db.mesa.status == StatusMesa.OCUPADA:
                     comanda_db.mesa.status = StatusMesa.FECHADA
                     db.add(comanda_db.mesa)
+                    registrar_evento(db, evento_de_mesa(comanda_db.mesa))
         db.add(comanda_db)
 
+        # Evento gravado no outbox na mesma transação do fiado
+        db.flush()
+        registrar_evento(db, evento_de_comanda(TipoEvento.FIADO_REGISTRADO, comanda_db, {
+            "id_fiado": str(db_fiado.id),
+            "id_cliente": str(db_fiado.id_cliente),
+            "valor_original": str(db_fiado.valor_original)
+        }))
         db.commit()
         db.refresh(db_fiado)
         db.refresh(comanda_db)
-
-        # Publicar evento no Redis
-        # redis_msg = {
-        #     "evento": "novo_fiado",
-        #     "fiado_id": str(db_fiado.id),
-        #     "comanda_id": str(comanda_db.id),
-        #     "cliente_id": str(db_fiado.id_cliente),
-        #     "valor": str(db_fiado.valor_original),
-        #     "timestamp": datetime.utcnow().isoformat()
-        # }
-        # await redis_client.publish_message(channel=f"cliente_{db_fiado.id_cliente}_fiados", message=json.dumps(redis_msg))
         return db_fiado
 
     def registrar_pagamento_fiado(self, db: Session, *, fiado_id: uuid.UUID, valor_pago: Decimal, id_usuario_registrou: Optional[uuid.UUID]) -> Optional[Fiado]:
@@ -140,15 +139,19 @@ class CRUDFiado:
                     if comanda_db.mesa and comanda_db.mesa.status == StatusMesa.OCUPADA:
                         comanda_db.mesa.status = StatusMesa.FECHADA
                         db.add(comanda_db.mesa)
+                        registrar_evento(db, evento_de_mesa(comanda_db.mesa))
                 elif comanda_db.status_comanda == StatusComanda.EM_FIADO: # Se ainda há outros fiados pendentes
                     pass # Mantém EM_FIADO
             db.add(comanda_db)
+            registrar_evento(db, evento_de_comanda(TipoEvento.PAGAMENTO_REGISTRADO, comanda_db, {
+                "id_fiado": str(fiado_db.id),
+                "valor_pago_fiado": str(valor_pago),
+                "status_fiado": fiado_db.status_fiado.value
+            }))
 
         db.commit()
         db.refresh(fiado_db)
         if comanda_db: db.refresh(comanda_db)
-
-        # Publicar evento no Redis
         return fiado_db
 
     def update(self, db: Session, *, db_obj: Fiado, obj_in: Union[FiadoUpdate, Dict[str, Any]]) -> Fiado:
@@ -168,6 +171,7 @@ class CRUDFiado:
                 setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
+        marcar_alteracao(db, "comanda", db_obj.id_comanda)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -181,7 +185,7 @@ class CRUDFiado:
         # e que foram criados em qualquer momento até `data_fim`.
         
         # Fiados que estão com status Pendente ou Pago Parcialmente no final do período.
-        fiados_abertos_no_final_periodo = db.query(
+        fiados_abertos_no_final_periodo = (db.query(
             Fiado.id_cliente,
             Cliente.nome.label("nome_cliente"),
             func.sum(Fiado.valor_devido).label("valor_total_devido_cliente"),
@@ -192,7 +196,7 @@ class CRUDFiado:
             Fiado.data_criacao <= data_fim # Considera todos criados até o fim do período
             # Se quiser apenas os que *ainda estavam abertos* no fim do período, a data_criacao é suficiente
             # Se quiser os que *movimentaram* no período, a lógica é mais complexa.
-        ).group_by(Fiado.id_cliente, Cliente.nome).all()
+        ).group_by(Fiado.id_cliente, Cliente.nome).all())
 
         detalhes_clientes = []
         total_geral_devido_calculado = Decimal("0.0")
@@ -1,13 +1,17 @@
 # app/crud/crud_mesa.py
 import uuid
 from typing import List, Optional, Union, Dict, Any, Tuple
-import hashlib # Para gerar o qr_code_hash
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func # Para func.now()
+from sqlalchemy import String, column, func, update, values # func para func.now()
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
+from app.core.qr_token import gerar_qr_token
 from app.db.models.mesa import Mesa, StatusMesa
 from app.schemas.mesa import MesaCreateSchemas, MesaUpdateSchemas
+from app.services.event_bus import evento_de_mesa
+from app.services.outbox import registrar_evento
+from app.services.pos_commit import marcar_alteracao
 # from app.crud import crud_comanda # Será necessário para abrir comanda ao abrir mesa
 
 class CRUDMesa:
@@ -20,6 +24,10 @@ class CRUDMesa:
     def get_by_qr_code_hash(self, db: Session, *, qr_code_hash: str) -> Optional[Mesa]:
         return db.query(Mesa).filter(Mesa.qr_code_hash == qr_code_hash).first()
 
+    def get_all_qr_code_hashes(self, db: Session) -> List[str]:
+        """Retorna apenas os hashes de QR Code cadastrados (sem carregar as mesas)."""
+        return [row[0] for row in db.query(Mesa.qr_code_hash).filter(Mesa.qr_code_hash.isnot(None)).all()]
+
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100, status: Optional[StatusMesa] = None
     ) -> List[Mesa]:
@@ -28,13 +36,9 @@ class CRUDMesa:
             query = query.filter(Mesa.status == status)
         return query.order_by(Mesa.numero_identificador).offset(skip).limit(limit).all()
 
-    def _generate_qr_code_hash(self, mesa_id: uuid.UUID, numero_identificador: str) -> str:
-        # Cria um hash único para o QR Code baseado no ID da mesa e um timestamp/salt
-        # Usar o ID da mesa garante unicidade. Adicionar um salt ou timestamp pode ser bom.
-        # Para simplicidade, vamos usar o ID da mesa e o número identificador.
-        timestamp = func.now() # Isso não é um valor fixo, mas para a semente do hash é ok.
-        data_to_hash = f"{str(mesa_id)}-{numero_identificador}-{str(timestamp)}"
-        return hashlib.sha256(data_to_hash.encode()).hexdigest()[:16] # Pega os primeiros 16 chars do hash
+    def _generate_qr_code_hash(self, mesa_id: uuid.UUID) -> str:
+        # O QR Code carrega um token assinado com o id da mesa: pode ser validado sem consultar o banco.
+        return gerar_qr_token(mesa_id)
 
     def create(self, db: Session, *, obj_in: MesaCreateSchemas) -> Mesa:
         # Verificar se já existe mesa com o mesmo número identificador
@@ -42,25 +46,44 @@ class CRUDMesa:
         if existing_mesa:
             raise ValueError(f"Mesa com o número identificador 	\"{obj_in.numero_identificador}	\" já existe.")
 
+        # O id é gerado aqui para que o token do QR Code seja gravado no mesmo commit
+        mesa_id = uuid.uuid4()
         db_obj = Mesa(
+            id=mesa_id,
             numero_identificador=obj_in.numero_identificador,
             capacidade=obj_in.capacidade,
             status=obj_in.status if obj_in.status else StatusMesa.DISPONIVEL,
-            id_cliente_associado=obj_in.id_cliente_associado
+            id_cliente_associado=obj_in.id_cliente_associado,
+            qr_code_hash=self._generate_qr_code_hash(mesa_id)
         )
         db.add(db_obj)
-        db.commit() # Commit para obter o ID da mesa
+        marcar_alteracao(db, "qr_code", mesa_id)
+        db.commit()
         db.refresh(db_obj)
-
-        # Gerar e atribuir o qr_code_hash após a mesa ter um ID
-        if not db_obj.qr_code_hash:
-            db_obj.qr_code_hash = self._generate_qr_code_hash(db_obj.id, db_obj.numero_identificador)
-            db.add(db_obj)
-            db.commit()
-            db.refresh(db_obj)
-            
         return db_obj
 
+    def reemitir_qr_codes(self, db: Session) -> List[uuid.UUID]:
+        """
+        Re-emite o token de QR Code de todas as mesas com a chave atual (após rotação).
+        Carrega apenas os ids e grava tudo num único UPDATE ... FROM (VALUES ...),
+        em vez de um UPDATE por mesa.
+        """
+        ids = [row[0] for row in db.query(Mesa.id).all()]
+        if not ids:
+            return ids
+        novos = values(
+            column("id", PG_UUID(as_uuid=True)), column("qr_code_hash", String), name="novos"
+        ).data([(mesa_id, self._generate_qr_code_hash(mesa_id)) for mesa_id in ids])
+        db.execute(
+            update(Mesa).where(Mesa.id == novos.c.id).values(qr_code_hash=novos.c.qr_code_hash)
+            .execution_options(synchronize_session=False)
+        )
+        for mesa_id in ids:
+            marcar_alteracao(db, "mesa", mesa_id)
+            marcar_alteracao(db, "qr_code", mesa_id)
+        db.commit()
+        return ids
+
     def update(
         self, db: Session, *, db_obj: Mesa, obj_in: Union[MesaUpdateSchemas, Dict[str, Any]]
     ) -> Mesa:
@@ -79,6 +102,7 @@ class CRUDMesa:
                 setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
+        marcar_alteracao(db, "mesa", db_obj.id)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -90,6 +114,7 @@ class CRUDMesa:
             # if any(comanda.status_comanda not in [StatusComanda.FECHADA, StatusComanda.CANCELADA] for comanda in obj.comandas):
             #     raise ValueError("Mesa possui comandas ativas e não pode ser removida.")
             db.delete(obj)
+            marcar_alteracao(db, "mesa", obj.id)
             db.commit()
         return obj
     
@@ -126,11 +151,10 @@ class CRUDMesa:
         id_comanda_nova_placeholder = uuid.uuid4() # Placeholder
 
         db.add(mesa)
+        # Evento gravado no outbox na mesma transação (publicado no Redis pelo relay)
+        registrar_evento(db, evento_de_mesa(mesa))
         db.commit()
         db.refresh(mesa)
-        
-        # Publicar evento no Redis sobre a abertura da mesa
-        # await redis_client.publish_message(f"mesa_{mesa.id}_status", json.dumps({"status": "OCUPADA", "comanda_id": str(id_comanda_nova_placeholder)}))
 
         return mesa, id_comanda_nova_placeholder, None
 
@@ -151,12 +175,10 @@ class CRUDMesa:
         mesa.status = StatusMesa.FECHADA # Ou DISPONIVEL, dependendo da regra de negócio
         # mesa.id_cliente_associado = None # Opcional: desassociar cliente ao fechar
         db.add(mesa)
+        registrar_evento(db, evento_de_mesa(mesa))
         db.commit()
         db.refresh(mesa)
 
-        # Publicar evento no Redis
-        # await redis_client.publish_message(f"mesa_{mesa.id}_status", json.dumps({"status": "FECHADA"}))
-
         return mesa, None
 
 mesa = CRUDMesa()
@@ -11,9 +11,10 @@ from app.db.models.fiado import Fiado # Para registrar fiado se o método for FI
 from app.schemas.pagamento import PagamentoCreate
 from app.crud.crud_comanda import comanda as crud_comanda # Para recalcular e atualizar comanda
 # from app.crud.crud_fiado import fiado as crud_fiado # Para criar registro de fiado
-# from app.services.redis_service import redis_client
-# import json
-# from datetime import datetime
+from app.db.models.mesa import StatusMesa
+from app.schemas.evento_schemas import TipoEvento
+from app.services.event_bus import evento_de_comanda, evento_de_mesa
+from app.services.outbox import registrar_evento
 
 class CRUDPagamento:
     def get(self, db: Session, id: uuid.UUID) -> Optional[Pagamento]:
@@ -22,7 +23,10 @@ class CRUDPagamento:
     def get_multi_by_comanda(self, db: Session, *, comanda_id: uuid.UUID, skip: int = 0, limit: int = 100) -> List[Pagamento]:
         return db.query(Pagamento).filter(Pagamento.id_comanda == comanda_id).order_by(Pagamento.data_criacao.desc()).offset(skip).limit(limit).all()
 
-    def create(self, db: Session, *, obj_in: PagamentoCreate, id_usuario_registrou: Optional[uuid.UUID]) -> Pagamento:
+    def create(
+            self, db: Session, *, obj_in: PagamentoCreate, id_usuario_registrou: Optional[uuid.UUID],
+            id: Optional[uuid.UUID] = None, commit: bool = True
+    ) -> Pagamento:
         comanda_db = db.query(Comanda).filter(Comanda.id == obj_in.id_comanda).first()
         if not comanda_db:
             raise ValueError(f"Comanda com ID {obj_in.id_comanda} não encontrada.")
@@ -40,6 +44,7 @@ class CRUDPagamento:
         #     raise ValueError(f"Valor do pagamento (R$ {obj_in.valor_pago}) excede o valor restante da comanda (R$ {valor_a_pagar_na_comanda}).")
 
         db_pagamento = Pagamento(
+            id=id or uuid.uuid4(),
             id_comanda=obj_in.id_comanda,
             id_cliente=obj_in.id_cliente or comanda_db.id_cliente_associado,
             id_usuario_registrou=id_usuario_registrou,
@@ -70,29 +75,29 @@ class CRUDPagamento:
                 if comanda_db.mesa and comanda_db.mesa.status == StatusMesa.OCUPADA:
                     comanda_db.mesa.status = StatusMesa.FECHADA # Ou DISPONIVEL
                     db.add(comanda_db.mesa)
+                    registrar_evento(db, evento_de_mesa(comanda_db.mesa))
             elif comanda_db.valor_pago > Decimal("0") or comanda_db.valor_fiado > Decimal("0"):
                 if comanda_db.status_comanda != StatusComanda.EM_FIADO:
                      comanda_db.status_comanda = StatusComanda.PAGA_PARCIALMENTE
             
             db.add(comanda_db)
 
+        # Evento gravado no outbox na mesma transação do pagamento
+        db.flush()
+        registrar_evento(db, evento_de_comanda(TipoEvento.PAGAMENTO_REGISTRADO, comanda_db, {
+            "id_pagamento": str(db_pagamento.id),
+            "valor_pago_pagamento": str(db_pagamento.valor_pago),
+            "metodo_pagamento": db_pagamento.metodo_pagamento.value,
+            "status_pagamento": db_pagamento.status_pagamento.value
+        }))
+        if not commit:
+            # Sincronização offline: o commit é de quem chamou
+            return db_pagamento
         db.commit()
         db.refresh(db_pagamento)
         if comanda_db.status_comanda == StatusPagamento.APROVADO:
              db.refresh(comanda_db)
 
-        # Publicar evento no Redis
-        # redis_msg = {
-        #     "evento": "novo_pagamento",
-        #     "pagamento_id": str(db_pagamento.id),
-        #     "comanda_id": str(comanda_db.id),
-        #     "valor_pago": str(db_pagamento.valor_pago),
-        #     "metodo": db_pagamento.metodo_pagamento.value,
-        #     "status_comanda_novo": comanda_db.status_comanda.value,
-        #     "timestamp": datetime.utcnow().isoformat()
-        # }
-        # await redis_client.publish_message(channel=f"comanda_{comanda_db.id}_pagamentos", message=json.dumps(redis_msg))
-
         return db_pagamento
 
     # Pagamentos geralmente não são removidos, mas cancelados (novo status)
@@ -1,19 +1,37 @@
 # app/crud/crud_pedido.py
 import uuid
+from datetime import datetime, timezone
 from typing import List, Optional, Union, Dict, Any
 from decimal import Decimal
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import any_, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 
 from app.db.models.pedido import Pedido, ItemPedido, StatusPedido
 from app.db.models.produto import Produto # Para buscar preço do produto
 from app.db.models.comanda import Comanda, StatusComanda  # Para associar e recalcular comanda
 from app.schemas.pedido import PedidoCreateSchemas, PedidoUpdateSchemas, ItemPedidoCreateSchemas, ItemPedidoUpdateSchemas
 from app.crud.crud_comanda import comanda as crud_comanda # Para recalcular comanda
-# from app.services.redis_service import redis_client # Para publicar eventos
-# import json
-# from datetime import datetime # Para timestamp em notificações Redis
+from app.schemas.evento_schemas import TipoEvento
+from app.services.event_bus import evento_de_item, evento_de_pedido, evento_pedido_pronto, evento_status_lote
+from app.services.outbox import registrar_evento
+from app.services.prep_time import estatisticas_preparo, registrar_transicoes, transicao
+from app.services.status_pedido import STATUS_PEDIDO_ENTREGUES, STATUS_PEDIDO_FINALIZADOS, validar_transicao_status
+
+_ARRAY_UUID = ARRAY(PG_UUID(as_uuid=True))
+
+
+def _qualquer(ids):
+    """`= ANY(:ids)` com um único parâmetro array (um plano só, qualquer que seja o tamanho do lote)."""
+    return any_(literal(list(ids), _ARRAY_UUID))
+
+
+def _agrupar_por_status(alvos: Dict[uuid.UUID, StatusPedido]) -> Dict[StatusPedido, List[uuid.UUID]]:
+    grupos: Dict[StatusPedido, List[uuid.UUID]] = {}
+    for id_, novo_status in alvos.items():
+        grupos.setdefault(novo_status, []).append(id_)
+    return grupos
 
 class CRUDItemPedido:
     def get(self, db: Session, id: uuid.UUID) -> Optional[ItemPedido]:
@@ -22,7 +40,10 @@ class CRUDItemPedido:
     def get_multi_by_pedido(self, db: Session, *, pedido_id: uuid.UUID, skip: int = 0, limit: int = 100) -> List[ItemPedido]:
         return db.query(ItemPedido).filter(ItemPedido.id_pedido == pedido_id).offset(skip).limit(limit).all()
 
-    def create(self, db: Session, *, obj_in: ItemPedidoCreateSchemas, pedido_id: uuid.UUID, comanda_id: uuid.UUID) -> ItemPedido:
+    def create(
+            self, db: Session, *, obj_in: ItemPedidoCreateSchemas, pedido_id: uuid.UUID, comanda_id: uuid.UUID,
+            id: Optional[uuid.UUID] = None
+    ) -> ItemPedido:
         produto = db.query(Produto).filter(Produto.id == obj_in.id_produto).first()
         if not produto:
             raise ValueError(f"Produto com ID {obj_in.id_produto} não encontrado.")
@@ -33,6 +54,7 @@ class CRUDItemPedido:
         preco_total_item = preco_unitario * obj_in.quantidade
 
         db_item = ItemPedido(
+            id=id or uuid.uuid4(),
             id_pedido=pedido_id,
             id_comanda=comanda_id,
             id_produto=obj_in.id_produto,
@@ -42,6 +64,7 @@ class CRUDItemPedido:
             observacoes_item=obj_in.observacoes_item,
             status_item_pedido=StatusPedido.RECEBIDO # Status inicial do item
         )
+        db_item.produto = produto # Categoria disponível para o roteamento do evento, sem nova consulta
         db.add(db_item)
         # O commit será feito após todos os itens do pedido serem adicionados ou no final do CRUDPedido.create
         return db_item
@@ -52,20 +75,16 @@ class CRUDItemPedido:
             return None
         
         # Adicionar lógica de transição de status se necessário
+        if item.status_item_pedido != novo_status:
+            registrar_transicoes(db, [transicao(
+                item.id_pedido, novo_status, item.status_item_pedido, id_item_pedido=item.id, id_produto=item.id_produto
+            )])
         item.status_item_pedido = novo_status
         db.add(item)
+        id_mesa = item.comanda.id_mesa if item.comanda else None
+        registrar_evento(db, evento_de_item(TipoEvento.ITEM_STATUS_ATUALIZADO, item, id_mesa=id_mesa))
         db.commit()
         db.refresh(item)
-
-        # Publicar no Redis
-        # redis_msg = {
-        #     "pedido_id": str(item.id_pedido),
-        #     "item_pedido_id": str(item.id),
-        #     "novo_status": novo_status.value,
-        #     "id_comanda": str(item.id_comanda),
-        #     "timestamp": datetime.utcnow().isoformat()
-        # }
-        # await redis_client.publish_message(channel="pedidos_status_updates", message=json.dumps(redis_msg))
         return item
 
     def remove(self, db: Session, *, id: uuid.UUID) -> Optional[ItemPedido]:
@@ -84,7 +103,21 @@ class CRUDPedido:
     def get_multi_by_comanda(self, db: Session, *, comanda_id: uuid.UUID, skip: int = 0, limit: int = 100) -> List[Pedido]:
         return db.query(Pedido).filter(Pedido.id_comanda == comanda_id).order_by(Pedido.data_criacao.desc()).offset(skip).limit(limit).all()
 
-    def create(self, db: Session, *, obj_in: PedidoCreateSchemas, id_usuario_registrou: Optional[uuid.UUID]) -> Pedido:
+    def get_multi_ativos(self, db: Session, *, skip: int = 0, limit: int = 100) -> List[Pedido]:
+        """Pedidos ainda em andamento (não entregues nem cancelados), do mais antigo para o mais novo."""
+        return db.query(Pedido).filter(
+            Pedido.status_geral_pedido.notin_(STATUS_PEDIDO_FINALIZADOS)
+        ).order_by(Pedido.data_criacao.asc()).offset(skip).limit(limit).all()
+
+    def create(
+            self, db: Session, *, obj_in: PedidoCreateSchemas, id_usuario_registrou: Optional[uuid.UUID],
+            id: Optional[uuid.UUID] = None, commit: bool = True
+    ) -> Pedido:
+        """
+        Cria o pedido com os itens. `id` (e o `id` de cada item, se houver)
+        permite usar os UUIDs gerados pelo cliente; com commit=False tudo fica
+        na transação de quem chamou (sincronização offline).
+        """
         comanda = db.query(Comanda).filter(Comanda.id == obj_in.id_comanda).first()
         if not comanda:
             raise ValueError(f"Comanda com ID {obj_in.id_comanda} não encontrada.")
@@ -92,6 +125,7 @@ class CRUDPedido:
             raise ValueError(f"Não é possível adicionar pedidos a uma comanda que não está Aberta ou Parcialmente Paga (status: {comanda.status_comanda.value}).")
 
         db_pedido = Pedido(
+            id=id or uuid.uuid4(),
             id_comanda=obj_in.id_comanda,
             id_usuario_registrou=id_usuario_registrou,
             tipo_pedido=obj_in.tipo_pedido,
@@ -104,57 +138,243 @@ class CRUDPedido:
         itens_criados = []
         for item_in in obj_in.itens:
             try:
-                item_criado = crud_item_pedido.create(db, obj_in=item_in, pedido_id=db_pedido.id, comanda_id=db_pedido.id_comanda)
+                item_criado = crud_item_pedido.create(
+                    db, obj_in=item_in, pedido_id=db_pedido.id, comanda_id=db_pedido.id_comanda,
+                    id=getattr(item_in, "id", None)
+                )
                 itens_criados.append(item_criado)
             except ValueError as e:
-                db.rollback() # Desfaz a criação do pedido e itens anteriores se um item falhar
+                if commit:
+                    db.rollback() # Desfaz a criação do pedido e itens anteriores se um item falhar
                 raise ValueError(f"Erro ao criar item do pedido: {str(e)}")
         
         db_pedido.itens = itens_criados # Associa os itens criados ao pedido
+        db_pedido.data_hora_entrega_estimada = estatisticas_preparo.eta_pedido(db_pedido)
+        db.flush() # IDs dos itens para o histórico e para o evento
+        registrar_transicoes(db, [transicao(db_pedido.id, StatusPedido.RECEBIDO)] + [
+            transicao(db_pedido.id, StatusPedido.RECEBIDO, id_item_pedido=item.id, id_produto=item.id_produto)
+            for item in itens_criados
+        ])
+        # Evento gravado no outbox na mesma transação do pedido
+        registrar_evento(db, evento_de_pedido(TipoEvento.PEDIDO_CRIADO, db_pedido, id_mesa=comanda.id_mesa))
+        if not commit:
+            crud_comanda.recalcular_total_comanda(db, comanda_id=db_pedido.id_comanda, commit=False)
+            return db_pedido
         db.commit()
         db.refresh(db_pedido)
 
         # Recalcular totais da comanda após adicionar o pedido
         crud_comanda.recalcular_total_comanda(db, comanda_id=db_pedido.id_comanda)
-
-        # Publicar no Redis
-        # redis_msg = {
-        #     "evento": "novo_pedido",
-        #     "pedido_id": str(db_pedido.id),
-        #     "id_comanda": str(db_pedido.id_comanda),
-        #     "id_mesa": str(comanda.id_mesa) if comanda else None,
-        #     "timestamp": datetime.utcnow().isoformat()
-        # }
-        # await redis_client.publish_message(channel="pedidos_novos", message=json.dumps(redis_msg))
         return db_pedido
 
+    def adicionar_item(
+            self, db: Session, *, pedido_id: uuid.UUID, obj_in: ItemPedidoCreateSchemas,
+            id: Optional[uuid.UUID] = None, commit: bool = True
+    ) -> ItemPedido:
+        """Acrescenta um item a um pedido ainda em andamento e recalcula a comanda."""
+        pedido = self.get(db, id=pedido_id)
+        if not pedido:
+            raise ValueError(f"Pedido com ID {pedido_id} não encontrado.")
+        if pedido.status_geral_pedido in STATUS_PEDIDO_FINALIZADOS:
+            raise ValueError(f"Não é possível adicionar itens a um pedido {pedido.status_geral_pedido.value}.")
+        comanda = pedido.comanda
+        if comanda.status_comanda not in [StatusComanda.ABERTA, StatusComanda.PAGA_PARCIALMENTE]:
+            raise ValueError(f"Não é possível adicionar itens a uma comanda que não está Aberta ou Parcialmente Paga (status: {comanda.status_comanda.value}).")
+
+        item = crud_item_pedido.create(db, obj_in=obj_in, pedido_id=pedido.id, comanda_id=pedido.id_comanda, id=id)
+        db.flush()
+        registrar_transicoes(db, [
+            transicao(pedido.id, StatusPedido.RECEBIDO, id_item_pedido=item.id, id_produto=item.id_produto)
+        ])
+        registrar_evento(db, evento_de_item(TipoEvento.ITEM_ADICIONADO, item, id_mesa=comanda.id_mesa))
+        crud_comanda.recalcular_total_comanda(db, comanda_id=pedido.id_comanda, commit=commit)
+        if commit:
+            db.refresh(item)
+        return item
+
     def update_status_geral(self, db: Session, *, pedido_id: uuid.UUID, novo_status: StatusPedido) -> Optional[Pedido]:
         pedido = self.get(db, id=pedido_id)
         if not pedido:
             return None
         
         # Adicionar lógica de transição de status se necessário
+        ficou_pronto = (
+            novo_status == StatusPedido.PRONTO_PARA_ENTREGA and pedido.status_geral_pedido != novo_status
+        )
+        agora = datetime.now(timezone.utc)
+        transicoes = []
+        if pedido.status_geral_pedido != novo_status:
+            transicoes.append(transicao(pedido.id, novo_status, pedido.status_geral_pedido, ocorrido_em=agora))
         pedido.status_geral_pedido = novo_status
+        if novo_status in STATUS_PEDIDO_ENTREGUES and pedido.data_hora_entregue is None:
+            pedido.data_hora_entregue = agora
         # Atualizar status de todos os itens do pedido para o novo status geral, se aplicável
         # ou tratar status de itens individualmente
         for item in pedido.itens:
             if item.status_item_pedido not in [StatusPedido.ENTREGUE_NA_MESA, StatusPedido.ENTREGUE_CLIENTE_EXTERNO, StatusPedido.CANCELADO]:
+                if item.status_item_pedido != novo_status:
+                    transicoes.append(transicao(
+                        pedido.id, novo_status, item.status_item_pedido, id_item_pedido=item.id,
+                        id_produto=item.id_produto, ocorrido_em=agora
+                    ))
                 item.status_item_pedido = novo_status
-        
+        registrar_transicoes(db, transicoes)
+
         db.add(pedido)
+        id_mesa = pedido.comanda.id_mesa if pedido.comanda else None
+        registrar_evento(db, evento_de_pedido(TipoEvento.PEDIDO_STATUS_ATUALIZADO, pedido, id_mesa=id_mesa))
+        if ficou_pronto and pedido.id_usuario_registrou:
+            # Só o garçom que registrou o pedido é avisado, em vez de todos os tablets
+            registrar_evento(db, evento_pedido_pronto(pedido, pedido.comanda.mesa if pedido.comanda else None))
         db.commit()
         db.refresh(pedido)
-
-        # Publicar no Redis
-        # redis_msg = {
-        #     "pedido_id": str(pedido.id),
-        #     "novo_status_geral": novo_status.value,
-        #     "id_comanda": str(pedido.id_comanda),
-        #     "timestamp": datetime.utcnow().isoformat()
-        # }
-        # await redis_client.publish_message(channel="pedidos_status_updates", message=json.dumps(redis_msg))
         return pedido
 
+    def update_status_lote(
+            self, db: Session, *, pedidos: Dict[uuid.UUID, StatusPedido], itens: Dict[uuid.UUID, StatusPedido]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Muda o status de vários pedidos e/ou itens numa transação, com um UPDATE
+        por status de destino (`WHERE id = ANY(:ids) RETURNING`) em vez de
+        carregar e gravar cada pedido. Entradas inválidas são rejeitadas uma a
+        uma e não impedem as demais. Gera um único evento em lote.
+        """
+        agora = datetime.now(timezone.utc)
+        atualizados: List[Dict[str, Any]] = []
+        rejeitados: List[Dict[str, Any]] = []
+
+        linhas_pedidos = {
+            linha.id: linha for linha in db.execute(
+                select(Pedido.id, Pedido.id_comanda, Pedido.status_geral_pedido, Comanda.id_mesa)
+                .join(Comanda, Pedido.id_comanda == Comanda.id)
+                .where(Pedido.id == _qualquer(pedidos))
+                .with_for_update(of=Pedido)
+            )
+        } if pedidos else {}
+        pedidos_validos: Dict[uuid.UUID, StatusPedido] = {}
+        for pedido_id, novo_status in pedidos.items():
+            linha = linhas_pedidos.get(pedido_id)
+            erro = "Pedido não encontrado" if linha is None else (
+                None if linha.status_geral_pedido == novo_status
+                else validar_transicao_status(linha.status_geral_pedido, novo_status)
+            )
+            if erro:
+                rejeitados.append({"id": pedido_id, "tipo": "pedido", "erro": erro})
+            elif linha.status_geral_pedido != novo_status:
+                pedidos_validos[pedido_id] = novo_status
+
+        # Itens pedidos explicitamente e os dos pedidos que mudam (cascata do status geral)
+        filtro_itens = []
+        if itens:
+            filtro_itens.append(ItemPedido.id == _qualquer(itens))
+        if pedidos_validos:
+            filtro_itens.append(ItemPedido.id_pedido == _qualquer(pedidos_validos))
+        linhas_itens = {
+            linha.id: linha for linha in db.execute(
+                select(ItemPedido.id, ItemPedido.id_pedido, ItemPedido.id_comanda, ItemPedido.id_produto,
+                       ItemPedido.status_item_pedido, Produto.categoria, Comanda.id_mesa)
+                .join(Produto, ItemPedido.id_produto == Produto.id)
+                .join(Comanda, ItemPedido.id_comanda == Comanda.id)
+                .where(or_(*filtro_itens))
+                .with_for_update(of=ItemPedido)
+            )
+        } if filtro_itens else {}
+        itens_validos: Dict[uuid.UUID, StatusPedido] = {}
+        for item_id, novo_status in itens.items():
+            linha = linhas_itens.get(item_id)
+            if linha is None:
+                erro = "Item do pedido não encontrado"
+            elif linha.id_pedido in pedidos:
+                erro = "O pedido do item está no mesmo lote"
+            elif linha.status_item_pedido == novo_status:
+                continue
+            else:
+                erro = validar_transicao_status(linha.status_item_pedido, novo_status)
+            if erro:
+                rejeitados.append({"id": item_id, "tipo": "item", "erro": erro})
+            else:
+                itens_validos[item_id] = novo_status
+
+        transicoes = []
+        categorias_do_pedido: Dict[uuid.UUID, set] = {}
+        for linha in linhas_itens.values():
+            if linha.categoria:
+                categorias_do_pedido.setdefault(linha.id_pedido, set()).add(linha.categoria)
+
+        for novo_status, ids in _agrupar_por_status(pedidos_validos).items():
+            valores = {"status_geral_pedido": novo_status}
+            if novo_status in STATUS_PEDIDO_ENTREGUES:
+                valores["data_hora_entregue"] = func.coalesce(Pedido.data_hora_entregue, agora)
+            alterados = db.execute(
+                update(Pedido).where(Pedido.id == _qualquer(ids)).values(**valores).returning(Pedido.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            cascata = set(db.execute(
+                update(ItemPedido)
+                .where(
+                    ItemPedido.id_pedido == _qualquer(alterados),
+                    ItemPedido.status_item_pedido.notin_(STATUS_PEDIDO_FINALIZADOS),
+                    ItemPedido.status_item_pedido != novo_status
+                )
+                .values(status_item_pedido=novo_status).returning(ItemPedido.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()) if alterados else set()
+            for pedido_id in alterados:
+                linha = linhas_pedidos[pedido_id]
+                transicoes.append(transicao(pedido_id, novo_status, linha.status_geral_pedido, ocorrido_em=agora))
+                atualizados.append({
+                    "id": pedido_id, "tipo": "pedido", "status_anterior": linha.status_geral_pedido,
+                    "status": novo_status, "id_pedido": pedido_id, "id_comanda": linha.id_comanda,
+                    "id_mesa": linha.id_mesa, "categorias": sorted(categorias_do_pedido.get(pedido_id, ())),
+                })
+            transicoes.extend(
+                transicao(linha.id_pedido, novo_status, linha.status_item_pedido, id_item_pedido=linha.id,
+                          id_produto=linha.id_produto, ocorrido_em=agora)
+                for linha in linhas_itens.values() if linha.id in cascata
+            )
+
+        for novo_status, ids in _agrupar_por_status(itens_validos).items():
+            alterados = db.execute(
+                update(ItemPedido).where(ItemPedido.id == _qualquer(ids))
+                .values(status_item_pedido=novo_status).returning(ItemPedido.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            for item_id in alterados:
+                linha = linhas_itens[item_id]
+                transicoes.append(transicao(
+                    linha.id_pedido, novo_status, linha.status_item_pedido, id_item_pedido=item_id,
+                    id_produto=linha.id_produto, ocorrido_em=agora
+                ))
+                atualizados.append({
+                    "id": item_id, "tipo": "item", "status_anterior": linha.status_item_pedido,
+                    "status": novo_status, "id_pedido": linha.id_pedido, "id_comanda": linha.id_comanda,
+                    "id_mesa": linha.id_mesa, "categorias": [linha.categoria] if linha.categoria else [],
+                })
+
+        if atualizados:
+            registrar_transicoes(db, transicoes)
+            registrar_evento(db, evento_status_lote([
+                {
+                    "id_pedido": str(entrada["id_pedido"]),
+                    "id_item_pedido": str(entrada["id"]) if entrada["tipo"] == "item" else None,
+                    "id_comanda": str(entrada["id_comanda"]),
+                    "id_mesa": str(entrada["id_mesa"]) if entrada["id_mesa"] else None,
+                    "status": entrada["status"].value,
+                    "categorias": entrada["categorias"],
+                }
+                for entrada in atualizados
+            ]))
+            prontos = [
+                entrada["id"] for entrada in atualizados
+                if entrada["tipo"] == "pedido" and entrada["status"] == StatusPedido.PRONTO_PARA_ENTREGA
+            ]
+            if prontos:
+                # Notificação individual ao garçom, como em update_status_geral
+                for pedido in db.query(Pedido).filter(Pedido.id.in_(prontos), Pedido.id_usuario_registrou.isnot(None)):
+                    registrar_evento(db, evento_pedido_pronto(pedido, pedido.comanda.mesa if pedido.comanda else None))
+        db.commit()
+        return {"atualizados": atualizados, "rejeitados": rejeitados}
+
     # Outras funções CRUD (get_multi, delete se necessário) podem ser adicionadas.
 
 crud_item_pedido = CRUDItemPedido()
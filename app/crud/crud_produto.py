@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 
 from app.db.models.produto import Produto
 from app.schemas.produto import ProdutoCreate, ProdutoUpdate
+from app.services.pos_commit import marcar_alteracao
 
 class CRUDProduto:
     def get(self, db: Session, id: uuid.UUID) -> Optional[Produto]:
@@ -46,6 +47,7 @@ class CRUDProduto:
                 setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
+        marcar_alteracao(db, "produto", db_obj.id)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -54,6 +56,7 @@ class CRUDProduto:
         obj = db.query(Produto).get(id)
         if obj:
             db.delete(obj)
+            marcar_alteracao(db, "produto", obj.id)
             db.commit()
         return obj
 
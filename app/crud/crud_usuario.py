@@ -4,7 +4,7 @@ import uuid
 
 from sqlalchemy.orm import Session
 
-from app.core.security import get_password_hash, verify_password # Assuming this path is correct
+from app.core.security import verificar_senha # Assuming this path is correct
 from app.models.usuario import Usuario # Corrected import path for the model
 from app.schemas.usuario_schemas import UsuarioCreateSchemas, UsuarioUpdateSchemas # Corrected import path
 
@@ -20,14 +20,15 @@ class CRUDUsuario:
     ) -> List[Usuario]:
         return db.query(Usuario).offset(skip).limit(limit).all()
 
-    def create_user(self, db: Session, *, user_create: UsuarioCreateSchemas) -> Usuario:
+    def create_user(self, db: Session, *, user_create: UsuarioCreateSchemas, hashed_password: str) -> Usuario:
+        # O hash chega pronto: quem chama o gera fora do event loop com security.gerar_hash_senha
         # Note: The original `create` method was here. Renaming to `create_user` for clarity
         # or ensuring the endpoint calls the correct CRUD method.
         # The original UsuarioCreateSchemas might not have `cargo`. This needs to be aligned.
         # For now, assuming UsuarioCreateSchemas has all necessary fields including password (not hashed).
         db_obj = Usuario(
             email=user_create.email,
-            hashed_password=get_password_hash(user_create.password),
+            hashed_password=hashed_password,
             nome_completo=user_create.nome_completo,
             # cargo=user_create.cargo, # Add if cargo is part of UsuarioCreateSchemas and Usuario model
             is_active=user_create.is_active if user_create.is_active is not None else True,
@@ -39,20 +40,22 @@ class CRUDUsuario:
         return db_obj
     
     # Alias for compatibility if other parts of code use `create`
-    def create(self, db: Session, *, obj_in: UsuarioCreateSchemas) -> Usuario:
-        return self.create_user(db=db, user_create=obj_in)
+    def create(self, db: Session, *, obj_in: UsuarioCreateSchemas, hashed_password: str) -> Usuario:
+        return self.create_user(db=db, user_create=obj_in, hashed_password=hashed_password)
 
     def update(
-        self, db: Session, *, db_obj: Usuario, obj_in: Union[UsuarioUpdateSchemas, Dict[str, Any]]
+        self, db: Session, *, db_obj: Usuario, obj_in: Union[UsuarioUpdateSchemas, Dict[str, Any]],
+        hashed_password: Optional[str] = None
     ) -> Usuario:
+        """Troca de senha: `hashed_password` gerado por quem chama (security.gerar_hash_senha)."""
         if isinstance(obj_in, dict):
-            update_data = obj_in
+            update_data = dict(obj_in)
         else:
             update_data = obj_in.model_dump(exclude_unset=True)
         
-        if "password" in update_data and update_data["password"]:
-            hashed_password = get_password_hash(update_data["password"])
-            del update_data["password"]
+        if update_data.pop("password", None):
+            if hashed_password is None:
+                raise ValueError("Nova senha sem hash: gere-o com security.gerar_hash_senha")
             update_data["hashed_password"] = hashed_password
         
         for field in update_data: # Itera sobre os campos fornecidos para atualização
@@ -64,14 +67,21 @@ class CRUDUsuario:
         db.refresh(db_obj)
         return db_obj
 
-    def authenticate(
+    async def authenticate(
         self, db: Session, *, email: str, password: str
     ) -> Optional[Usuario]:
         user = self.get_by_email(db, email=email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        # bcrypt roda no pool limitado de app.core.security, fora do event loop
+        valida, novo_hash = await verificar_senha(password, user.hashed_password)
+        if not valida:
             return None
+        if novo_hash:
+            # Hash com custo antigo: regravado de forma transparente com os parâmetros atuais
+            user.hashed_password = novo_hash
+            db.add(user)
+            db.commit()
         return user
 
     def is_active(self, user: Usuario) -> bool:
@@ -1,12 +1,20 @@
+import hmac
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles  # Para servir arquivos estáticos se necessário
 
 from app.core.config import settings
 from app.api.v1.router import api_router_v1
-from app.database import engine
+from app.database import engine, AsyncSessionLocal
 from app.db import base_class  # Import Base para criação de tabelas
+from app.core.metrics import registry
+from app.services.idempotencia import IdempotenciaMiddleware
+from app.services.outbox import outbox_relay
+from app.services.pos_commit import acoes_pos_commit
+from app.services.rate_limiter import LimiteRequisicoesMiddleware
+from app.services.realtime import realtime_hub
+from app.services.redis_service import redis_service
 
 # Configuração básica de logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +34,13 @@ app = FastAPI(
     },
 )
 
+# Idempotency-Key nas criações de pedidos e pagamentos; por dentro do limite de taxa
+app.add_middleware(IdempotenciaMiddleware)
+
+# Limite de taxa do login e das rotas públicas, antes do endpoint (o CORS, adicionado
+# depois, fica por fora e também marca as respostas 429)
+app.add_middleware(LimiteRequisicoesMiddleware)
+
 # Configuração de CORS
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -46,6 +61,77 @@ if settings.ENVIRONMENT == "development":
         logger.info("Tabelas criadas com sucesso (apenas em desenvolvimento)")
 
 
+@app.on_event("startup")
+async def conectar_redis():
+    # Um único pool de conexões por worker, compartilhado por todos os serviços
+    if not await redis_service.connect():
+        logger.warning("Redis indisponível na inicialização; recursos em tempo real ficam degradados")
+        return
+    from app.services.kds_stream import kds_stream_service
+    await kds_stream_service.inicializar()
+
+
+@app.on_event("startup")
+async def iniciar_relay_outbox():
+    # Um relay por worker, mas só o que obtém pg_try_advisory_xact_lock drena;
+    # os demais ficam de reserva (ver OutboxRelay)
+    outbox_relay.iniciar()
+
+
+@app.on_event("startup")
+async def iniciar_acoes_pos_commit():
+    # Caches invalidados, comandas digitais regravadas e QR Codes novos no filtro
+    # depois de cada commit, por qualquer CRUD que escreva
+    from app.services.cache_service import preparar_invalidacao
+    from app.services.comanda_digital_service import comanda_digital_service
+    from app.services.qr_code_filter import qr_code_filter
+    acoes_pos_commit.registrar(preparar_invalidacao)
+    acoes_pos_commit.registrar(comanda_digital_service.preparar_snapshots)
+    acoes_pos_commit.registrar(qr_code_filter.preparar_registro)
+    acoes_pos_commit.iniciar()
+
+
+@app.on_event("shutdown")
+async def desconectar_redis():
+    from app.services.prep_time import estatisticas_preparo
+    await estatisticas_preparo.parar()
+    await outbox_relay.parar()
+    await realtime_hub.parar()
+    await redis_service.disconnect()
+
+
+@app.on_event("startup")
+async def carregar_filtro_qr_codes():
+    from app.services.qr_code_filter import qr_code_filter
+    try:
+        async with AsyncSessionLocal() as session:
+            await qr_code_filter.inicializar(session)
+    except Exception as e:
+        # Sem filtro, as consultas por hash seguem direto para o banco
+        logger.error(f"Não foi possível carregar o filtro de QR Codes: {e}")
+
+
+@app.on_event("startup")
+async def carregar_filas_estacoes():
+    from app.services.station_router import roteador_estacoes
+    # Observa antes de carregar: eventos que chegarem durante a carga não se perdem
+    realtime_hub.observar(roteador_estacoes.processar_evento)
+    try:
+        async with AsyncSessionLocal() as session:
+            await roteador_estacoes.inicializar(session)
+    except Exception as e:
+        # As filas passam a refletir só os pedidos criados a partir de agora
+        logger.error(f"Não foi possível carregar as filas das estações: {e}")
+    from app.services.prep_time import estatisticas_preparo
+    try:
+        async with AsyncSessionLocal() as session:
+            await estatisticas_preparo.inicializar(session)
+    except Exception as e:
+        # Sem histórico, as estimativas partem dos tempos fixos por categoria
+        logger.error(f"Não foi possível carregar os tempos de preparo: {e}")
+    estatisticas_preparo.iniciar()
+
+
 # Inclui todas as rotas da API V1
 app.include_router(api_router_v1, prefix=settings.API_V1_STR)
 
@@ -58,6 +144,20 @@ async def read_root():
         "environment": settings.ENVIRONMENT
     }
 
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+async def metrics(request: Request):
+    """Métricas do worker em formato texto do Prometheus (protegidas por METRICS_TOKEN)"""
+    if settings.METRICS_TOKEN:
+        autorizacao = request.headers.get("authorization", "")
+        if not hmac.compare_digest(autorizacao.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"})
+    elif settings.ENVIRONMENT != "development":
+        # Sem token configurado, as métricas internas não ficam expostas fora do desenvolvimento
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    from app.services.station_router import roteador_estacoes
+    roteador_estacoes.atualizar_metricas()  # espera das filas medida no momento da coleta
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health", tags=["Health Check"])
 async def health_check():
     """Endpoint para verificação de saúde da API"""
@@ -0,0 +1,19 @@
+# app/db/models/estatistica_preparo.py
+from sqlalchemy import Column, Float, Integer, String, Text
+
+from app.db.base_class import Base
+
+class EstatisticaPreparo(Base):
+    """
+    Snapshot periódico do histograma de tempo de preparo de um produto ou de uma
+    estação (app.services.prep_time), recarregado quando o worker inicia.
+    """
+    __tablename__ = "estatisticas_preparo"
+
+    chave = Column(String, nullable=False, unique=True, index=True) # "produto:<id>" ou "estacao:<nome>"
+    estacao = Column(String, nullable=True)
+    amostras = Column(Integer, nullable=False, default=0)
+    p50_segundos = Column(Float, nullable=True)
+    p90_segundos = Column(Float, nullable=True)
+    p99_segundos = Column(Float, nullable=True)
+    contagens = Column(Text, nullable=False) # Buckets do histograma em JSON {indice: contagem}
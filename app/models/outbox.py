@@ -0,0 +1,27 @@
+# app/db/models/outbox.py
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from app.db.base_class import Base
+
+class EventoOutbox(Base):
+    """
+    Evento de domínio gravado na mesma transação da mudança de estado (transactional outbox).
+    O relay (app.services.outbox) publica no Redis e marca `publicado_em`; evento que
+    não pode ser publicado fica na fila morta, com `descartado_em`.
+    """
+    __tablename__ = "eventos_outbox"
+
+    canal = Column(String, nullable=False)
+    tipo = Column(String, nullable=False)
+    payload = Column(Text, nullable=False) # Evento serializado em JSON
+    publicado_em = Column(DateTime(timezone=True), nullable=True)
+    tentativas = Column(Integer, default=0, nullable=False)
+    descartado_em = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Só os pendentes são varridos pelo relay
+        Index(
+            "ix_eventos_outbox_pendentes", "data_criacao",
+            postgresql_where=publicado_em.is_(None) & descartado_em.is_(None)
+        ),
+    )
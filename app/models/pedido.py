@@ -35,8 +35,8 @@ class Pedido(Base):
     tipo_pedido = Column(SAEnum(TipoPedido), default=TipoPedido.INTERNO_MESA, nullable=False)
     status_geral_pedido = Column(SAEnum(StatusPedido), default=StatusPedido.RECEBIDO, nullable=False)
     observacoes_pedido = Column(Text, nullable=True)
-    # data_hora_entrega_estimada = Column(DateTime(timezone=True), nullable=True)
-    # data_hora_entregue = Column(DateTime(timezone=True), nullable=True)
+    data_hora_entrega_estimada = Column(DateTime(timezone=True), nullable=True) # ETA pelos tempos de preparo observados
+    data_hora_entregue = Column(DateTime(timezone=True), nullable=True)
 
     # Relacionamentos
     comanda = relationship("Comanda") # Um pedido pertence a uma comanda
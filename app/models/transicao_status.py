@@ -0,0 +1,23 @@
+# app/db/models/transicao_status.py
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String
+
+from app.db.base_class import Base
+
+class TransicaoStatus(Base):
+    """
+    Histórico append-only das mudanças de status de pedidos e itens (nunca
+    atualizado nem apagado pela API). Linhas de pedido têm `id_item_pedido` nulo.
+    """
+    __tablename__ = "transicoes_status"
+
+    id_pedido = Column(ForeignKey("pedidos.id"), nullable=False)
+    id_item_pedido = Column(ForeignKey("itempedidos.id"), nullable=True)
+    id_produto = Column(ForeignKey("produtos.id"), nullable=True) # Denormalizado para as análises por produto
+    status_anterior = Column(String, nullable=True) # Nulo na criação
+    status_novo = Column(String, nullable=False)
+    ocorrido_em = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_transicoes_status_pedido", "id_pedido", "ocorrido_em"),
+        Index("ix_transicoes_status_produto", "id_produto", "ocorrido_em"),
+    )
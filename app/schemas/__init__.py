@@ -1,6 +1,6 @@
 # app/schemas/__init__.py
 from .cliente_schemas import Cliente, ClienteCreate, ClienteUpdate
-from .comanda_schemas import Comanda, ComandaCreate, ComandaUpdate
+from .comanda_schemas import Comanda, ComandaCreate, ComandaUpdate, ComandaDigital
 from .item_pedido_schemas import ItemPedido, ItemPedidoCreate, ItemPedidoUpdate
 from .mesa_schemas import Mesa, MesaCreate, MesaUpdate
 from .pagamento_schemas import Pagamento, PagamentoCreate
@@ -69,12 +69,14 @@ class Comanda(ComandaBase):
 
 
 class ComandaDigital(BaseModel):
+    """Visão pública da comanda ativa de uma mesa (acessada via QR Code)."""
     id: uuid.UUID
-    id_mesa: uuid.UUID
-    status_pagamento: str
-    valor_total: Decimal
-    data_criacao: datetime
-    pedidos: List[Pedido] = []
+    numero_mesa: str
+    status_comanda: str
+    valor_total_calculado: Decimal
+    valor_pago: Decimal
+    valor_restante: Decimal
+    data_abertura: datetime
 
     class Config:
         from_attributes = True
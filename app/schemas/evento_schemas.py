@@ -0,0 +1,108 @@
+# app/schemas/evento_schemas.py
+from typing import Optional, Dict, Any, List
+from uuid import UUID
+from datetime import datetime, timezone
+from enum import Enum
+from pydantic import BaseModel, Field
+
+# Canais Redis dos eventos de domínio
+CANAL_PEDIDOS = "pedidos_updates"
+CANAL_COMANDAS = "comandas_updates"
+CANAL_MESAS = "mesas_updates"
+# Notificações direcionadas a um usuário (id em dados["id_usuario"])
+CANAL_NOTIFICACOES = "notificacoes_usuarios"
+
+
+class TipoEvento(str, Enum):
+    PEDIDO_CRIADO = "pedido_criado"
+    PEDIDO_STATUS_ATUALIZADO = "pedido_status_atualizado"
+    ITEM_ADICIONADO = "item_adicionado"
+    ITEM_STATUS_ATUALIZADO = "item_status_atualizado"
+    COMANDA_ATUALIZADA = "comanda_atualizada"
+    PAGAMENTO_REGISTRADO = "pagamento_registrado"
+    FIADO_REGISTRADO = "fiado_registrado"
+    MESA_ATUALIZADA = "mesa_atualizada"
+    PEDIDO_PRONTO = "pedido_pronto"
+    # Várias mudanças de status num evento só; dados["atualizacoes"] traz uma entrada por pedido/item
+    STATUS_ATUALIZADO_LOTE = "status_atualizado_lote"
+
+
+class Evento(BaseModel):
+    """Evento de domínio publicado no Redis para telas em tempo real (cozinha, bar, salão)."""
+    tipo: TipoEvento
+    canal: str = CANAL_PEDIDOS
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    id_pedido: Optional[UUID] = None
+    id_item_pedido: Optional[UUID] = None
+    id_comanda: Optional[UUID] = None
+    id_mesa: Optional[UUID] = None
+    status: Optional[str] = None
+    categorias: List[str] = [] # Categorias dos produtos envolvidos (roteamento para cozinha/bar)
+    dados: Dict[str, Any] = {}
+
+    def expandir(self) -> List["Evento"]:
+        """
+        Eventos individuais de um STATUS_ATUALIZADO_LOTE (PEDIDO_ ou
+        ITEM_STATUS_ATUALIZADO), para quem só conhece os eventos por entidade.
+        Os demais tipos retornam a si mesmos.
+        """
+        if self.tipo != TipoEvento.STATUS_ATUALIZADO_LOTE:
+            return [self]
+        return [
+            Evento(
+                tipo=TipoEvento.ITEM_STATUS_ATUALIZADO if entrada.get("id_item_pedido")
+                else TipoEvento.PEDIDO_STATUS_ATUALIZADO,
+                canal=self.canal,
+                timestamp=self.timestamp,
+                id_pedido=entrada.get("id_pedido"),
+                id_item_pedido=entrada.get("id_item_pedido"),
+                id_comanda=entrada.get("id_comanda"),
+                id_mesa=entrada.get("id_mesa"),
+                status=entrada.get("status"),
+                categorias=entrada.get("categorias") or [],
+            )
+            for entrada in self.dados.get("atualizacoes", [])
+        ]
+
+
+class EntradaFilaKds(BaseModel):
+    """Entrada da fila durável de uma estação (id do Redis Stream + evento)."""
+    id: str
+    evento: Evento
+
+
+class ConfirmacaoFilaKds(BaseModel):
+    ids: List[str]
+
+
+class ItemFilaEstacao(BaseModel):
+    """Item aberto na fila priorizada de uma estação."""
+    id: UUID
+    id_pedido: UUID
+    id_mesa: Optional[UUID] = None
+    id_produto: Optional[str] = None
+    categoria: Optional[str] = None
+    quantidade: int
+    status: str
+    recebido_em: datetime
+    tempo_preparo_segundos: float
+    inicio_previsto: datetime
+
+
+class ResumoEstacao(BaseModel):
+    estacao: str
+    profundidade: int
+    em_preparo: int
+    espera_segundos: float
+
+
+class EstatisticaPreparoResumo(BaseModel):
+    """Quantis do tempo até o item ficar pronto, de um produto ou de uma estação."""
+    chave: str
+    estacao: Optional[str] = None
+    amostras: int
+    p50_segundos: Optional[float] = None
+    p90_segundos: Optional[float] = None
+    p99_segundos: Optional[float] = None
+    sla_segundos: Optional[int] = None
+    dentro_sla: Optional[float] = None  # fração dos itens prontos dentro do SLA
@@ -1,13 +1,15 @@
 # app/schemas/pedido_schemas.py
-from typing import List, Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from .item_pedido_schemas import ItemPedido, ItemPedidoCreate # Assuming these are defined elsewhere
 from .usuario_schemas import UsuarioSchemas # Assuming UsuarioSchemas is defined
 from enum import Enum
 
+from app.models.pedido import StatusPedido as StatusPedidoModelo # Status gravados no banco
+
 class StatusPedido(Enum):
     PENDENTE = "Pendente"
     FINALIZADO = "Finalizado"
@@ -34,6 +36,8 @@ class PedidoSchemas(PedidoBaseSchemas):
     data_ultima_atualizacao: datetime
     valor_total: float
     usuario_id: Optional[UUID] = None
+    data_hora_entrega_estimada: Optional[datetime] = None
+    data_hora_entregue: Optional[datetime] = None
 
     itens_pedido: List[ItemPedido] = []
     usuario: Optional[UsuarioSchemas] = None
@@ -41,3 +45,28 @@ class PedidoSchemas(PedidoBaseSchemas):
     class Config:
         from_attributes = True
 
+
+
+class AtualizacaoStatusLote(BaseModel):
+    id: UUID
+    tipo: Literal["pedido", "item"] = "pedido"
+    status: StatusPedidoModelo
+
+class StatusLoteRequest(BaseModel):
+    atualizacoes: List[AtualizacaoStatusLote] = Field(..., min_length=1, max_length=500)
+
+class StatusAtualizadoLote(BaseModel):
+    id: UUID
+    tipo: str
+    id_pedido: UUID
+    status_anterior: StatusPedidoModelo
+    status: StatusPedidoModelo
+
+class StatusRejeitadoLote(BaseModel):
+    id: UUID
+    tipo: str
+    erro: str
+
+class StatusLoteResponse(BaseModel):
+    atualizados: List[StatusAtualizadoLote] = []
+    rejeitados: List[StatusRejeitadoLote] = []
@@ -0,0 +1,141 @@
+# app/schemas/sincronizacao_schemas.py
+from typing import Annotated, List, Literal, Optional, Union
+from uuid import UUID
+from datetime import datetime
+from decimal import Decimal
+from pydantic import BaseModel, Field
+
+from app.models.comanda import StatusComanda
+from app.models.mesa import StatusMesa
+from app.models.pagamento import MetodoPagamento, StatusPagamento
+from app.models.pedido import StatusPedido, TipoPedido
+
+# Operações enfileiradas pelo tablet sem rede. O `id` de cada operação é o UUID
+# gerado no tablet para o registro que ela cria (comanda, pedido, item ou
+# pagamento): operações seguintes do lote o referenciam e o reenvio do lote não
+# duplica nada.
+
+class ItemSincronizacao(BaseModel):
+    id: Optional[UUID] = None
+    id_produto: UUID
+    quantidade: int = Field(1, gt=0)
+    observacoes_item: Optional[str] = None
+
+class AbrirMesaOperacao(BaseModel):
+    tipo: Literal["abrir_mesa"]
+    id: UUID # id da comanda aberta
+    id_mesa: UUID
+    id_cliente_associado: Optional[UUID] = None
+
+class CriarPedidoOperacao(BaseModel):
+    tipo: Literal["criar_pedido"]
+    id: UUID
+    id_comanda: UUID
+    tipo_pedido: TipoPedido = TipoPedido.INTERNO_MESA
+    observacoes_pedido: Optional[str] = None
+    itens: List[ItemSincronizacao] = Field(..., min_length=1)
+
+class AdicionarItemOperacao(ItemSincronizacao):
+    tipo: Literal["adicionar_item"]
+    id: UUID
+    id_pedido: UUID
+
+class RegistrarPagamentoOperacao(BaseModel):
+    tipo: Literal["registrar_pagamento"]
+    id: UUID
+    id_comanda: UUID
+    id_cliente: Optional[UUID] = None
+    valor_pago: Decimal = Field(..., gt=0)
+    metodo_pagamento: MetodoPagamento
+    status_pagamento: Optional[StatusPagamento] = None
+    detalhes_transacao: Optional[str] = None
+    observacoes: Optional[str] = None
+
+OperacaoSincronizacao = Annotated[
+    Union[AbrirMesaOperacao, CriarPedidoOperacao, AdicionarItemOperacao, RegistrarPagamentoOperacao],
+    Field(discriminator="tipo")
+]
+
+class SincronizacaoRequest(BaseModel):
+    cursor: Optional[datetime] = None # `cursor` da última sincronização; ausente no primeiro uso
+    operacoes: List[OperacaoSincronizacao] = Field(default_factory=list, max_length=500)
+
+class ResultadoOperacao(BaseModel):
+    id_cliente: UUID
+    tipo: str
+    resultado: Literal["aplicada", "repetida", "rejeitada"]
+    id: Optional[UUID] = None # id no servidor; difere de id_cliente se a mesa já tinha comanda aberta
+    erro: Optional[str] = None
+
+# Estado alterado no servidor, só com os campos que o tablet guarda
+
+class MesaSincronizacao(BaseModel):
+    id: UUID
+    numero_identificador: str
+    capacidade: Optional[int] = None
+    status: StatusMesa
+    id_cliente_associado: Optional[UUID] = None
+    atualizado_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ComandaSincronizacao(BaseModel):
+    id: UUID
+    id_mesa: UUID
+    id_cliente_associado: Optional[UUID] = None
+    status_comanda: StatusComanda
+    valor_total_calculado: Decimal
+    valor_pago: Decimal
+    valor_fiado: Decimal
+    atualizado_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class PedidoSincronizacao(BaseModel):
+    id: UUID
+    id_comanda: UUID
+    tipo_pedido: TipoPedido
+    status_geral_pedido: StatusPedido
+    observacoes_pedido: Optional[str] = None
+    data_hora_entrega_estimada: Optional[datetime] = None
+    atualizado_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class ItemPedidoSincronizacao(BaseModel):
+    id: UUID
+    id_pedido: UUID
+    id_comanda: UUID
+    id_produto: UUID
+    quantidade: int
+    preco_total_item: Decimal
+    status_item_pedido: StatusPedido
+    observacoes_item: Optional[str] = None
+    atualizado_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class PagamentoSincronizacao(BaseModel):
+    id: UUID
+    id_comanda: UUID
+    valor_pago: Decimal
+    metodo_pagamento: MetodoPagamento
+    status_pagamento: StatusPagamento
+    atualizado_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class SincronizacaoResponse(BaseModel):
+    resultados: List[ResultadoOperacao] = []
+    cursor: datetime # enviar na próxima sincronização
+    completo: bool # True: estado completo, o tablet substitui o que tem; False: só as mudanças desde o cursor
+    mesas: List[MesaSincronizacao] = []
+    comandas: List[ComandaSincronizacao] = []
+    pedidos: List[PedidoSincronizacao] = []
+    itens_pedido: List[ItemPedidoSincronizacao] = []
+    pagamentos: List[PagamentoSincronizacao] = []
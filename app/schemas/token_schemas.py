@@ -1,9 +1,11 @@
+import uuid
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None  # uso único: cada /auth/refresh devolve um novo
 
 class TokenPayload(BaseModel):
     sub: Optional[str] = None  # ou: str | None (Python 3.10+)
@@ -13,3 +15,13 @@ class TokenData(BaseModel):  # <--- esta classe pode estar faltando
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
+
+
+class UsuarioToken(BaseModel):
+    """Usuário autenticado montado só com os claims do access token (sem consulta ao banco)."""
+    id: uuid.UUID
+    email: str
+    papel: str
+    escopos: List[str] = []
+    is_superuser: bool = False
+    is_active: bool = True  # usuários desativados têm a época revogada: o token nem chega aqui
@@ -0,0 +1,262 @@
+from asyncio.log import logger
+
+import asyncio
+import enum
+import json
+import math
+import random
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import inspect
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.config import settings
+from app.crud.crud_cliente import cliente as crud_cliente
+from app.crud.crud_comanda import comanda as crud_comanda
+from app.crud.crud_mesa import mesa as crud_mesa
+from app.crud.crud_produto import produto as crud_produto
+from app.models.cliente import Cliente
+from app.models.comanda import Comanda
+from app.models.mesa import Mesa
+from app.models.produto import Produto
+from app.services.pos_commit import Alteracoes
+from app.services.redis_service import RedisService, redis_service
+
+_MISS = {"__miss__": True}
+
+
+def _encode_valor(valor: Any) -> Any:
+    """Codifica tipos de coluna que o JSON não representa nativamente."""
+    if isinstance(valor, uuid.UUID):
+        return {"__t": "uuid", "v": str(valor)}
+    if isinstance(valor, Decimal):
+        return {"__t": "dec", "v": str(valor)}
+    if isinstance(valor, datetime):
+        return {"__t": "dt", "v": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"__t": "d", "v": valor.isoformat()}
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    return valor
+
+
+def _decode_valor(valor: Any) -> Any:
+    if isinstance(valor, dict) and "__t" in valor:
+        tipo, v = valor["__t"], valor["v"]
+        if tipo == "uuid":
+            return uuid.UUID(v)
+        if tipo == "dec":
+            return Decimal(v)
+        if tipo == "dt":
+            return datetime.fromisoformat(v)
+        if tipo == "d":
+            return date.fromisoformat(v)
+    return valor
+
+
+def serializar_linha(obj: Any) -> Dict[str, Any]:
+    """Extrai apenas as colunas mapeadas de um objeto ORM (sem relacionamentos)."""
+    mapper = inspect(obj).mapper
+    return {attr.key: _encode_valor(getattr(obj, attr.key)) for attr in mapper.column_attrs}
+
+
+def restaurar_linha(db: Session, model: Any, dados: Dict[str, Any]) -> Any:
+    """
+    Reconstrói o objeto ORM a partir das colunas em cache e o associa à sessão
+    sem emitir SELECT (merge com load=False). Relacionamentos continuam lazy.
+    """
+    obj = model(**{chave: _decode_valor(valor) for chave, valor in dados.items()})
+    make_transient_to_detached(obj)
+    return db.merge(obj, load=False)
+
+
+class CacheAside:
+    """
+    Cache-aside genérico no Redis, com proteção contra "stampede":
+
+    - single-flight por chave dentro do worker: requisições concorrentes pela mesma
+      chave aguardam uma única carga do banco;
+    - lock no Redis (SET NX PX) entre workers: apenas um worker recarrega a chave,
+      os demais aguardam o valor ser publicado;
+    - refresh antecipado probabilístico (XFetch): entradas próximas de expirar são
+      recarregadas por uma requisição antes do TTL, evitando expiração simultânea;
+    - cache negativo: ausências ficam em cache por um TTL curto.
+    """
+
+    def __init__(
+            self,
+            namespace: str,
+            redis: RedisService = redis_service,
+            ttl: int = settings.CACHE_TTL,
+            ttl_negativo: int = settings.CACHE_NEGATIVE_TTL,
+            beta: float = settings.CACHE_EARLY_REFRESH_BETA
+    ):
+        self.namespace = namespace
+        self.redis = redis
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.beta = beta
+        self._em_voo: Dict[str, asyncio.Future] = {}
+
+    def _chave(self, chave: str) -> str:
+        return f"cache:{self.namespace}:{chave}"
+
+    def _deve_renovar(self, envelope: Dict[str, Any]) -> bool:
+        """XFetch: agora - delta * beta * ln(rand) >= expiração."""
+        delta = envelope.get("delta", 0.0)
+        expira_em = envelope.get("exp", 0.0)
+        return time.time() - delta * self.beta * math.log(random.random() or 1e-12) >= expira_em
+
+    async def _ler(self, chave_redis: str) -> Optional[Dict[str, Any]]:
+        bruto = await self.redis.get_key(chave_redis)
+        if bruto is None:
+            return None
+        try:
+            return json.loads(bruto)
+        except ValueError:
+            return None
+
+    async def _gravar(self, chave_redis: str, valor: Optional[Dict[str, Any]], delta: float) -> None:
+        ttl = self.ttl if valor is not None else self.ttl_negativo
+        envelope = {
+            "v": valor if valor is not None else _MISS,
+            "delta": delta,
+            "exp": time.time() + ttl
+        }
+        await self.redis.set_key(chave_redis, json.dumps(envelope), ttl=ttl)
+
+    async def _carregar(
+            self,
+            chave_redis: str,
+            carregar: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        """Carrega do banco protegido pelo lock distribuído; sem Redis, carrega direto."""
+        chave_lock = f"{chave_redis}:lock"
+        timeout_ms = settings.CACHE_LOCK_TIMEOUT_MS
+
+        # Token próprio: se a carga passar do timeout e outro worker pegar o lock,
+        # a liberação deste não apaga o lock do outro
+        token = uuid.uuid4().hex
+        if await self.redis.set_key_if_absent(chave_lock, token, ttl_ms=timeout_ms):
+            try:
+                inicio = time.monotonic()
+                valor = await carregar()
+                await self._gravar(chave_redis, valor, delta=time.monotonic() - inicio)
+                return valor
+            finally:
+                await self.redis.delete_key_if_value(chave_lock, token)
+
+        if not self.redis.connected:
+            # Redis indisponível: não há lock nem cache, vai direto ao banco
+            return await carregar()
+
+        # Outro worker está recarregando: aguarda o valor aparecer até o timeout do lock
+        limite = time.monotonic() + timeout_ms / 1000
+        while time.monotonic() < limite:
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_MS / 1000)
+            envelope = await self._ler(chave_redis)
+            if envelope is not None:
+                valor = envelope["v"]
+                return None if valor == _MISS else valor
+        return await carregar()
+
+    async def obter(
+            self,
+            chave: str,
+            carregar: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        """Retorna o valor em cache ou executa `carregar` (no máximo uma vez por chave e worker)."""
+        chave_redis = self._chave(chave)
+        envelope = await self._ler(chave_redis)
+        if envelope is not None and not self._deve_renovar(envelope):
+            valor = envelope["v"]
+            return None if valor == _MISS else valor
+
+        futuro = self._em_voo.get(chave_redis)
+        if futuro is not None:
+            return await asyncio.shield(futuro)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_voo[chave_redis] = futuro
+        try:
+            valor = await self._carregar(chave_redis, carregar)
+            futuro.set_result(valor)
+            return valor
+        except Exception as e:
+            futuro.set_exception(e)
+            # Evita "Future exception was never retrieved" quando ninguém aguardava
+            futuro.exception()
+            raise
+        finally:
+            self._em_voo.pop(chave_redis, None)
+
+    async def invalidar(self, chave: str) -> None:
+        await self.redis.delete_key(self._chave(chave))
+
+
+class CachedCRUD:
+    """
+    Envolve o `get()` de um CRUD com o cache-aside, devolvendo objetos ORM ligados à sessão.
+    Numa falta, o `get()` síncrono roda no threadpool, fora do event loop.
+    """
+
+    def __init__(self, crud: Any, model: Any, namespace: str):
+        self.crud = crud
+        self.model = model
+        self.cache = CacheAside(namespace)
+
+    async def get(self, db: Session, id: uuid.UUID) -> Optional[Any]:
+        async def carregar() -> Optional[Dict[str, Any]]:
+            obj = await run_in_threadpool(self.crud.get, db, id=id)
+            return serializar_linha(obj) if obj is not None else None
+
+        try:
+            dados = await self.cache.obter(str(id), carregar)
+        except Exception as e:
+            logger.error(f"Erro no cache de {self.cache.namespace}: {str(e)}")
+            return await run_in_threadpool(self.crud.get, db, id=id)
+
+        if dados is None:
+            return None
+        return restaurar_linha(db, self.model, dados)
+
+    async def invalidar(self, id: uuid.UUID) -> None:
+        await self.cache.invalidar(str(id))
+
+
+mesa_cache = CachedCRUD(crud_mesa, Mesa, "mesa")
+comanda_cache = CachedCRUD(crud_comanda, Comanda, "comanda")
+produto_cache = CachedCRUD(crud_produto, Produto, "produto")
+cliente_cache = CachedCRUD(crud_cliente, Cliente, "cliente")
+
+
+_CACHES_POR_TIPO = {
+    "mesa": mesa_cache,
+    "comanda": comanda_cache,
+    "produto": produto_cache,
+    "cliente": cliente_cache,
+}
+
+
+def preparar_invalidacao(db: Session, alteracoes: Alteracoes) -> Optional[Callable[[], Awaitable[None]]]:
+    """
+    Preparador pós-commit (ver pos_commit): invalida o cache dos registros
+    alterados na transação, qualquer que seja o CRUD que os gravou.
+    """
+    alvos: Dict[str, Set[uuid.UUID]] = {
+        tipo: set(ids) for tipo, ids in alteracoes.items() if tipo in _CACHES_POR_TIPO and ids
+    }
+    if not alvos:
+        return None
+
+    async def invalidar() -> None:
+        for tipo, ids in alvos.items():
+            for id in ids:
+                await _CACHES_POR_TIPO[tipo].invalidar(id)
+
+    return invalidar
@@ -0,0 +1,104 @@
+from asyncio.log import logger
+
+import uuid
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.crud_comanda import comanda as crud_comanda
+from app.crud.crud_mesa import mesa as crud_mesa
+from app.models.comanda import Comanda
+from app.models.mesa import Mesa
+from app.schemas.comanda_schemas import ComandaDigital
+from app.services.pos_commit import Alteracoes
+from app.services.redis_service import RedisService, redis_service
+
+
+class ComandaDigitalService:
+    """
+    Mantém no Redis um snapshot serializado da comanda digital de cada mesa.
+
+    O endpoint público `/comandas/digital/{qr_code_hash}` é consultado por todos
+    os clientes de todas as mesas. Em vez de buscar mesa, comanda ativa e
+    recalcular saldos a cada requisição, o snapshot é regravado depois de todo
+    commit que muda a mesa ou a comanda (pedido, pagamento, fiado, status) e
+    servido com um único GET.
+    A chave é o id da mesa, obtido do token assinado do QR Code sem acessar o banco.
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+
+    @staticmethod
+    def _chave(mesa_id: uuid.UUID) -> str:
+        return f"comanda_digital:{mesa_id}"
+
+    def montar_comanda_digital(self, db: Session, mesa: Mesa) -> Optional[ComandaDigital]:
+        """Monta a comanda digital a partir do banco (caminho sem cache)."""
+        comanda_ativa = crud_comanda.get_comanda_ativa_by_mesa(db, mesa_id=mesa.id)
+        if not comanda_ativa:
+            return None
+
+        valor_restante = comanda_ativa.valor_total_calculado - comanda_ativa.valor_pago - comanda_ativa.valor_fiado
+        if valor_restante < 0:
+            valor_restante = Decimal("0.00")
+
+        return ComandaDigital(
+            id=comanda_ativa.id,
+            numero_mesa=mesa.numero_identificador,
+            status_comanda=comanda_ativa.status_comanda,
+            valor_total_calculado=comanda_ativa.valor_total_calculado,
+            valor_pago=comanda_ativa.valor_pago,
+            valor_restante=valor_restante,
+            data_abertura=comanda_ativa.data_criacao
+        )
+
+    async def obter_snapshot(self, mesa_id: uuid.UUID) -> Optional[str]:
+        """Retorna o JSON pré-serializado da comanda digital, ou None se não houver snapshot."""
+        return await self.redis.get_key(self._chave(mesa_id))
+
+    async def gravar_snapshot(self, mesa_id: uuid.UUID, comanda_digital: Optional[ComandaDigital]) -> bool:
+        """Grava (ou remove, se não há comanda ativa) o snapshot de uma mesa."""
+        chave = self._chave(mesa_id)
+        if comanda_digital is None:
+            return await self.redis.delete_key(chave)
+        return await self.redis.set_key(
+            chave,
+            comanda_digital.model_dump_json(),
+            ttl=settings.COMANDA_DIGITAL_SNAPSHOT_TTL
+        )
+
+    def preparar_snapshots(self, db: Session, alteracoes: Alteracoes) -> Optional[Callable[[], Awaitable[None]]]:
+        """
+        Preparador pós-commit (ver pos_commit): monta, ainda dentro da transação,
+        a comanda digital das mesas alteradas (direto ou por uma comanda delas) e
+        devolve a gravação dos snapshots, feita depois do commit. Vale para
+        qualquer escrita: endpoints, lotes de status, sincronização offline.
+        Mesa removida ou sem comanda ativa tem o snapshot apagado.
+        """
+        mesas: Set[uuid.UUID] = set(alteracoes.get("mesa", ()))
+        comandas = alteracoes.get("comanda")
+        if comandas:
+            mesas.update(db.execute(select(Comanda.id_mesa).where(Comanda.id.in_(comandas))).scalars())
+        if not mesas:
+            return None
+
+        snapshots: Dict[uuid.UUID, Optional[ComandaDigital]] = {}
+        for mesa_id in mesas:
+            mesa = crud_mesa.get(db, id=mesa_id)
+            snapshots[mesa_id] = self.montar_comanda_digital(db, mesa) if mesa else None
+
+        async def gravar() -> None:
+            for mesa_id, comanda_digital in snapshots.items():
+                try:
+                    await self.gravar_snapshot(mesa_id, comanda_digital)
+                except Exception as e:
+                    logger.error(f"Erro ao gravar snapshot da comanda digital da mesa {mesa_id}: {str(e)}")
+
+        return gravar
+
+
+comanda_digital_service = ComandaDigitalService()
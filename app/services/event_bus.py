@@ -0,0 +1,241 @@
+from asyncio.log import logger
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram
+from app.schemas.evento_schemas import (
+    CANAL_COMANDAS, CANAL_MESAS, CANAL_NOTIFICACOES, CANAL_PEDIDOS, Evento, TipoEvento
+)
+from app.services.event_codec import codificar_para_redis
+from app.services.kds_stream import kds_stream_service
+from app.services.redis_service import RedisService, redis_service
+
+eventos_publicados = Counter("eventos_publicados_total", "Eventos publicados no Redis", ["canal"])
+eventos_falhas = Counter("eventos_falhas_total", "Eventos que não puderam ser publicados", ["canal"])
+eventos_latencia = Histogram("eventos_publicacao_segundos", "Latência de publicação de um lote de eventos")
+eventos_coalescidos = Counter(
+    "eventos_coalescidos_total", "Eventos absorvidos por uma atualização mais recente da mesma entidade", ["canal"]
+)
+
+ChaveEntidade = Tuple[str, UUID]
+
+# Tipos genéricos de "estado atual": ao coalescer, não apagam um tipo mais específico
+_TIPOS_GENERICOS = {TipoEvento.COMANDA_ATUALIZADA, TipoEvento.MESA_ATUALIZADA}
+
+
+def chave_entidade(evento: Evento) -> Optional[ChaveEntidade]:
+    """Entidade cujo estado o evento descreve, se ele puder ser coalescido."""
+    if evento.canal == CANAL_MESAS and evento.id_mesa is not None:
+        return CANAL_MESAS, evento.id_mesa
+    if evento.canal == CANAL_COMANDAS and evento.id_comanda is not None:
+        return CANAL_COMANDAS, evento.id_comanda
+    return None
+
+
+def mesclar_eventos(anterior: Evento, novo: Evento) -> Evento:
+    """
+    Une duas atualizações da mesma entidade no estado mais recente: status,
+    valores e timestamp vêm de `novo`; chaves de `dados` que só existem em
+    `anterior` (ex.: dados do pagamento) são preservadas.
+    """
+    tipo = novo.tipo
+    if tipo in _TIPOS_GENERICOS and anterior.tipo not in _TIPOS_GENERICOS:
+        tipo = anterior.tipo
+    return novo.model_copy(update={"tipo": tipo, "dados": {**anterior.dados, **novo.dados}})
+
+
+def coalescer_eventos(eventos: List[Evento]) -> List[Evento]:
+    """
+    Reduz o lote ao estado mais recente de cada mesa e comanda. Um pagamento,
+    por exemplo, muda a comanda e a mesa em sequência; as telas do salão
+    recebem uma mensagem por entidade em vez de uma por mudança. O evento
+    mesclado sai na posição da última atualização da entidade; os demais
+    (cozinha/bar, notificações) mantêm a ordem e nunca são mesclados.
+    """
+    ultimo: Dict[ChaveEntidade, int] = {}
+    mesclados: Dict[ChaveEntidade, Evento] = {}
+    for posicao, evento in enumerate(eventos):
+        chave = chave_entidade(evento)
+        if chave is None:
+            continue
+        anterior = mesclados.get(chave)
+        if anterior is not None:
+            evento = mesclar_eventos(anterior, evento)
+            eventos_coalescidos.inc(canal=evento.canal)
+        mesclados[chave] = evento
+        ultimo[chave] = posicao
+
+    resultado = []
+    for posicao, evento in enumerate(eventos):
+        chave = chave_entidade(evento)
+        if chave is None:
+            resultado.append(evento)
+        elif ultimo[chave] == posicao:
+            resultado.append(mesclados[chave])
+    return resultado
+
+
+class EventBus:
+    """
+    Publicação tipada de eventos de domínio.
+
+    Os eventos chegam pelo relay do outbox (ver app.services.outbox), em lotes:
+    cada lote sai num único pipeline, e os eventos da cozinha/bar também são
+    gravados na fila durável (Redis Streams) de cada estação no mesmo pipeline.
+
+    Com EVENTOS_COALESCER, cada lote sai com uma mensagem por mesa e por
+    comanda (ver `coalescer_eventos`), sem reter nada: o relay do outbox já
+    acumula no lote tudo o que ficou pendente desde a rodada anterior.
+    """
+
+    def __init__(self, redis: RedisService = redis_service, coalescer: Optional[bool] = None):
+        self.redis = redis
+        self.coalescer = settings.EVENTOS_COALESCER if coalescer is None else coalescer
+
+    async def publicar_agora(self, evento: Evento) -> bool:
+        return await self.publicar_lote([evento])
+
+    async def publicar_lote(self, eventos: List[Evento]) -> bool:
+        """Envia o lote num único pipeline; True só se foi publicado."""
+        if self.coalescer:
+            eventos = coalescer_eventos(eventos)
+        return await self._enviar(eventos)
+
+    async def _enviar(self, eventos: List[Evento]) -> bool:
+        if not eventos:
+            return True
+        inicio = time.perf_counter()
+        ok = await self.redis.publish_many(
+            [(evento.canal, codificar_para_redis(evento)) for evento in eventos],
+            stream_entries=kds_stream_service.entradas(eventos),
+            maxlen=settings.KDS_STREAM_MAXLEN
+        )
+        eventos_latencia.observe(time.perf_counter() - inicio)
+        contador = eventos_publicados if ok else eventos_falhas
+        for evento in eventos:
+            contador.inc(canal=evento.canal)
+        if not ok:
+            logger.error(f"Falha ao publicar {len(eventos)} eventos no Redis")
+        return ok
+
+
+event_bus = EventBus()
+
+
+def _valor(status) -> Optional[str]:
+    return getattr(status, "value", status)
+
+
+def _categorias(itens) -> List[str]:
+    return sorted({item.produto.categoria for item in itens if item.produto and item.produto.categoria})
+
+
+def _itens_do_pedido(itens) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(item.id),
+            "id_produto": str(item.id_produto),
+            "categoria": item.produto.categoria if item.produto else None,
+            "quantidade": item.quantidade,
+        }
+        for item in itens
+    ]
+
+
+def evento_de_pedido(tipo: TipoEvento, pedido, id_mesa=None) -> Evento:
+    """
+    Monta o evento de um Pedido (status geral) para o canal da cozinha/bar.
+    O evento de criação leva os itens, usados pelo roteamento das estações.
+    """
+    return Evento(
+        tipo=tipo,
+        canal=CANAL_PEDIDOS,
+        id_pedido=pedido.id,
+        id_comanda=pedido.id_comanda,
+        id_mesa=id_mesa,
+        status=_valor(pedido.status_geral_pedido),
+        categorias=_categorias(pedido.itens),
+        dados={"itens": _itens_do_pedido(pedido.itens)} if tipo == TipoEvento.PEDIDO_CRIADO else {}
+    )
+
+
+def evento_de_item(tipo: TipoEvento, item, id_mesa=None) -> Evento:
+    """
+    Monta o evento de um ItemPedido para o canal da cozinha/bar. O evento de
+    item adicionado leva os dados do item, como o de criação do pedido.
+    """
+    return Evento(
+        tipo=tipo,
+        canal=CANAL_PEDIDOS,
+        id_pedido=item.id_pedido,
+        id_item_pedido=item.id,
+        id_comanda=item.id_comanda,
+        id_mesa=id_mesa,
+        status=_valor(item.status_item_pedido),
+        categorias=_categorias([item]),
+        dados={"itens": _itens_do_pedido([item])} if tipo == TipoEvento.ITEM_ADICIONADO else {}
+    )
+
+
+def evento_de_comanda(tipo: TipoEvento, comanda, dados: Optional[Dict[str, Any]] = None) -> Evento:
+    """Monta o evento de uma Comanda (status e valores) para o canal do salão/caixa."""
+    return Evento(
+        tipo=tipo,
+        canal=CANAL_COMANDAS,
+        id_comanda=comanda.id,
+        id_mesa=comanda.id_mesa,
+        status=_valor(comanda.status_comanda),
+        dados={
+            "valor_total_calculado": str(comanda.valor_total_calculado or 0),
+            "valor_pago": str(comanda.valor_pago or 0),
+            "valor_fiado": str(comanda.valor_fiado or 0),
+            **(dados or {})
+        }
+    )
+
+
+def evento_de_mesa(mesa, dados: Optional[Dict[str, Any]] = None) -> Evento:
+    """Monta o evento de mudança de status de uma Mesa."""
+    return Evento(
+        tipo=TipoEvento.MESA_ATUALIZADA,
+        canal=CANAL_MESAS,
+        id_mesa=mesa.id,
+        status=_valor(mesa.status),
+        dados=dados or {}
+    )
+
+
+def evento_status_lote(atualizacoes: List[Dict[str, Any]]) -> Evento:
+    """
+    Um evento para várias mudanças de status (PUT /pedidos/status:batch). Cada
+    entrada tem id_pedido, id_item_pedido (itens), id_comanda, id_mesa, status
+    e categorias; o RealtimeHub expande o lote em eventos individuais.
+    """
+    return Evento(
+        tipo=TipoEvento.STATUS_ATUALIZADO_LOTE,
+        canal=CANAL_PEDIDOS,
+        categorias=sorted({categoria for entrada in atualizacoes for categoria in entrada["categorias"]}),
+        dados={"atualizacoes": atualizacoes}
+    )
+
+
+def evento_pedido_pronto(pedido, mesa=None) -> Evento:
+    """
+    Notificação ao garçom que registrou o pedido. Vai só para o tópico do
+    usuário: o id_mesa fica fora do evento para não chegar às telas da mesa.
+    """
+    return Evento(
+        tipo=TipoEvento.PEDIDO_PRONTO,
+        canal=CANAL_NOTIFICACOES,
+        id_pedido=pedido.id,
+        id_comanda=pedido.id_comanda,
+        status=_valor(pedido.status_geral_pedido),
+        dados={
+            "id_usuario": str(pedido.id_usuario_registrou),
+            "mesa": mesa.numero_identificador if mesa else None
+        }
+    )
+
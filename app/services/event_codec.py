@@ -0,0 +1,166 @@
+"""
+Codificação binária versionada dos eventos em tempo real.
+
+Formato v1 (rede, big-endian):
+
+    magico  u8    0xB1 (nunca '{', o que permite distinguir de JSON pelo 1º byte)
+    versao  u8    1
+    tipo    u8    índice em _TIPOS
+    canal   u8    índice em _CANAIS (flag CANAL_LITERAL: texto logo após o cabeçalho)
+    flags   u8    campos opcionais presentes
+    ts      i64   microssegundos desde a época (UTC)
+    [canal literal] [id_pedido 16B] [id_item_pedido 16B] [id_comanda 16B] [id_mesa 16B]
+    [status str8] [categorias u8 + str8...] [dados u32 + JSON]
+
+str8 é um texto UTF-8 precedido do tamanho em um byte. _TIPOS e _CANAIS só
+podem crescer no fim; mudar a ordem exige uma nova versão.
+"""
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple, Union
+
+from app.core.config import settings
+from app.schemas.evento_schemas import (
+    CANAL_COMANDAS, CANAL_MESAS, CANAL_NOTIFICACOES, CANAL_PEDIDOS, Evento, TipoEvento
+)
+
+VERSAO = 1
+MAGICO = 0xB1
+
+_TIPOS: Tuple[TipoEvento, ...] = (
+    TipoEvento.PEDIDO_CRIADO,
+    TipoEvento.PEDIDO_STATUS_ATUALIZADO,
+    TipoEvento.ITEM_ADICIONADO,
+    TipoEvento.ITEM_STATUS_ATUALIZADO,
+    TipoEvento.COMANDA_ATUALIZADA,
+    TipoEvento.PAGAMENTO_REGISTRADO,
+    TipoEvento.FIADO_REGISTRADO,
+    TipoEvento.MESA_ATUALIZADA,
+    TipoEvento.PEDIDO_PRONTO,
+    TipoEvento.STATUS_ATUALIZADO_LOTE,
+)
+_CANAIS: Tuple[str, ...] = (CANAL_PEDIDOS, CANAL_COMANDAS, CANAL_MESAS, CANAL_NOTIFICACOES)
+_INDICE_TIPO = {tipo: i for i, tipo in enumerate(_TIPOS)}
+_INDICE_CANAL = {canal: i for i, canal in enumerate(_CANAIS)}
+
+_CABECALHO = struct.Struct("!BBBBBq")
+_U8 = struct.Struct("!B")
+_U32 = struct.Struct("!I")
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSSEGUNDO = timedelta(microseconds=1)
+
+_CAMPOS_UUID = ("id_pedido", "id_item_pedido", "id_comanda", "id_mesa")
+_FLAG_STATUS = 1 << 4
+_FLAG_CATEGORIAS = 1 << 5
+_FLAG_DADOS = 1 << 6
+_FLAG_CANAL_LITERAL = 1 << 7
+
+FORMATO_JSON = "json"
+FORMATO_BINARIO = "binario"
+# Subprotocolo de WebSocket com que o cliente pede o formato binário
+SUBPROTOCOLO_BINARIO = f"evento.bin.v{VERSAO}"
+
+
+def _str8(texto: str) -> bytes:
+    dados = texto.encode()
+    if len(dados) > 255:
+        raise ValueError(f"Texto longo demais para o formato binário: {texto[:32]}...")
+    return _U8.pack(len(dados)) + dados
+
+
+def codificar_binario(evento: Evento) -> bytes:
+    flags = 0
+    partes: List[bytes] = []
+
+    canal = _INDICE_CANAL.get(evento.canal)
+    if canal is None:
+        canal, flags = 0, flags | _FLAG_CANAL_LITERAL
+        partes.append(_str8(evento.canal))
+    for bit, campo in enumerate(_CAMPOS_UUID):
+        valor = getattr(evento, campo)
+        if valor is not None:
+            flags |= 1 << bit
+            partes.append(valor.bytes)
+    if evento.status is not None:
+        flags |= _FLAG_STATUS
+        partes.append(_str8(evento.status))
+    if evento.categorias:
+        flags |= _FLAG_CATEGORIAS
+        partes.append(_U8.pack(len(evento.categorias)))
+        partes.extend(_str8(categoria) for categoria in evento.categorias)
+    if evento.dados:
+        flags |= _FLAG_DADOS
+        dados = json.dumps(evento.dados, separators=(",", ":"), default=str).encode()
+        partes.append(_U32.pack(len(dados)) + dados)
+
+    timestamp = evento.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    cabecalho = _CABECALHO.pack(
+        MAGICO, VERSAO, _INDICE_TIPO[evento.tipo], canal, flags, (timestamp - _EPOCA) // _MICROSSEGUNDO
+    )
+    return cabecalho + b"".join(partes)
+
+
+def decodificar_binario(dados: bytes) -> Evento:
+    try:
+        magico, versao, tipo, canal, flags, micros = _CABECALHO.unpack_from(dados)
+        if magico != MAGICO:
+            raise ValueError("Payload não está no formato binário de eventos")
+        if versao != VERSAO:
+            raise ValueError(f"Versão {versao} do formato binário não suportada")
+        posicao = _CABECALHO.size
+
+        def ler_str8() -> str:
+            nonlocal posicao
+            tamanho = dados[posicao]
+            texto = dados[posicao + 1:posicao + 1 + tamanho].decode()
+            posicao += 1 + tamanho
+            return texto
+
+        campos = {
+            "tipo": _TIPOS[tipo],
+            "canal": ler_str8() if flags & _FLAG_CANAL_LITERAL else _CANAIS[canal],
+            "timestamp": _EPOCA + micros * _MICROSSEGUNDO,
+            "status": None,
+            "categorias": [],
+            "dados": {},
+        }
+        for bit, campo in enumerate(_CAMPOS_UUID):
+            if flags & (1 << bit):
+                campos[campo] = dados[posicao:posicao + 16]
+                posicao += 16
+            else:
+                campos[campo] = None
+        if flags & _FLAG_STATUS:
+            campos["status"] = ler_str8()
+        if flags & _FLAG_CATEGORIAS:
+            quantidade = dados[posicao]
+            posicao += 1
+            campos["categorias"] = [ler_str8() for _ in range(quantidade)]
+        if flags & _FLAG_DADOS:
+            (tamanho,) = _U32.unpack_from(dados, posicao)
+            posicao += _U32.size
+            campos["dados"] = json.loads(dados[posicao:posicao + tamanho])
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Payload binário de evento inválido: {str(e)}") from e
+    # O pydantic converte os 16 bytes em UUID mais rápido que UUID(bytes=...) em Python
+    return Evento.model_validate(campos)
+
+
+def codificar(evento: Evento, formato: str = FORMATO_JSON) -> Union[str, bytes]:
+    return codificar_binario(evento) if formato == FORMATO_BINARIO else evento.model_dump_json()
+
+
+def codificar_para_redis(evento: Evento) -> Union[str, bytes]:
+    """Payload publicado no Redis, no formato de EVENTOS_FORMATO_REDIS."""
+    return codificar(evento, settings.EVENTOS_FORMATO_REDIS)
+
+
+def decodificar(dados: Union[str, bytes]) -> Evento:
+    """Decodifica JSON ou binário, reconhecendo o formato pelo primeiro byte."""
+    if isinstance(dados, (bytes, bytearray)) and dados[:1] == bytes((MAGICO,)):
+        return decodificar_binario(dados)
+    return Evento.model_validate_json(dados)
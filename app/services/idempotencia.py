@@ -0,0 +1,295 @@
+"""
+Chaves de idempotência (cabeçalho `Idempotency-Key`) para as criações que os
+tablets repetem quando a rede falha (POST /pedidos, POST /pagamentos).
+
+A primeira requisição com uma chave reserva `idem:{usuário}:{chave}` no Redis
+(SET NX, com validade IDEMPOTENCIA_TRAVA_SEGUNDOS) junto com a impressão
+digital da requisição (método, rota e corpo), executa o endpoint e grava a
+resposta por IDEMPOTENCIA_TTL_SEGUNDOS. Repetições:
+
+- com a resposta gravada: recebem a mesma resposta, sem executar a transação
+  de novo (cabeçalho `Idempotent-Replayed: true`);
+- durante a execução: esperam por ela (no mesmo worker, por um Event; em
+  outro worker, consultando o Redis) até IDEMPOTENCIA_ESPERA_MAX_SEGUNDOS, e
+  depois recebem 409;
+- com outro corpo: 422, a chave não pode ser reaproveitada.
+
+O usuário da chave é o `sub` de um access token válido e não revogado; sem
+ele a requisição segue direto para o endpoint, que a recusa, e nada é
+reservado. Respostas 5xx, 401 e 403 não são gravadas: a chave é liberada e a
+repetição executa de novo. Sem servidor Redis, o broker em memória (REDIS_BACKEND="memoria") faz o
+papel de armazenamento local. Com o Redis indisponível a requisição segue sem
+proteção contra duplicidade, como os demais recursos que dependem dele.
+"""
+from asyncio.log import logger
+
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.services.rate_limiter import cabecalho, payload_do_token
+from app.services.redis_service import RedisService, redis_service
+from app.services.refresh_tokens import refresh_token_store
+
+idempotencia_repeticoes = Counter(
+    "idempotencia_respostas_repetidas_total", "Respostas servidas do armazenamento de idempotência", ["rota"]
+)
+idempotencia_recusas = Counter(
+    "idempotencia_recusas_total", "Repetições recusadas (corpo diferente ou execução demorada)", ["motivo"]
+)
+idempotencia_sem_armazenamento = Counter(
+    "idempotencia_sem_armazenamento_total", "Requisições com chave executadas sem o Redis"
+)
+
+CABECALHO_CHAVE = b"idempotency-key"
+CABECALHO_REPETIDA = b"idempotent-replayed"
+_CHAVE_VALIDA = re.compile(r"^[\x21-\x7e]{1,255}$")
+
+# Respostas que não dependem do corpo e sim da autenticação: não são repetidas
+_STATUS_NAO_GRAVADOS = frozenset({401, 403})
+
+EM_ANDAMENTO = "em_andamento"
+CONCLUIDA = "concluida"
+
+
+def _rota(padrao: str) -> Pattern[str]:
+    return re.compile(f"^{re.escape(settings.API_V1_STR)}{padrao}/?$")
+
+
+ROTAS_IDEMPOTENTES: Tuple[Tuple[str, Pattern[str]], ...] = (
+    ("POST", _rota("/pedidos")),
+    ("POST", _rota("/pagamentos")),
+)
+
+
+async def usuario_autenticado(scope) -> Optional[str]:
+    """`sub` do access token da requisição, se válido e não revogado."""
+    payload = payload_do_token(scope)
+    if payload is None or await refresh_token_store.token_revogado(payload):
+        return None
+    return payload["sub"]
+
+
+def impressao_digital(scope, corpo: bytes) -> str:
+    resumo = hashlib.sha256()
+    for parte in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), corpo):
+        resumo.update(len(parte).to_bytes(8, "big"))
+        resumo.update(parte)
+    return resumo.hexdigest()
+
+
+class _Execucao:
+    """Execução em andamento neste worker, aguardada pelas repetições concorrentes."""
+
+    def __init__(self):
+        self.concluida = asyncio.Event()
+        self.resposta: Optional[dict] = None
+
+
+class ArmazenamentoIdempotencia:
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._execucoes: Dict[str, _Execucao] = {}
+
+    @staticmethod
+    def chave(usuario: str, chave_cliente: str) -> str:
+        return f"idem:{usuario}:{chave_cliente}"
+
+    async def reservar(self, chave: str, impressao: str) -> Tuple[str, Optional[dict]]:
+        """
+        Tenta reservar a chave. Retorna ("reservada", None), ("existente", registro)
+        ou ("indisponivel", None) quando não há como consultar o Redis.
+        """
+        valor = json.dumps({"estado": EM_ANDAMENTO, "impressao": impressao})
+        for _ in range(3):
+            if await self.redis.set_key_if_absent(chave, valor, settings.IDEMPOTENCIA_TRAVA_SEGUNDOS * 1000):
+                self._execucoes[chave] = _Execucao()
+                return "reservada", None
+            registro = await self.ler(chave)
+            if registro is not None:
+                return "existente", registro
+            # A reserva expirou entre as duas chamadas, ou o Redis não respondeu: tenta de novo
+        return "indisponivel", None
+
+    async def ler(self, chave: str) -> Optional[dict]:
+        bruto = await self.redis.get_key(chave)
+        if bruto is None:
+            return None
+        try:
+            return json.loads(bruto)
+        except ValueError:
+            logger.error(f"Registro de idempotência ilegível em {chave}")
+            return None
+
+    async def concluir(self, chave: str, impressao: str, resposta: Optional[dict]) -> None:
+        """Grava a resposta (ou libera a chave, se não houver resposta a guardar) e acorda quem espera."""
+        execucao = self._execucoes.pop(chave, None)
+        if resposta is None:
+            await self.redis.delete_key(chave)
+        else:
+            registro = {"estado": CONCLUIDA, "impressao": impressao, **resposta}
+            if not await self.redis.set_key(chave, json.dumps(registro), ttl=settings.IDEMPOTENCIA_TTL_SEGUNDOS):
+                logger.error(f"Não foi possível gravar a resposta idempotente de {chave}")
+        if execucao is not None:
+            execucao.resposta = resposta
+            execucao.concluida.set()
+
+    async def aguardar(self, chave: str) -> Optional[dict]:
+        """
+        Espera a execução em andamento terminar e retorna o registro concluído;
+        None se a espera esgotar ou a chave for liberada (execução falhou).
+        """
+        limite = time.monotonic() + settings.IDEMPOTENCIA_ESPERA_MAX_SEGUNDOS
+        execucao = self._execucoes.get(chave)
+        if execucao is not None:
+            try:
+                await asyncio.wait_for(execucao.concluida.wait(), settings.IDEMPOTENCIA_ESPERA_MAX_SEGUNDOS)
+            except asyncio.TimeoutError:
+                return None
+            return {"estado": CONCLUIDA, **execucao.resposta} if execucao.resposta else None
+
+        intervalo = 0.05
+        while time.monotonic() < limite:
+            await asyncio.sleep(intervalo)
+            intervalo = min(intervalo * 2, 0.5)
+            registro = await self.ler(chave)
+            if registro is None or registro.get("estado") == CONCLUIDA:
+                return registro
+        return None
+
+
+armazenamento_idempotencia = ArmazenamentoIdempotencia()
+
+
+def _resposta_json(status: int, detalhe: str, extras: Optional[List[Tuple[bytes, bytes]]] = None) -> dict:
+    corpo = json.dumps({"detail": detalhe}).encode()
+    return {
+        "status": status,
+        "headers": [(b"content-type", b"application/json")] + (extras or []),
+        "corpo": corpo,
+    }
+
+
+async def _enviar(send, status: int, headers: List[Tuple[bytes, bytes]], corpo: bytes) -> None:
+    headers = [(k, v) for k, v in headers if k != b"content-length"]
+    headers.append((b"content-length", str(len(corpo)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _repetir(send, registro: dict, rota: str) -> None:
+    idempotencia_repeticoes.inc(rota=rota)
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in registro["headers"]]
+    headers.append((CABECALHO_REPETIDA, b"true"))
+    await _enviar(send, registro["status"], headers, base64.b64decode(registro["corpo"]))
+
+
+class IdempotenciaMiddleware:
+    """Middleware ASGI que aplica o `Idempotency-Key` às ROTAS_IDEMPOTENTES."""
+
+    def __init__(
+            self, app, rotas: Tuple[Tuple[str, Pattern[str]], ...] = ROTAS_IDEMPOTENTES,
+            armazenamento: Optional[ArmazenamentoIdempotencia] = None
+    ):
+        self.app = app
+        self.rotas = rotas
+        self.armazenamento = armazenamento or armazenamento_idempotencia
+
+    def _aplica(self, scope) -> bool:
+        return any(scope["method"] == metodo and rota.match(scope["path"]) for metodo, rota in self.rotas)
+
+    async def __call__(self, scope, receive, send):
+        chave_cliente = cabecalho(scope, CABECALHO_CHAVE) if scope["type"] == "http" else None
+        if chave_cliente is None or not self._aplica(scope):
+            await self.app(scope, receive, send)
+            return
+        usuario = await usuario_autenticado(scope)
+        if usuario is None:
+            # Sem credencial válida o endpoint responde 401/403; não há o que reservar
+            await self.app(scope, receive, send)
+            return
+        if not _CHAVE_VALIDA.match(chave_cliente):
+            resposta = _resposta_json(400, "Idempotency-Key inválida (1 a 255 caracteres ASCII visíveis)")
+            await _enviar(send, resposta["status"], resposta["headers"], resposta["corpo"])
+            return
+
+        # O corpo é lido inteiro para a impressão digital e reentregue ao endpoint
+        partes = []
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] != "http.request":
+                break
+            partes.append(mensagem.get("body", b""))
+            if not mensagem.get("more_body"):
+                break
+        corpo = b"".join(partes)
+        entregue = False
+
+        async def receive_reproduzido():
+            nonlocal entregue
+            if not entregue:
+                entregue = True
+                return {"type": "http.request", "body": corpo, "more_body": False}
+            return await receive()
+
+        impressao = impressao_digital(scope, corpo)
+        chave = self.armazenamento.chave(usuario, chave_cliente)
+        resultado, registro = await self.armazenamento.reservar(chave, impressao)
+
+        if resultado == "indisponivel":
+            idempotencia_sem_armazenamento.inc()
+            await self.app(scope, receive_reproduzido, send)
+            return
+        if resultado == "existente":
+            await self._responder_repeticao(scope, send, chave, impressao, registro)
+            return
+        await self._executar(scope, receive_reproduzido, send, chave, impressao)
+
+    async def _responder_repeticao(self, scope, send, chave: str, impressao: str, registro: dict) -> None:
+        if registro.get("impressao") != impressao:
+            idempotencia_recusas.inc(motivo="corpo_diferente")
+            resposta = _resposta_json(422, "Idempotency-Key já usada com outra requisição")
+            await _enviar(send, resposta["status"], resposta["headers"], resposta["corpo"])
+            return
+        if registro.get("estado") != CONCLUIDA:
+            registro = await self.armazenamento.aguardar(chave)
+        if registro is None or registro.get("estado") != CONCLUIDA:
+            idempotencia_recusas.inc(motivo="em_andamento")
+            resposta = _resposta_json(
+                409, "Requisição com esta Idempotency-Key ainda em andamento; tente novamente", [(b"retry-after", b"1")]
+            )
+            await _enviar(send, resposta["status"], resposta["headers"], resposta["corpo"])
+            return
+        await _repetir(send, registro, scope["path"])
+
+    async def _executar(self, scope, receive, send, chave: str, impressao: str) -> None:
+        inicio: dict = {}
+        partes: List[bytes] = []
+
+        async def send_capturado(mensagem):
+            if mensagem["type"] == "http.response.start":
+                inicio.update(mensagem)
+            elif mensagem["type"] == "http.response.body":
+                partes.append(mensagem.get("body", b""))
+            await send(mensagem)
+
+        resposta = None
+        try:
+            await self.app(scope, receive, send_capturado)
+            if inicio and inicio["status"] < 500 and inicio["status"] not in _STATUS_NAO_GRAVADOS:
+                resposta = {
+                    "status": inicio["status"],
+                    "headers": [
+                        (k.decode("latin-1"), v.decode("latin-1")) for k, v in inicio.get("headers", [])
+                        if k != b"content-length"
+                    ],
+                    "corpo": base64.b64encode(b"".join(partes)).decode(),
+                }
+        finally:
+            await self.armazenamento.concluir(chave, impressao, resposta)
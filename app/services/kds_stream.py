@@ -0,0 +1,128 @@
+from asyncio.log import logger
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.schemas.evento_schemas import CANAL_PEDIDOS, EntradaFilaKds, Evento
+from app.services.redis_service import RedisService, redis_service
+
+entradas_reassumidas = Counter("kds_entradas_reassumidas_total", "Entradas reassumidas de telas inativas", ["estacao"])
+entradas_confirmadas = Counter("kds_entradas_confirmadas_total", "Entradas confirmadas pelas telas", ["estacao"])
+
+
+class KdsStreamService:
+    """
+    Fila durável da cozinha/bar sobre Redis Streams.
+
+    Cada estação tem um stream (`kds:stream:{estacao}`) e um consumer group; cada
+    tela é um consumidor do grupo. Diferente do pub/sub, uma entrada só sai da
+    lista de pendentes quando a tela confirma (XACK), então uma tela que reinicia
+    no meio do movimento recebe de volta o que não tinha confirmado, e o que
+    chegou enquanto estava fora, sem recarregar tudo do banco.
+    """
+
+    GRUPO = "kds"
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._grupos_criados: Set[str] = set()
+
+    @staticmethod
+    def stream(estacao: str) -> str:
+        return f"kds:stream:{estacao}"
+
+    @staticmethod
+    def estacoes_do_evento(evento: Evento) -> List[str]:
+        """Estações que devem receber o evento; sem categoria conhecida, todas recebem."""
+        if not evento.categorias:
+            return list(settings.KDS_ESTACOES)
+        categorias = set(evento.categorias)
+        return [
+            estacao for estacao, categorias_estacao in settings.KDS_ESTACOES.items()
+            if categorias.intersection(categorias_estacao)
+        ]
+
+    def entradas(self, eventos: List[Evento]) -> List[Tuple[str, Dict[str, str]]]:
+        """Entradas XADD dos eventos da cozinha/bar, para ir no mesmo pipeline da publicação."""
+        entradas = []
+        for evento in eventos:
+            if evento.canal != CANAL_PEDIDOS:
+                continue
+            # Lotes viram entradas individuais: as telas só recebem o que é da própria estação
+            for individual in evento.expandir():
+                dados = {"evento": individual.model_dump_json()}
+                entradas.extend((self.stream(estacao), dados) for estacao in self.estacoes_do_evento(individual))
+        return entradas
+
+    async def _garantir_grupo(self, estacao: str) -> bool:
+        if estacao in self._grupos_criados:
+            return True
+        if not await self.redis.stream_group_create(self.stream(estacao), self.GRUPO):
+            return False
+        self._grupos_criados.add(estacao)
+        return True
+
+    async def inicializar(self) -> None:
+        """Cria os grupos na inicialização, para que entradas publicadas antes da primeira leitura não se percam."""
+        for estacao in settings.KDS_ESTACOES:
+            await self._garantir_grupo(estacao)
+
+    @staticmethod
+    def _decodificar(brutas) -> List[EntradaFilaKds]:
+        entradas = []
+        for id_entrada, campos in brutas or []:
+            # Entradas pendentes removidas pelo trim voltam sem campos
+            if not campos or "evento" not in campos:
+                continue
+            try:
+                entradas.append(EntradaFilaKds(id=id_entrada, evento=Evento.model_validate_json(campos["evento"])))
+            except ValueError as e:
+                logger.error(f"Entrada inválida no stream KDS {id_entrada}: {str(e)}")
+        return entradas
+
+    async def ler(
+            self, estacao: str, consumidor: str, *, pendentes: bool = False,
+            count: int = 100, block_ms: Optional[int] = None
+    ) -> Optional[List[EntradaFilaKds]]:
+        """
+        Próximas entradas para a tela `consumidor`, nesta ordem de prioridade:
+        as pendentes da própria tela (se `pendentes`, ao reconectar), as reassumidas
+        de telas inativas e, por fim, as novas (aguardando até `block_ms`).
+        Retorna None se o Redis estiver indisponível.
+        """
+        if not await self._garantir_grupo(estacao):
+            return None
+        stream = self.stream(estacao)
+        if pendentes:
+            brutas = await self.redis.stream_read_group(stream, self.GRUPO, consumidor, start="0", count=count)
+            if brutas is None:
+                return None
+            entradas = self._decodificar(brutas)
+            if entradas:
+                return entradas
+
+        reassumidas = await self.redis.stream_autoclaim(
+            stream, self.GRUPO, consumidor, settings.KDS_STREAM_CLAIM_IDLE_MS, count=count
+        )
+        if reassumidas is None:
+            return None
+        entradas = self._decodificar(reassumidas)
+        if entradas:
+            entradas_reassumidas.inc(len(entradas), estacao=estacao)
+            return entradas
+
+        novas = await self.redis.stream_read_group(
+            stream, self.GRUPO, consumidor, count=count,
+            block_ms=settings.KDS_STREAM_BLOCK_MS if block_ms is None else block_ms
+        )
+        return None if novas is None else self._decodificar(novas)
+
+    async def confirmar(self, estacao: str, ids: List[str]) -> Optional[int]:
+        confirmadas = await self.redis.stream_ack(self.stream(estacao), self.GRUPO, *ids)
+        if confirmadas:
+            entradas_confirmadas.inc(confirmadas, estacao=estacao)
+        return confirmadas
+
+
+kds_stream_service = KdsStreamService()
@@ -0,0 +1,293 @@
+from asyncio.log import logger
+
+import asyncio
+import bisect
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple, Union
+
+Entrada = Tuple[str, Optional[Dict[str, str]]]
+
+
+class _PubSubMemoria:
+    """Equivalente em memória do PubSub do redis-py (subscribe/listen/close)."""
+
+    def __init__(self, broker: "InMemoryRedisService"):
+        self._broker = broker
+        self._fila: "asyncio.Queue[dict]" = asyncio.Queue()
+        self.canais: Set[str] = set()
+
+    async def subscribe(self, *canais: str) -> None:
+        for canal in canais:
+            self.canais.add(canal)
+            self._broker._assinantes.setdefault(canal, set()).add(self)
+
+    async def listen(self) -> AsyncIterator[dict]:
+        while True:
+            yield await self._fila.get()
+
+    async def close(self) -> None:
+        for canal in self.canais:
+            assinantes = self._broker._assinantes.get(canal)
+            if assinantes:
+                assinantes.discard(self)
+        self.canais.clear()
+
+
+@dataclass
+class _Pendente:
+    consumidor: str
+    entregue_em: float
+
+
+@dataclass
+class _Grupo:
+    ultimo_id: Tuple[int, int]
+    pendentes: Dict[Tuple[int, int], _Pendente] = field(default_factory=dict)
+
+
+class _Stream:
+    def __init__(self):
+        self.ids: List[Tuple[int, int]] = []
+        self.campos: Dict[Tuple[int, int], Dict[str, str]] = {}
+        self.grupos: Dict[str, _Grupo] = {}
+        self.nova_entrada = asyncio.Event()
+
+    def ultimo_id(self) -> Tuple[int, int]:
+        return self.ids[-1] if self.ids else (0, 0)
+
+    def adicionar(self, campos: Dict[str, str], maxlen: Optional[int]) -> Tuple[int, int]:
+        ms = int(time.time() * 1000)
+        ultimo = self.ultimo_id()
+        novo = (ms, 0) if ms > ultimo[0] else (ultimo[0], ultimo[1] + 1)
+        self.ids.append(novo)
+        self.campos[novo] = dict(campos)
+        # Trim aproximado, como MAXLEN ~: corta em blocos para não mover a lista a cada XADD
+        if maxlen and len(self.ids) > maxlen + max(maxlen // 10, 1):
+            excedentes = self.ids[:len(self.ids) - maxlen]
+            del self.ids[:len(excedentes)]
+            for id_entrada in excedentes:
+                del self.campos[id_entrada]
+        self.nova_entrada.set()
+        self.nova_entrada = asyncio.Event()
+        return novo
+
+    def apos(self, id_entrada: Tuple[int, int], count: Optional[int]) -> List[Tuple[int, int]]:
+        inicio = bisect.bisect_right(self.ids, id_entrada)
+        return self.ids[inicio:inicio + count] if count else self.ids[inicio:]
+
+
+def _formatar_id(id_entrada: Tuple[int, int]) -> str:
+    return f"{id_entrada[0]}-{id_entrada[1]}"
+
+
+def _ler_id(texto: str) -> Tuple[int, int]:
+    ms, _, seq = texto.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class InMemoryRedisService:
+    """
+    Implementação em memória da interface de `RedisService` (pub/sub, chaves com TTL,
+    contadores e streams com consumer groups), para testes e instalações de um único
+    processo sem servidor Redis. Selecionada com REDIS_BACKEND="memoria".
+
+    O estado vive no processo: com vários workers, cada um tem o seu broker e os
+    eventos não atravessam workers.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self._assinantes: Dict[str, Set[_PubSubMemoria]] = {}
+        self._pubsub: Optional[_PubSubMemoria] = None
+        self._valores: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._streams: Dict[str, _Stream] = {}
+
+    async def connect(self) -> bool:
+        self.connected = True
+        return True
+
+    async def disconnect(self):
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        self.connected = False
+
+    # Pub/sub
+
+    def _entregar(self, channel: str, message: Union[str, bytes]) -> int:
+        assinantes = self._assinantes.get(channel, ())
+        mensagem = {"type": "message", "channel": channel, "data": message}
+        for pubsub in assinantes:
+            pubsub._fila.put_nowait(mensagem)
+        return len(assinantes)
+
+    async def publish(self, channel: str, message: Union[str, bytes]) -> bool:
+        self._entregar(channel, message)
+        return True
+
+    async def publish_many(
+            self,
+            messages: List[Tuple[str, Union[str, bytes]]],
+            stream_entries: Optional[List[Tuple[str, Dict[str, str]]]] = None,
+            maxlen: Optional[int] = None
+    ) -> bool:
+        for channel, message in messages:
+            self._entregar(channel, message)
+        for stream, fields in stream_entries or []:
+            self._stream(stream).adicionar(fields, maxlen)
+        return True
+
+    async def subscribe(self, channel: str) -> bool:
+        if self._pubsub is None:
+            self._pubsub = _PubSubMemoria(self)
+        await self._pubsub.subscribe(channel)
+        return True
+
+    async def create_pubsub(self, *channels: str, binario: bool = False) -> _PubSubMemoria:
+        pubsub = _PubSubMemoria(self)
+        await pubsub.subscribe(*channels)
+        return pubsub
+
+    async def listen(self) -> AsyncIterator[Optional[dict]]:
+        if not self._pubsub:
+            yield None
+            return
+        async for message in self._pubsub.listen():
+            yield message
+
+    # Chaves e contadores
+
+    def _ler_valor(self, key: str) -> Optional[str]:
+        registro = self._valores.get(key)
+        if registro is None:
+            return None
+        valor, expira_em = registro
+        if expira_em is not None and time.monotonic() >= expira_em:
+            del self._valores[key]
+            return None
+        return valor
+
+    async def set_key(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+        self._valores[key] = (value, time.monotonic() + ttl if ttl else None)
+        return True
+
+    async def get_key(self, key: str) -> Optional[str]:
+        return self._ler_valor(key)
+
+    async def set_key_if_absent(self, key: str, value: str, ttl_ms: int) -> bool:
+        if self._ler_valor(key) is not None:
+            return False
+        self._valores[key] = (value, time.monotonic() + ttl_ms / 1000)
+        return True
+
+    async def incr(self, key: str, ttl: Optional[int] = None) -> Optional[int]:
+        atual = self._ler_valor(key)
+        if atual is not None:
+            expira_em = self._valores[key][1]
+        else:
+            expira_em = time.monotonic() + ttl if ttl else None
+        try:
+            novo = int(atual or 0) + 1
+        except ValueError:
+            logger.error(f"Valor da chave {key} não é inteiro")
+            return None
+        self._valores[key] = (str(novo), expira_em)
+        return novo
+
+    async def eval_script(self, script: str, keys: List[str], args: List[Union[str, int, float]]) -> Optional[list]:
+        # Sem interpretador Lua: quem usa scripts recorre à própria alternativa local
+        return None
+
+    async def delete_key_if_value(self, key: str, value: str) -> bool:
+        if self._ler_valor(key) != value:
+            return False
+        del self._valores[key]
+        return True
+
+    async def delete_key(self, key: str) -> bool:
+        existia = self._ler_valor(key) is not None
+        self._valores.pop(key, None)
+        return existia
+
+    # Streams
+
+    def _stream(self, nome: str) -> _Stream:
+        stream = self._streams.get(nome)
+        if stream is None:
+            stream = self._streams[nome] = _Stream()
+        return stream
+
+    async def stream_group_create(self, stream: str, group: str) -> bool:
+        alvo = self._stream(stream)
+        alvo.grupos.setdefault(group, _Grupo(ultimo_id=alvo.ultimo_id()))
+        return True
+
+    def _entregues(self, stream: _Stream, ids: List[Tuple[int, int]]) -> List[Entrada]:
+        return [(_formatar_id(id_entrada), stream.campos.get(id_entrada)) for id_entrada in ids]
+
+    async def stream_read_group(
+            self, stream: str, group: str, consumer: str, start: str = ">",
+            count: Optional[int] = None, block_ms: Optional[int] = None
+    ) -> Optional[List[Entrada]]:
+        alvo = self._streams.get(stream)
+        grupo = alvo.grupos.get(group) if alvo else None
+        if grupo is None:
+            logger.error(f"Consumer group {group} inexistente no stream {stream}")
+            return None
+
+        if start != ">":
+            # Reentrega das pendentes do próprio consumidor
+            inicio = _ler_id(start)
+            ids = sorted(
+                id_entrada for id_entrada, pendente in grupo.pendentes.items()
+                if pendente.consumidor == consumer and id_entrada > inicio
+            )
+            return self._entregues(alvo, ids[:count] if count else ids)
+
+        ids = alvo.apos(grupo.ultimo_id, count)
+        if not ids and block_ms:
+            try:
+                await asyncio.wait_for(alvo.nova_entrada.wait(), block_ms / 1000)
+            except asyncio.TimeoutError:
+                return []
+            ids = alvo.apos(grupo.ultimo_id, count)
+        if not ids:
+            return []
+
+        agora = time.monotonic()
+        grupo.ultimo_id = ids[-1]
+        for id_entrada in ids:
+            grupo.pendentes[id_entrada] = _Pendente(consumer, agora)
+        return self._entregues(alvo, ids)
+
+    async def stream_ack(self, stream: str, group: str, *ids: str) -> Optional[int]:
+        alvo = self._streams.get(stream)
+        grupo = alvo.grupos.get(group) if alvo else None
+        if grupo is None:
+            return 0
+        return sum(1 for id_texto in ids if grupo.pendentes.pop(_ler_id(id_texto), None) is not None)
+
+    async def stream_autoclaim(
+            self, stream: str, group: str, consumer: str, min_idle_ms: int, count: Optional[int] = None
+    ) -> Optional[List[Entrada]]:
+        alvo = self._streams.get(stream)
+        grupo = alvo.grupos.get(group) if alvo else None
+        if grupo is None:
+            return None
+
+        agora = time.monotonic()
+        limite = agora - min_idle_ms / 1000
+        reassumidos = []
+        for id_entrada in sorted(grupo.pendentes):
+            if count and len(reassumidos) >= count:
+                break
+            if grupo.pendentes[id_entrada].entregue_em > limite:
+                continue
+            if id_entrada not in alvo.campos:
+                # Removida pelo trim: sai da lista de pendentes, como no XAUTOCLAIM do Redis 7
+                del grupo.pendentes[id_entrada]
+                continue
+            grupo.pendentes[id_entrada] = _Pendente(consumer, agora)
+            reassumidos.append(id_entrada)
+        return self._entregues(alvo, reassumidos)
@@ -0,0 +1,208 @@
+from asyncio.log import logger
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.database import AsyncSessionLocal
+from app.models.outbox import EventoOutbox
+from app.schemas.evento_schemas import Evento
+from app.services.event_bus import EventBus, event_bus
+from app.services.pos_commit import marcar_alteracao
+
+outbox_latencia = Histogram(
+    "outbox_latencia_publicacao_segundos",
+    "Tempo entre a gravação do evento na transação de origem e a publicação no Redis"
+)
+outbox_pendentes = Gauge("outbox_pendentes", "Eventos do outbox ainda não publicados")
+outbox_publicados = Counter("outbox_publicados_total", "Eventos do outbox publicados pelo relay")
+outbox_falhas = Counter("outbox_falhas_total", "Lotes do outbox que não puderam ser publicados")
+outbox_descartados = Counter("outbox_descartados_total", "Eventos do outbox movidos para a fila morta")
+
+_CHAVE_ACORDAR_RELAY = "outbox_acordar_relay"
+
+# Advisory lock do Postgres que elege o relay ativo (um por vez, ver OutboxRelay)
+_CHAVE_LOCK_RELAY = 0x6F7574626F78
+
+# Intervalo entre limpezas dos eventos já publicados
+_INTERVALO_LIMPEZA_SEGUNDOS = 600
+
+
+def registrar_evento(db: Session, evento: Evento) -> None:
+    """
+    Grava o evento no outbox dentro da transação corrente, sem commit: o evento
+    existe se e somente se a mudança de estado foi confirmada. Após o commit, o
+    relay deste worker é acordado para publicar sem esperar a próxima varredura.
+    A mesa e a comanda do evento ficam marcadas como alteradas (pos_commit).
+    """
+    db.add(EventoOutbox(canal=evento.canal, tipo=evento.tipo.value, payload=evento.model_dump_json()))
+    for individual in evento.expandir():
+        marcar_alteracao(db, "mesa", individual.id_mesa)
+        marcar_alteracao(db, "comanda", individual.id_comanda)
+    sessao = getattr(db, "sync_session", db)
+    if not sessao.info.get(_CHAVE_ACORDAR_RELAY):
+        sessao.info[_CHAVE_ACORDAR_RELAY] = True
+        event.listen(sessao, "after_commit", _ao_commitar, once=True)
+
+
+def _ao_commitar(sessao: Session) -> None:
+    sessao.info.pop(_CHAVE_ACORDAR_RELAY, None)
+    outbox_relay.acordar()
+
+
+def _descartar(linha: EventoOutbox, agora: datetime, motivo: str) -> None:
+    """Move o evento para a fila morta: sai da varredura do relay e fica para inspeção."""
+    linha.descartado_em = agora
+    outbox_descartados.inc()
+    logger.error(f"Evento do outbox {linha.id} ({linha.tipo}) movido para a fila morta: {motivo}")
+
+
+class OutboxRelay:
+    """
+    Publica no Redis os eventos gravados no outbox, em lotes.
+
+    Há um relay por worker, mas só um drena por vez: cada lote começa pegando
+    um advisory lock da transação (pg_try_advisory_xact_lock), e quem não o
+    obtém espera a próxima rodada. Com dois relays drenando em paralelo, lotes
+    consecutivos sairiam fora de ordem, e a mesma mesa ou comanda poderia ser
+    publicada com um estado antigo por último. Os relays dos outros workers
+    ficam de reserva e assumem se o worker que drena cair. As linhas do lote
+    continuam reservadas com `SELECT ... FOR UPDATE SKIP LOCKED`.
+
+    A entrega é pelo menos uma vez. O lote só é marcado como publicado depois
+    que o EventBus confirmou o envio do lote (já com as atualizações de cada
+    mesa e comanda reduzidas ao último estado). Se o envio ou o commit da
+    marcação falhar, o lote é publicado de novo.
+
+    Redis fora do ar não conta contra os eventos. Já um lote cujo envio levanta
+    erro tem a tentativa contada em cada linha, e as linhas passam a sair uma a
+    uma; a que falhar sozinha OUTBOX_MAX_TENTATIVAS vezes vai para a fila morta
+    (`descartado_em`), e as seguintes voltam a ser publicadas.
+    """
+
+    def __init__(self, bus: EventBus = event_bus, session_factory=AsyncSessionLocal):
+        self.bus = bus
+        self.session_factory = session_factory
+        self._acordar = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tarefa: Optional[asyncio.Task] = None
+        self._ultima_limpeza = 0.0
+
+    def acordar(self) -> None:
+        """Pode ser chamado de qualquer thread (CRUDs síncronos rodam no threadpool)."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._acordar.set)
+
+    async def drenar_lote(self) -> int:
+        """Publica um lote de eventos pendentes; retorna quantos saíram da fila (publicados ou descartados)."""
+        async with self.session_factory() as session:
+            if not (await session.execute(select(func.pg_try_advisory_xact_lock(_CHAVE_LOCK_RELAY)))).scalar_one():
+                return 0 # Outro worker está drenando; preserva a ordem de publicação
+            linhas: List[EventoOutbox] = (await session.execute(
+                select(EventoOutbox)
+                .where(EventoOutbox.publicado_em.is_(None), EventoOutbox.descartado_em.is_(None))
+                .order_by(EventoOutbox.data_criacao)
+                .limit(settings.OUTBOX_LOTE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not linhas:
+                return 0
+            if linhas[0].tentativas:
+                # Veio de um lote que falhou: vai sozinho, para achar o evento culpado
+                linhas = linhas[:1]
+
+            agora = datetime.now(timezone.utc)
+            validas, eventos = [], []
+            for linha in linhas:
+                try:
+                    eventos.append(Evento.model_validate_json(linha.payload))
+                    validas.append(linha)
+                except ValueError as e:
+                    # Evento ilegível nunca será publicado
+                    _descartar(linha, agora, f"payload inválido: {str(e)}")
+            descartados = len(linhas) - len(validas)
+
+            try:
+                publicado = await self.bus.publicar_lote(eventos)
+            except Exception as e:
+                # Erro do próprio lote (ex.: evento que não codifica), não do Redis
+                logger.error(f"Erro ao publicar lote do outbox: {str(e)}")
+                for linha in validas:
+                    linha.tentativas += 1
+                    if len(validas) == 1 and linha.tentativas >= settings.OUTBOX_MAX_TENTATIVAS:
+                        _descartar(linha, agora, f"{linha.tentativas} tentativas com erro: {str(e)}")
+                        descartados += 1
+                await session.commit()
+                outbox_falhas.inc()
+                return descartados
+            if not publicado:
+                # Redis indisponível: não conta tentativa, o lote espera a volta do Redis
+                await session.commit()
+                outbox_falhas.inc()
+                return descartados
+
+            for linha in validas:
+                linha.publicado_em = agora
+                if linha.data_criacao is not None:
+                    outbox_latencia.observe((agora - linha.data_criacao).total_seconds())
+            await session.commit()
+            outbox_publicados.inc(len(validas))
+            return len(linhas)
+
+    async def _manutencao(self) -> None:
+        async with self.session_factory() as session:
+            pendentes = (await session.execute(
+                select(func.count(EventoOutbox.id))
+                .where(EventoOutbox.publicado_em.is_(None), EventoOutbox.descartado_em.is_(None))
+            )).scalar_one()
+            outbox_pendentes.set(pendentes)
+
+            if time.monotonic() - self._ultima_limpeza >= _INTERVALO_LIMPEZA_SEGUNDOS:
+                limite = datetime.now(timezone.utc) - timedelta(hours=settings.OUTBOX_RETENCAO_HORAS)
+                await session.execute(delete(EventoOutbox).where(EventoOutbox.publicado_em < limite))
+                await session.commit()
+                self._ultima_limpeza = time.monotonic()
+
+    async def executar(self) -> None:
+        while True:
+            try:
+                publicados = await self.drenar_lote()
+            except Exception as e:
+                logger.error(f"Erro no relay do outbox: {str(e)}")
+                publicados = 0
+            if publicados:
+                # Segue até esvaziar: inclui eventos de outros workers, cujos relays
+                # não obtiveram o lock enquanto este drenava
+                continue
+
+            try:
+                await asyncio.wait_for(self._acordar.wait(), settings.OUTBOX_INTERVALO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                try:
+                    await self._manutencao()
+                except Exception as e:
+                    logger.error(f"Erro na manutenção do outbox: {str(e)}")
+            self._acordar.clear()
+
+    def iniciar(self) -> None:
+        if self._tarefa is None or self._tarefa.done():
+            self._loop = asyncio.get_running_loop()
+            self._tarefa = self._loop.create_task(self.executar())
+
+    async def parar(self) -> None:
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+
+outbox_relay = OutboxRelay()
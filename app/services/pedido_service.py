@@ -1,7 +1,5 @@
 from asyncio.log import logger
-from datetime import datetime, timezone
 import uuid
-import json
 from typing import Optional, Tuple, List, Annotated
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
@@ -17,13 +15,13 @@ from app.schemas import (
     PedidoStatusUpdate
 )
 from app.crud.base import CRUDBase
-from app.services.redis_service import RedisService
+from app.schemas.evento_schemas import Evento, TipoEvento
+from app.services.outbox import registrar_evento
 
 
 class PedidoService:
     def __init__(self):
         self.crud = CRUDPedido()
-        self.redis = RedisService()
 
     async def criar_pedido(
             self,
@@ -87,12 +85,11 @@ class PedidoService:
             comanda.valor_total = (comanda.valor_total or 0.0) + total_pedido
             comanda.data_atualizacao = func.now()
 
+            # Notificação via Redis (outbox, na mesma transação)
+            self._notificar_mudanca_pedido(db, db_pedido, TipoEvento.PEDIDO_CRIADO)
             db.commit()
             db.refresh(db_pedido)
 
-            # Notificação via Redis
-            await self._notificar_mudanca_pedido(db_pedido, "pedido_criado")
-
             logger.info(f"Pedido {db_pedido.id} criado com sucesso por {current_user.email}")
             return db_pedido, "Pedido criado com sucesso"
 
@@ -124,12 +121,10 @@ class PedidoService:
             # Atualiza o status
             db_pedido.status = status_update.status
             db_pedido.data_ultima_atualizacao_status = func.now()
+            self._notificar_mudanca_pedido(db, db_pedido, TipoEvento.PEDIDO_STATUS_ATUALIZADO)
             db.commit()
             db.refresh(db_pedido)
 
-            # Notificação via Redis
-            await self._notificar_mudanca_pedido(db_pedido, "status_atualizado")
-
             logger.info(
                 f"Status do pedido {db_pedido.id} atualizado para {status_update.status} "
                 f"por {current_user.email}"
@@ -184,12 +179,10 @@ class PedidoService:
                 pedido.comanda.valor_total = (pedido.comanda.valor_total or 0.0) + subtotal
                 pedido.comanda.data_atualizacao = func.now()
 
+            self._notificar_mudanca_pedido(db, pedido, TipoEvento.ITEM_ADICIONADO)
             db.commit()
             db.refresh(db_item)
 
-            # Notificação via Redis
-            await self._notificar_mudanca_pedido(pedido, "item_adicionado")
-
             logger.info(f"Item {db_item.id} adicionado ao pedido {pedido_id} por {current_user.email}")
             return db_item, "Item adicionado com sucesso"
 
@@ -198,20 +191,15 @@ class PedidoService:
             logger.error(f"Erro ao adicionar item ao pedido: {str(e)}")
             return None, f"Erro ao adicionar item: {str(e)}"
 
-    async def _notificar_mudanca_pedido(self, pedido: Pedido, action: str):
-        """Envia notificação sobre mudanças no pedido via Redis"""
-        message = {
-            "pedido_id": str(pedido.id),
-            "comanda_id": str(pedido.id_comanda),
-            "mesa_id": str(pedido.comanda.id_mesa) if pedido.comanda else None,
-            "status": pedido.status,
-            "action": action,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        await self.redis.publish_message(
-            channel="pedidos_updates",
-            message=json.dumps(message)
-        )
+    def _notificar_mudanca_pedido(self, db: Session, pedido: Pedido, tipo: TipoEvento):
+        """Grava a notificação no outbox, antes do commit; o relay a publica no Redis"""
+        registrar_evento(db, Evento(
+            tipo=tipo,
+            id_pedido=pedido.id,
+            id_comanda=pedido.id_comanda,
+            id_mesa=pedido.comanda.id_mesa if pedido.comanda else None,
+            status=pedido.status
+        ))
 
     def _validar_transicao_status(self, status_atual: str, status_novo: str) -> Optional[str]:
         """Valida se a transição de status é permitida"""
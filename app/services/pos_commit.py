@@ -0,0 +1,125 @@
+from asyncio.log import logger
+
+import asyncio
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+# Alterações por tipo de registro ("mesa", "comanda", "produto", "cliente") -> ids
+Alteracoes = Dict[str, Set[uuid.UUID]]
+# Chamado antes do commit, com a transação ainda aberta (pode consultar o banco);
+# retorna a ação a executar no event loop depois do commit, ou None
+Preparador = Callable[[Session, Alteracoes], Optional[Callable[[], Awaitable[None]]]]
+
+_CHAVE_ALTERACOES = "pos_commit_alteracoes"
+_CHAVE_ACOES = "pos_commit_acoes"
+
+# Quanto um CRUD síncrono (threadpool) espera as ações antes de devolver a resposta
+_ESPERA_SEGUNDOS = 2.0
+
+
+def marcar_alteracao(db: Session, tipo: str, id: Optional[uuid.UUID]) -> None:
+    """
+    Registra na transação corrente que um registro mudou. Depois do commit os
+    caches do registro são invalidados (e a comanda digital da mesa regravada),
+    seja quem for que escreveu: endpoint, lote, sincronização ou outro CRUD.
+    Num rollback as marcações são descartadas.
+    """
+    if id is None:
+        return
+    sessao = getattr(db, "sync_session", db)
+    alteracoes = sessao.info.get(_CHAVE_ALTERACOES)
+    if alteracoes is None:
+        alteracoes = sessao.info[_CHAVE_ALTERACOES] = {}
+        if not event.contains(sessao, "before_commit", acoes_pos_commit._antes_do_commit):
+            event.listen(sessao, "before_commit", acoes_pos_commit._antes_do_commit)
+            event.listen(sessao, "after_commit", acoes_pos_commit._depois_do_commit)
+            event.listen(sessao, "after_transaction_end", acoes_pos_commit._fim_da_transacao)
+    alteracoes.setdefault(tipo, set()).add(id)
+
+
+class AcoesPosCommit:
+    """
+    Executa, depois de cada commit, o que depende das alterações confirmadas
+    (invalidação de cache, snapshot da comanda digital).
+
+    Os preparadores rodam no `before_commit`, ainda dentro da transação, e
+    leem o banco ali mesmo: o `after_commit` não pode emitir SQL na sessão. O
+    que eles devolvem roda no event loop só depois do commit. Um CRUD chamado
+    no threadpool espera as ações terminarem (até _ESPERA_SEGUNDOS), então a
+    requisição seguinte já encontra o cache limpo; chamado no próprio loop, as
+    ações viram uma tarefa.
+    """
+
+    def __init__(self):
+        self._preparadores: List[Preparador] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tarefas: Set[asyncio.Task] = set()
+
+    def registrar(self, preparador: Preparador) -> None:
+        if preparador not in self._preparadores:
+            self._preparadores.append(preparador)
+
+    def iniciar(self) -> None:
+        """Guarda o event loop da aplicação (chamado no startup)."""
+        self._loop = asyncio.get_running_loop()
+
+    def _antes_do_commit(self, sessao: Session) -> None:
+        alteracoes = sessao.info.pop(_CHAVE_ALTERACOES, None)
+        if not alteracoes:
+            return
+        sessao.flush()
+        acoes = sessao.info.setdefault(_CHAVE_ACOES, [])
+        for preparador in self._preparadores:
+            try:
+                acao = preparador(sessao, alteracoes)
+            except Exception as e:
+                logger.error(f"Erro ao preparar ações pós-commit: {str(e)}")
+                continue
+            if acao is not None:
+                acoes.append(acao)
+
+    def _depois_do_commit(self, sessao: Session) -> None:
+        acoes = sessao.info.pop(_CHAVE_ACOES, None)
+        if acoes:
+            self._executar(acoes)
+
+    def _fim_da_transacao(self, sessao: Session, transacao: SessionTransaction) -> None:
+        # Rollback da transação principal descarta as marcações; o de um SAVEPOINT
+        # não (as operações anteriores do lote continuam valendo)
+        if transacao.parent is None:
+            sessao.info.pop(_CHAVE_ALTERACOES, None)
+            sessao.info.pop(_CHAVE_ACOES, None)
+
+    def _executar(self, acoes: List[Callable[[], Awaitable[None]]]) -> None:
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            loop_atual = asyncio.get_running_loop()
+        except RuntimeError:
+            loop_atual = None
+
+        if loop_atual is self._loop:
+            tarefa = self._loop.create_task(self._rodar(acoes))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+            return
+
+        futuro = asyncio.run_coroutine_threadsafe(self._rodar(acoes), self._loop)
+        try:
+            futuro.result(timeout=_ESPERA_SEGUNDOS)
+        except Exception as e:
+            logger.error(f"Ações pós-commit não concluídas a tempo: {str(e)}")
+
+    @staticmethod
+    async def _rodar(acoes: List[Callable[[], Awaitable[None]]]) -> None:
+        for acao in acoes:
+            try:
+                await acao()
+            except Exception as e:
+                logger.error(f"Erro em ação pós-commit: {str(e)}")
+
+
+acoes_pos_commit = AcoesPosCommit()
@@ -0,0 +1,284 @@
+"""
+Tempos de preparo observados: histórico de transições de status e
+histogramas por produto e por estação.
+
+Cada mudança de status de pedido ou item vira uma linha append-only em
+`transicoes_status`, gravada na mesma transação da mudança com um único
+INSERT de várias linhas (registrar_transicoes).
+
+Os tempos até o item ficar pronto alimentam, em memória, histogramas com
+buckets logarítmicos (erro relativo de ~2,5%), um por produto e um por
+estação. O quantil é calculado sobre no máximo algumas centenas de buckets e
+fica em cache até a próxima observação, então estimar o preparo de um item
+custa O(1). Quando um histograma passa de PREPARO_JANELA_AMOSTRAS, as
+contagens caem pela metade e o passado pesa cada vez menos.
+
+Os tempos vêm do RoteadorEstacoes (item saiu da fila pronto), que recebe os
+eventos de todos os workers. Cada worker mantém a própria cópia, gravada a
+cada PREPARO_PERSISTIR_SEGUNDOS em `estatisticas_preparo` e recarregada na
+inicialização.
+"""
+from asyncio.log import logger
+
+import asyncio
+import json
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.database import AsyncSessionLocal
+from app.models.estatistica_preparo import EstatisticaPreparo
+from app.models.transicao_status import TransicaoStatus
+from app.services.station_router import ItemFila, RoteadorEstacoes, preparo_por_categoria, roteador_estacoes
+
+preparo_segundos = Histogram(
+    "kds_preparo_segundos", "Tempo entre o pedido e o item pronto", ["estacao"],
+    buckets=(60, 120, 180, 300, 420, 600, 900, 1200, 1800, 2700, 3600)
+)
+
+_GAMMA = 1.05
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def chave_produto(id_produto) -> str:
+    return f"produto:{id_produto}"
+
+
+def chave_estacao(estacao: str) -> str:
+    return f"estacao:{estacao}"
+
+
+class HistogramaPreparo:
+    """Histograma esparso com buckets em progressão geométrica (razão 1,05) a partir de 1s."""
+
+    def __init__(self, estacao: Optional[str] = None, contagens: Optional[Dict[int, float]] = None):
+        self.estacao = estacao
+        self.contagens: Dict[int, float] = dict(contagens or {})
+        self.amostras = sum(self.contagens.values())
+        self._quantis: Dict[float, float] = {}
+
+    @staticmethod
+    def _indice(segundos: float) -> int:
+        return 0 if segundos <= 1 else math.ceil(math.log(segundos) / _LOG_GAMMA)
+
+    @staticmethod
+    def _valor(indice: int) -> float:
+        # Ponto do bucket (γ^(i-1), γ^i] que minimiza o erro relativo
+        return 2 * _GAMMA ** indice / (1 + _GAMMA) if indice else 1.0
+
+    def observar(self, segundos: float) -> None:
+        indice = self._indice(segundos)
+        self.contagens[indice] = self.contagens.get(indice, 0.0) + 1
+        self.amostras += 1
+        self._quantis.clear()
+        if self.amostras > settings.PREPARO_JANELA_AMOSTRAS:
+            self.contagens = {i: c / 2 for i, c in self.contagens.items() if c >= 1}
+            self.amostras = sum(self.contagens.values())
+
+    def quantil(self, q: float) -> Optional[float]:
+        if not self.amostras:
+            return None
+        valor = self._quantis.get(q)
+        if valor is None:
+            alvo, acumulado = q * self.amostras, 0.0
+            for indice in sorted(self.contagens):
+                acumulado += self.contagens[indice]
+                if acumulado >= alvo:
+                    break
+            valor = self._quantis[q] = self._valor(indice)
+        return valor
+
+    def fracao_ate(self, segundos: float) -> Optional[float]:
+        """Fração das amostras com tempo até `segundos` (cumprimento do SLA)."""
+        if not self.amostras:
+            return None
+        limite = self._indice(segundos)
+        return sum(c for i, c in self.contagens.items() if i <= limite) / self.amostras
+
+
+class EstatisticasPreparo:
+    def __init__(self, roteador: RoteadorEstacoes = roteador_estacoes, session_factory=AsyncSessionLocal):
+        self.roteador = roteador
+        self.session_factory = session_factory
+        self._histogramas: Dict[str, HistogramaPreparo] = {}
+        self._alterados: Set[str] = set()
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def _histograma(self, chave: str, estacao: Optional[str]) -> HistogramaPreparo:
+        histograma = self._histogramas.get(chave)
+        if histograma is None:
+            histograma = self._histogramas[chave] = HistogramaPreparo(estacao)
+        return histograma
+
+    def registrar_conclusao(self, item: ItemFila, concluido_em: float) -> None:
+        """Observador do roteador: tempo do pedido até o item pronto."""
+        segundos = concluido_em - item.recebido_em
+        if segundos < 0:
+            return
+        chaves = [chave_estacao(item.estacao)]
+        if item.id_produto:
+            chaves.append(chave_produto(item.id_produto))
+        for chave in chaves:
+            self._histograma(chave, item.estacao).observar(segundos)
+            self._alterados.add(chave)
+        preparo_segundos.observe(segundos, estacao=item.estacao)
+
+    def estimar(self, id_produto: Optional[str], categoria: Optional[str], estacao: str, quantil: float = 0.5) -> float:
+        """
+        Tempo de preparo estimado de um item: quantil do produto, ou da estação
+        se o produto ainda tem poucas amostras, ou o valor fixo da categoria.
+        """
+        for chave in (chave_produto(id_produto), chave_estacao(estacao)):
+            histograma = self._histogramas.get(chave)
+            if histograma is not None and histograma.amostras >= settings.PREPARO_AMOSTRAS_MINIMAS:
+                return histograma.quantil(quantil)
+        return preparo_por_categoria(id_produto, categoria, estacao)
+
+    def eta_segundos(self, itens: Iterable[Tuple[Optional[str], Optional[str]]]) -> float:
+        """Segundos até o pedido ficar pronto: o item mais demorado, no quantil PREPARO_QUANTIL_ETA."""
+        return max(
+            (
+                self.estimar(id_produto, categoria, self.roteador.estacao_da_categoria(categoria),
+                             settings.PREPARO_QUANTIL_ETA)
+                for id_produto, categoria in itens
+            ),
+            default=0.0
+        )
+
+    def eta_pedido(self, pedido, agora: Optional[datetime] = None) -> datetime:
+        itens = [
+            (str(item.id_produto), item.produto.categoria if item.produto else None) for item in pedido.itens
+        ]
+        return (agora or datetime.now(timezone.utc)) + timedelta(seconds=self.eta_segundos(itens))
+
+    def resumo(self, estacao: Optional[str] = None, id_produto: Optional[str] = None) -> List[dict]:
+        linhas = []
+        for chave, histograma in self._histogramas.items():
+            if estacao and histograma.estacao != estacao:
+                continue
+            if id_produto and chave != chave_produto(id_produto):
+                continue
+            sla = settings.KDS_SLA_SEGUNDOS.get(histograma.estacao)
+            linhas.append({
+                "chave": chave,
+                "estacao": histograma.estacao,
+                "amostras": round(histograma.amostras),
+                "p50_segundos": histograma.quantil(0.5),
+                "p90_segundos": histograma.quantil(0.9),
+                "p99_segundos": histograma.quantil(0.99),
+                "sla_segundos": sla,
+                "dentro_sla": histograma.fracao_ate(sla) if sla else None,
+            })
+        return linhas
+
+    # Persistência
+
+    def carregar(self, db: Session) -> None:
+        for linha in db.query(EstatisticaPreparo).all():
+            try:
+                contagens = {int(i): float(c) for i, c in json.loads(linha.contagens).items()}
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Histograma de preparo {linha.chave} ilegível, ignorado: {str(e)}")
+                continue
+            atual = self._histogramas.get(linha.chave)
+            if atual is not None:
+                # Observações recebidas durante a carga somam-se ao histórico
+                for indice, contagem in atual.contagens.items():
+                    contagens[indice] = contagens.get(indice, 0.0) + contagem
+            self._histogramas[linha.chave] = HistogramaPreparo(linha.estacao, contagens)
+        logger.info(f"{len(self._histogramas)} histogramas de tempo de preparo carregados")
+
+    async def inicializar(self, db: AsyncSession) -> None:
+        """Passa a observar o roteador das estações e carrega os histogramas gravados."""
+        self.roteador.estimador = self.estimar
+        if self.registrar_conclusao not in self.roteador.ao_concluir:
+            self.roteador.ao_concluir.append(self.registrar_conclusao)
+        await db.run_sync(self.carregar)
+
+    async def persistir(self) -> int:
+        """Grava os histogramas alterados desde a última gravação; retorna quantos."""
+        if not self._alterados:
+            return 0
+        chaves, self._alterados = self._alterados, set()
+        try:
+            async with self.session_factory() as session:
+                existentes = {
+                    linha.chave: linha for linha in (await session.execute(
+                        select(EstatisticaPreparo).where(EstatisticaPreparo.chave.in_(chaves))
+                    )).scalars()
+                }
+                for chave in chaves:
+                    histograma = self._histogramas[chave]
+                    linha = existentes.get(chave)
+                    if linha is None:
+                        linha = EstatisticaPreparo(chave=chave)
+                        session.add(linha)
+                    linha.estacao = histograma.estacao
+                    linha.amostras = round(histograma.amostras)
+                    linha.p50_segundos = histograma.quantil(0.5)
+                    linha.p90_segundos = histograma.quantil(0.9)
+                    linha.p99_segundos = histograma.quantil(0.99)
+                    linha.contagens = json.dumps(histograma.contagens)
+                await session.commit()
+        except Exception:
+            self._alterados |= chaves
+            raise
+        return len(chaves)
+
+    async def executar(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PREPARO_PERSISTIR_SEGUNDOS)
+            try:
+                await self.persistir()
+            except Exception as e:
+                logger.error(f"Erro ao gravar os histogramas de preparo: {str(e)}")
+
+    def iniciar(self) -> None:
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.get_running_loop().create_task(self.executar())
+
+    async def parar(self) -> None:
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        try:
+            await self.persistir()
+        except Exception as e:
+            logger.error(f"Erro ao gravar os histogramas de preparo no encerramento: {str(e)}")
+
+
+estatisticas_preparo = EstatisticasPreparo()
+
+
+def transicao(
+        id_pedido, status_novo, status_anterior=None, id_item_pedido=None, id_produto=None,
+        ocorrido_em: Optional[datetime] = None
+) -> dict:
+    """Linha de `transicoes_status`; status aceitam o Enum ou o texto."""
+    return {
+        "id_pedido": id_pedido,
+        "id_item_pedido": id_item_pedido,
+        "id_produto": id_produto,
+        "status_anterior": getattr(status_anterior, "value", status_anterior),
+        "status_novo": getattr(status_novo, "value", status_novo),
+        "ocorrido_em": ocorrido_em or datetime.now(timezone.utc),
+    }
+
+
+def registrar_transicoes(db: Session, transicoes: List[dict]) -> None:
+    """
+    Grava as transições na transação corrente, sem commit, num único INSERT
+    executado em lote (executemany) em vez de um por linha.
+    """
+    if transicoes:
+        db.execute(insert(TransicaoStatus), transicoes)
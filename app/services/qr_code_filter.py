@@ -0,0 +1,191 @@
+from asyncio.log import logger
+
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.crud_mesa import mesa as crud_mesa
+from app.models.mesa import Mesa
+from app.services.pos_commit import Alteracoes
+from app.services.redis_service import RedisService, redis_service
+
+
+class BloomFilter:
+    """Filtro de Bloom simples sobre um bytearray, com hashing duplo (Kirsch-Mitzenmacher)."""
+
+    def __init__(self, capacidade: int, taxa_falso_positivo: float):
+        capacidade = max(capacidade, 1)
+        self.num_bits = max(8, int(-capacidade * math.log(taxa_falso_positivo) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacidade * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _posicoes(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for pos in self._posicoes(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._posicoes(item))
+
+
+class QrCodeHashFilter:
+    """
+    Rejeita hashes de QR Code inválidos sem consultar o Postgres.
+
+    Cada worker mantém um filtro de Bloom com todos os `Mesa.qr_code_hash` válidos
+    (reconstruído na inicialização) e um cache negativo de curta duração para os
+    falsos positivos que já foram confirmados no banco. Como o filtro é local ao
+    worker, toda inclusão incrementa uma geração no Redis; um "não existe" do
+    filtro só é confiado se a geração local estiver em dia, caso contrário o
+    filtro é reconstruído antes de responder.
+
+    Os hashes gravados (mesa criada, QR Codes re-emitidos) entram no filtro
+    depois do commit, pelo preparador pós-commit `preparar_registro`. A
+    reconstrução pedida por uma consulta roda fora do event loop e no máximo
+    uma vez a cada QR_BLOOM_RECONSTRUCAO_INTERVALO; nesse intervalo os hashes
+    fora do filtro seguem para o banco.
+    """
+
+    CHAVE_GERACAO = "qr_code_hashes:geracao"
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._filtro: Optional[BloomFilter] = None
+        self._geracao: Optional[str] = None
+        self._ausentes: "OrderedDict[str, float]" = OrderedDict()
+        self._ultima_reconstrucao: Optional[float] = None
+
+    @staticmethod
+    def _montar(hashes: List[str]) -> BloomFilter:
+        filtro = BloomFilter(
+            capacidade=max(len(hashes) * 2, settings.QR_BLOOM_CAPACIDADE_MINIMA),
+            taxa_falso_positivo=settings.QR_BLOOM_TAXA_FALSO_POSITIVO
+        )
+        for qr_code_hash in hashes:
+            filtro.add(qr_code_hash)
+        return filtro
+
+    def _instalar(self, filtro: BloomFilter, geracao: Optional[str], total: int) -> None:
+        self._filtro = filtro
+        self._geracao = geracao
+        self._ausentes.clear()
+        logger.info(f"Filtro de QR Codes carregado com {total} hashes")
+
+    def carregar(self, hashes: Iterable[str], geracao: Optional[str] = None) -> None:
+        hashes = list(hashes)
+        self._instalar(self._montar(hashes), geracao, len(hashes))
+
+    def reconstruir(self, db: Session, geracao: Optional[str] = None) -> None:
+        self.carregar(crud_mesa.get_all_qr_code_hashes(db), geracao=geracao)
+
+    async def _reconstruir_fora_do_loop(self, db: Session, geracao: Optional[str]) -> bool:
+        """
+        Reconstrói o filtro numa thread (varredura de todas as mesas). Retorna
+        False, sem reconstruir, se a última reconstrução foi há menos de
+        QR_BLOOM_RECONSTRUCAO_INTERVALO ou se outra já está em andamento.
+        """
+        agora = time.monotonic()
+        if (
+            self._ultima_reconstrucao is not None
+            and agora - self._ultima_reconstrucao < settings.QR_BLOOM_RECONSTRUCAO_INTERVALO
+        ):
+            return False
+        self._ultima_reconstrucao = agora
+
+        def montar():
+            hashes = crud_mesa.get_all_qr_code_hashes(db)
+            return self._montar(hashes), len(hashes)
+
+        filtro, total = await asyncio.to_thread(montar)
+        self._instalar(filtro, geracao, total)
+        return True
+
+    async def inicializar(self, db: AsyncSession) -> None:
+        """Carrega o filtro na inicialização do worker."""
+        geracao = await self.redis.get_key(self.CHAVE_GERACAO)
+        await db.run_sync(lambda sync_db: self.reconstruir(sync_db, geracao=geracao))
+
+    async def registrar(self, hashes: Iterable[str]) -> None:
+        """Inclui hashes novos (mesa criada ou QR Codes re-emitidos) e avisa os demais workers."""
+        for qr_code_hash in hashes:
+            if self._filtro is not None:
+                self._filtro.add(qr_code_hash)
+            self._ausentes.pop(qr_code_hash, None)
+        geracao = await self.redis.incr(self.CHAVE_GERACAO)
+        if geracao is not None and self._geracao is not None and int(self._geracao) == geracao - 1:
+            # Nenhuma outra inclusão desde a última sincronização: o filtro local continua em dia
+            self._geracao = str(geracao)
+
+    def registrar_ausencia(self, qr_code_hash: str) -> None:
+        """Guarda no cache negativo um hash confirmado como inexistente no banco."""
+        self._ausentes[qr_code_hash] = time.monotonic() + settings.QR_NEGATIVE_CACHE_TTL
+        self._ausentes.move_to_end(qr_code_hash)
+        while len(self._ausentes) > settings.QR_NEGATIVE_CACHE_MAX:
+            self._ausentes.popitem(last=False)
+
+    def _ausencia_conhecida(self, qr_code_hash: str) -> bool:
+        expira_em = self._ausentes.get(qr_code_hash)
+        if expira_em is None:
+            return False
+        if expira_em < time.monotonic():
+            del self._ausentes[qr_code_hash]
+            return False
+        return True
+
+    async def pode_existir(self, db: Session, qr_code_hash: str) -> bool:
+        """
+        False garante que o hash não existe (pode ser rejeitado sem consultar o banco).
+        True significa que o banco precisa ser consultado.
+        """
+        if self._filtro is None:
+            return True
+        if self._ausencia_conhecida(qr_code_hash):
+            return False
+        if qr_code_hash in self._filtro:
+            return True
+
+        geracao = await self.redis.get_key(self.CHAVE_GERACAO)
+        if geracao is None and not self.redis.connected:
+            # Sem Redis não há como saber se outro worker incluiu o hash
+            return True
+        if geracao != self._geracao:
+            if not await self._reconstruir_fora_do_loop(db, geracao):
+                return True
+            return qr_code_hash in self._filtro
+        return False
+
+    def preparar_registro(self, db: Session, alteracoes: Alteracoes) -> Optional[Callable[[], Awaitable[None]]]:
+        """
+        Preparador pós-commit (ver pos_commit): lê os hashes das mesas marcadas
+        como "qr_code" e os registra no filtro depois do commit.
+        """
+        ids = alteracoes.get("qr_code")
+        if not ids:
+            return None
+        hashes = list(db.execute(
+            select(Mesa.qr_code_hash).where(Mesa.id.in_(ids), Mesa.qr_code_hash.isnot(None))
+        ).scalars())
+        if not hashes:
+            return None
+
+        async def registrar() -> None:
+            await self.registrar(hashes)
+
+        return registrar
+
+
+qr_code_filter = QrCodeHashFilter()
@@ -0,0 +1,238 @@
+from asyncio.log import logger
+
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from app.core import security
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.services.redis_service import RedisService, redis_service
+
+rate_limit_rejeicoes = Counter(
+    "rate_limit_rejeicoes_total", "Requisições recusadas pelo limite de taxa", ["politica"]
+)
+rate_limit_decisoes_locais = Counter(
+    "rate_limit_decisoes_locais_total", "Decisões tomadas pelo balde em memória (Redis indisponível)", ["politica"]
+)
+
+# Token bucket atômico: reabastece pelo tempo decorrido (relógio do Redis, igual
+# para todos os workers), consome `custo` se houver fichas e informa a espera.
+# A espera volta como texto porque o Redis trunca números Lua para inteiro.
+SCRIPT_TOKEN_BUCKET = """
+local capacidade = tonumber(ARGV[1])
+local taxa = tonumber(ARGV[2])
+local custo = tonumber(ARGV[3])
+local relogio = redis.call('TIME')
+local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'fichas', 'ts')
+local fichas = tonumber(estado[1]) or capacidade
+local ts = tonumber(estado[2]) or agora
+fichas = math.min(capacidade, fichas + math.max(0, agora - ts) * taxa)
+local permitido = 0
+local espera = 0
+if fichas >= custo then
+    fichas = fichas - custo
+    permitido = 1
+else
+    espera = (custo - fichas) / taxa
+end
+redis.call('HSET', KEYS[1], 'fichas', tostring(fichas), 'ts', tostring(agora))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidade / taxa * 1000) + 1000)
+return {permitido, tostring(espera)}
+"""
+
+CHAVE_IP = "ip"
+CHAVE_USUARIO = "usuario"  # usuário do token Bearer; sem token, cai para o IP
+CHAVE_QR = "qr"  # grupo "qr" da rota (hash do QR Code)
+
+
+@dataclass(frozen=True)
+class PoliticaLimite:
+    nome: str
+    metodo: str
+    rota: Pattern[str]
+    chave: str
+    capacidade: int  # rajada máxima
+    por_segundo: float  # reabastecimento
+
+
+def _rota(padrao: str) -> Pattern[str]:
+    return re.compile(f"^{re.escape(settings.API_V1_STR)}{padrao}/?$")
+
+
+POLITICAS: Tuple[PoliticaLimite, ...] = (
+    # Cada tentativa custa um bcrypt: poucas por IP, com reposição lenta
+    PoliticaLimite("login", "POST", _rota("/auth/login/access-token"), CHAVE_IP, 10, 10 / 60),
+    PoliticaLimite("comanda_digital", "GET", _rota(r"/comandas/digital/(?P<qr>[^/]+)(/stream)?"), CHAVE_QR, 30, 1.0),
+    PoliticaLimite("comanda_digital_ip", "GET", _rota(r"/comandas/digital/[^/]+(/stream)?"), CHAVE_IP, 60, 2.0),
+    PoliticaLimite("produtos", "GET", _rota(r"/produtos(/[^/]+)?"), CHAVE_USUARIO, 60, 10.0),
+    PoliticaLimite("qrcode_mesa", "GET", _rota(r"/mesas/[^/]+/qrcode"), CHAVE_USUARIO, 10, 1.0),
+)
+
+
+class _BaldesLocais:
+    """Token buckets em memória (por worker), com descarte LRU acima de `maximo` chaves."""
+
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._baldes: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def consumir(self, chave: str, capacidade: int, por_segundo: float, custo: float = 1) -> Tuple[bool, float]:
+        agora = time.monotonic()
+        fichas, ts = self._baldes.pop(chave, (capacidade, agora))
+        fichas = min(capacidade, fichas + (agora - ts) * por_segundo)
+        permitido = fichas >= custo
+        espera = 0.0
+        if permitido:
+            fichas -= custo
+        else:
+            espera = (custo - fichas) / por_segundo
+        self._baldes[chave] = (fichas, agora)
+        if len(self._baldes) > self.maximo:
+            self._baldes.popitem(last=False)
+        return permitido, espera
+
+
+class RateLimiter:
+    """
+    Token bucket por (política, chave) no Redis, via script Lua atômico.
+    Com o Redis indisponível (ou o broker em memória), decide com baldes locais
+    do worker: o limite efetivo passa a ser por worker, mas continua existindo.
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self.locais = _BaldesLocais(settings.RATE_LIMIT_BALDES_LOCAIS_MAX)
+
+    async def consumir(self, politica: PoliticaLimite, chave: str) -> Tuple[bool, float]:
+        """Retorna (permitido, segundos até haver ficha)."""
+        chave_redis = f"ratelimit:{politica.nome}:{chave}"
+        resultado = await self.redis.eval_script(
+            SCRIPT_TOKEN_BUCKET, [chave_redis], [politica.capacidade, politica.por_segundo, 1]
+        )
+        if resultado is not None:
+            try:
+                return bool(int(resultado[0])), float(resultado[1])
+            except (TypeError, ValueError, IndexError) as e:
+                logger.error(f"Resposta inesperada do token bucket: {resultado!r} ({str(e)})")
+        rate_limit_decisoes_locais.inc(politica=politica.nome)
+        return self.locais.consumir(chave_redis, politica.capacidade, politica.por_segundo)
+
+
+rate_limiter = RateLimiter()
+
+
+def cabecalho(scope, nome: bytes) -> Optional[str]:
+    for chave, valor in scope.get("headers", ()):
+        if chave == nome:
+            return valor.decode("latin-1")
+    return None
+
+
+def ip_do_cliente(scope) -> str:
+    if settings.RATE_LIMIT_CONFIAR_PROXY:
+        encaminhado = cabecalho(scope, b"x-forwarded-for")
+        if encaminhado:
+            return encaminhado.split(",")[0].strip()
+    cliente = scope.get("client")
+    return cliente[0] if cliente else "desconhecido"
+
+
+# Chave em scope["state"] (request.state) com o token já verificado: (token, payload ou None)
+ESTADO_TOKEN = "token_verificado"
+
+
+def token_do_cabecalho(scope) -> Optional[str]:
+    autorizacao = cabecalho(scope, b"authorization")
+    if not autorizacao or not autorizacao.lower().startswith("bearer "):
+        return None
+    return autorizacao[7:]
+
+
+def payload_do_token(scope) -> Optional[dict]:
+    """
+    Payload do access token do cabeçalho Authorization (assinatura, tipo e
+    `sub`), ou None. Verificado uma vez por requisição: o resultado fica em
+    scope["state"] para os middlewares seguintes e para deps.get_token_payload.
+    Não consulta a revogação (ver refresh_token_store.token_revogado).
+    """
+    token = token_do_cabecalho(scope)
+    if token is None:
+        return None
+    estado = scope.setdefault("state", {})
+    verificado = estado.get(ESTADO_TOKEN)
+    if verificado is not None and verificado[0] == token:
+        return verificado[1]
+    payload = security.decode_token(token)
+    if payload is None or payload.get("type") != security.TIPO_ACCESS or payload.get("sub") is None:
+        payload = None
+    estado[ESTADO_TOKEN] = (token, payload)
+    return payload
+
+
+def usuario_do_token(scope) -> Optional[str]:
+    payload = payload_do_token(scope)
+    return payload["sub"] if payload else None
+
+
+def _chave(politica: PoliticaLimite, scope, correspondencia: "re.Match[str]") -> str:
+    if politica.chave == CHAVE_QR:
+        return correspondencia.group("qr")
+    if politica.chave == CHAVE_USUARIO:
+        usuario = usuario_do_token(scope)
+        if usuario:
+            return f"usuario:{usuario}"
+    return f"ip:{ip_do_cliente(scope)}"
+
+
+class LimiteRequisicoesMiddleware:
+    """
+    Middleware ASGI que aplica as POLITICAS antes de o endpoint rodar. Excedido
+    o limite, responde 429 com Retry-After sem tocar no banco nem no bcrypt.
+    """
+
+    def __init__(self, app, politicas: Tuple[PoliticaLimite, ...] = POLITICAS, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.politicas = politicas
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ATIVO:
+            await self.app(scope, receive, send)
+            return
+
+        espera_maxima = None
+        for politica in self.politicas:
+            if scope["method"] != politica.metodo:
+                continue
+            correspondencia = politica.rota.match(scope["path"])
+            if correspondencia is None:
+                continue
+            permitido, espera = await self.limiter.consumir(politica, _chave(politica, scope, correspondencia))
+            if not permitido:
+                rate_limit_rejeicoes.inc(politica=politica.nome)
+                espera_maxima = max(espera, espera_maxima or 0.0)
+
+        if espera_maxima is None:
+            await self.app(scope, receive, send)
+            return
+        await self._recusar(send, espera_maxima)
+
+    @staticmethod
+    async def _recusar(send, espera: float) -> None:
+        corpo = json.dumps({"detail": "Muitas requisições; tente novamente mais tarde"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(corpo)).encode()),
+                (b"retry-after", str(max(1, math.ceil(espera))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": corpo})
@@ -0,0 +1,264 @@
+from asyncio.log import logger
+
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+from app.schemas.evento_schemas import CANAL_COMANDAS, CANAL_MESAS, CANAL_NOTIFICACOES, CANAL_PEDIDOS, Evento
+from app.services.event_codec import decodificar
+from app.services.redis_service import RedisService, redis_service
+
+conexoes_ativas = Gauge("realtime_conexoes_ativas", "Telas conectadas ao worker", ["topico"])
+eventos_descartados = Counter("realtime_eventos_descartados_total", "Eventos descartados por tela lenta", ["topico"])
+eventos_entregues = Counter("realtime_eventos_entregues_total", "Eventos entregues às telas", ["topico"])
+conexoes_recusadas = Counter(
+    "realtime_conexoes_recusadas_total", "Conexões recusadas pelo limite por tópico ou por origem", ["motivo"]
+)
+
+
+class Assinatura:
+    """
+    Uma tela conectada (WebSocket ou SSE). Recebe eventos por uma fila limitada:
+    quando a tela não acompanha, o evento mais antigo é descartado (a tela sempre
+    vê o estado mais recente).
+    """
+
+    def __init__(
+            self, topico: str, filtro: Optional[Callable[[Evento], bool]] = None, tamanho: Optional[int] = None,
+            origem: Optional[str] = None
+    ):
+        self.topico = topico
+        self.filtro = filtro
+        self.origem = origem # IP do cliente, nas conexões públicas limitadas por origem
+        self.fila: "asyncio.Queue[Evento]" = asyncio.Queue(maxsize=tamanho or settings.REALTIME_BUFFER_MAX)
+        self.descartados = 0
+
+    def entregar(self, evento: Evento) -> None:
+        if self.filtro and not self.filtro(evento):
+            return
+        if self.fila.full():
+            self.fila.get_nowait()
+            self.descartados += 1
+            eventos_descartados.inc(topico=self.topico)
+        self.fila.put_nowait(evento)
+        eventos_entregues.inc(topico=self.topico)
+
+    async def proximo(self, timeout: Optional[float] = None) -> Optional[Evento]:
+        """Aguarda o próximo evento; retorna None se o timeout expirar (usado para heartbeats)."""
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def topico_mesa(mesa_id: UUID) -> str:
+    return f"mesa:{mesa_id}"
+
+
+def topico_usuario(usuario_id: Union[UUID, str]) -> str:
+    return f"usuario:{usuario_id}"
+
+
+def topicos_do_evento(evento: Evento) -> Iterable[str]:
+    """Tópicos locais para os quais um evento recebido do Redis é roteado."""
+    if evento.canal == CANAL_NOTIFICACOES:
+        # Direcionada: só as conexões do usuário neste worker, nada de broadcast
+        if evento.dados.get("id_usuario"):
+            yield topico_usuario(evento.dados["id_usuario"])
+        return
+    yield evento.canal
+    if evento.id_mesa:
+        yield topico_mesa(evento.id_mesa)
+
+
+class RealtimeHub:
+    """
+    Distribuição de eventos em tempo real dentro de um worker.
+
+    Cada worker mantém uma única inscrição no Redis (uma conexão PubSub para
+    todos os canais) e repassa os eventos para as N telas conectadas por meio de
+    filas em memória, em vez de abrir uma conexão Redis por tela.
+
+    O registro de assinantes é indexado por tópico; notificações para um
+    usuário (tópico `usuario:{id}`) custam uma busca no dicionário e chegam só
+    às conexões desse usuário, se ele estiver conectado a este worker.
+    """
+
+    CANAIS = (CANAL_PEDIDOS, CANAL_COMANDAS, CANAL_MESAS, CANAL_NOTIFICACOES)
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._assinantes: Dict[str, Set[Assinatura]] = {}
+        self._por_origem: Dict[str, int] = {}
+        self._observadores: List[Callable[[Evento], None]] = []
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def assinar(self, assinatura: Assinatura) -> Assinatura:
+        self._assinantes.setdefault(assinatura.topico, set()).add(assinatura)
+        if assinatura.origem is not None:
+            self._por_origem[assinatura.origem] = self._por_origem.get(assinatura.origem, 0) + 1
+        conexoes_ativas.inc(topico=assinatura.topico)
+        self.iniciar()
+        return assinatura
+
+    def motivo_recusa(self, topico: str, origem: Optional[str], limites: Tuple[int, int]) -> Optional[str]:
+        """
+        Verifica os limites (por tópico, por origem) de conexões simultâneas
+        neste worker; retorna o motivo da recusa ou None se há vaga.
+        """
+        max_topico, max_origem = limites
+        if len(self._assinantes.get(topico, ())) >= max_topico:
+            return "topico"
+        if origem is not None and self._por_origem.get(origem, 0) >= max_origem:
+            return "origem"
+        return None
+
+    def cancelar(self, assinatura: Assinatura) -> None:
+        assinantes = self._assinantes.get(assinatura.topico)
+        if assinantes and assinatura in assinantes:
+            assinantes.discard(assinatura)
+            conexoes_ativas.dec(topico=assinatura.topico)
+            if not assinantes:
+                del self._assinantes[assinatura.topico]
+            if assinatura.origem is not None:
+                restantes = self._por_origem.get(assinatura.origem, 1) - 1
+                if restantes > 0:
+                    self._por_origem[assinatura.origem] = restantes
+                else:
+                    self._por_origem.pop(assinatura.origem, None)
+
+    def observar(self, observador: Callable[[Evento], None]) -> None:
+        """
+        Registra um consumidor interno de todos os eventos recebidos (ex.: filas
+        das estações). O observador roda no loop do hub e não pode fazer I/O.
+        """
+        self._observadores.append(observador)
+        self.iniciar()
+
+    def distribuir(self, evento: Evento) -> None:
+        """
+        Entrega um evento às telas dos tópicos correspondentes (sem I/O). Eventos
+        em lote atravessam o Redis como uma mensagem só e são expandidos aqui.
+        """
+        for individual in evento.expandir():
+            for observador in self._observadores:
+                try:
+                    observador(individual)
+                except Exception as e:
+                    logger.error(f"Observador de eventos falhou: {str(e)}")
+            for topico in topicos_do_evento(individual):
+                for assinatura in list(self._assinantes.get(topico, ())):
+                    assinatura.entregar(individual)
+
+    def iniciar(self) -> None:
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.get_running_loop().create_task(self._escutar())
+
+    async def parar(self) -> None:
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    async def _escutar(self) -> None:
+        espera = 0.5
+        while True:
+            pubsub = await self.redis.create_pubsub(*self.CANAIS, binario=True)
+            if pubsub is None:
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 10.0)
+                continue
+            espera = 0.5
+            try:
+                async for mensagem in pubsub.listen():
+                    if mensagem.get("type") != "message":
+                        continue
+                    try:
+                        evento = decodificar(mensagem["data"])
+                    except ValueError as e:
+                        logger.error(f"Evento inválido recebido do Redis: {str(e)}")
+                        continue
+                    self.distribuir(evento)
+            except asyncio.CancelledError:
+                await pubsub.close()
+                raise
+            except Exception as e:
+                logger.error(f"Inscrição Redis do hub em tempo real caiu: {str(e)}")
+                self.redis.connected = False
+                await pubsub.close()
+
+
+realtime_hub = RealtimeHub()
+
+
+def filtro_estacao(estacao: Optional[str] = None, categoria: Optional[str] = None) -> Optional[Callable[[Evento], bool]]:
+    """
+    Filtro de eventos por estação (cozinha, bar...) ou por categoria de produto.
+    Eventos sem categoria conhecida são entregues a todas as estações.
+    """
+    categorias: Set[str] = set()
+    if estacao:
+        categorias.update(settings.KDS_ESTACOES.get(estacao, []))
+    if categoria:
+        categorias.add(categoria)
+    if not categorias:
+        return None
+
+    def _filtro(evento: Evento) -> bool:
+        return not evento.categorias or bool(categorias.intersection(evento.categorias))
+
+    return _filtro
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def formatar_sse(evento: Evento) -> str:
+    return f"event: {evento.tipo.value}\ndata: {evento.model_dump_json()}\n\n"
+
+
+# Campos de `Evento.dados` que podem chegar ao cliente pela comanda digital
+_DADOS_PUBLICOS_COMANDA = ("valor_total_calculado", "valor_pago", "valor_fiado")
+
+
+def formatar_sse_comanda_digital(evento: Evento) -> str:
+    """Delta da comanda digital para o cliente: sem categorias, usuários ou dados de caixa."""
+    delta = evento.model_dump(mode="json", include={"tipo", "timestamp", "id_pedido", "id_item_pedido", "status"})
+    valores = {chave: evento.dados[chave] for chave in _DADOS_PUBLICOS_COMANDA if chave in evento.dados}
+    if valores:
+        delta["valores"] = valores
+    return f"event: {evento.tipo.value}\ndata: {json.dumps(delta)}\n\n"
+
+
+async def stream_sse(
+        assinatura: Assinatura,
+        desconectado: Callable[[], Awaitable[bool]],
+        formatar: Callable[[Evento], str] = formatar_sse,
+        limites: Optional[Tuple[int, int]] = None
+) -> AsyncIterator[str]:
+    """
+    Gera o corpo text/event-stream de uma assinatura, com heartbeats periódicos.
+    A assinatura só entra no hub quando o corpo começa a ser transmitido e sai
+    no finally: resposta abandonada antes disso não deixa assinante pendurado.
+    Com `limites` (por tópico, por origem), a conexão que passar deles recebe
+    só o intervalo de reconexão e é encerrada.
+    """
+    try:
+        if limites is not None:
+            motivo = realtime_hub.motivo_recusa(assinatura.topico, assinatura.origem, limites)
+            if motivo is not None:
+                conexoes_recusadas.inc(motivo=motivo)
+                yield f"retry: {settings.REALTIME_HEARTBEAT_SEGUNDOS * 1000}\n\n"
+                return
+        realtime_hub.assinar(assinatura)
+        while not await desconectado():
+            evento = await assinatura.proximo(timeout=settings.REALTIME_HEARTBEAT_SEGUNDOS)
+            yield formatar(evento) if evento else ": heartbeat\n\n"
+    finally:
+        realtime_hub.cancelar(assinatura)
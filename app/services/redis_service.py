@@ -1,15 +1,69 @@
 from asyncio.log import logger
 
+import asyncio
 import redis.asyncio as redis
-from typing import Optional, AsyncIterator
+from redis.exceptions import MaxConnectionsError
+from typing import Optional, AsyncIterator, Dict, List, Tuple, Union
+from app.core.circuit_breaker import CircuitBreaker
 from app.core.config import settings
 
+# Remove a chave apenas se o valor for o esperado
+_SCRIPT_REMOVER_SE_IGUAL = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class RedisService:
+    """
+    Cliente Redis único por processo, sobre um pool de conexões.
+    Conectado na inicialização da aplicação e fechado no shutdown (ver app.main).
+    """
+
     def __init__(self):
+        self._pool = None
         self._client = None
+        self._client_binario = None
+        self._client_streams = None
+        self._vagas_streams = asyncio.Semaphore(settings.REDIS_STREAM_MAX_CONNECTIONS)
         self._pubsub = None
+        self._scripts: Dict[str, object] = {}
+        self.connected = False
+        self.breaker = CircuitBreaker(
+            "redis", settings.REDIS_CIRCUIT_LIMITE_FALHAS, settings.REDIS_CIRCUIT_ESPERA_SEGUNDOS,
+            prazo_sonda=settings.REDIS_CIRCUIT_PRAZO_SONDA_SEGUNDOS
+        )
+
+    async def _disponivel(self) -> bool:
+        """
+        Verifica o circuito antes de cada chamada: com o Redis fora do ar, as chamadas
+        falham na hora em vez de esperar o timeout de conexão a cada requisição.
+        """
+        if not self.breaker.permite():
+            return False
+        if self.connected:
+            return True
+        return await self.connect()
+
+    def _registrar_falha(self) -> None:
         self.connected = False
+        self.breaker.registrar_falha()
+
+    @staticmethod
+    def _criar_pool(max_connections: int, decode_responses: bool) -> redis.ConnectionPool:
+        return redis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=settings.REDIS_DB,
+            max_connections=max_connections,
+            decode_responses=decode_responses,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            retry_on_timeout=True
+        )
 
     async def connect(self) -> bool:
         """Estabelece conexão com o Redis"""
@@ -17,16 +71,9 @@ class RedisService:
             return True
 
         try:
-            self._client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                password=settings.REDIS_PASSWORD,
-                db=settings.REDIS_DB,
-                decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5,
-                retry_on_timeout=True
-            )
+            if self._pool is None:
+                self._pool = self._criar_pool(settings.REDIS_MAX_CONNECTIONS, decode_responses=True)
+            self._client = redis.Redis(connection_pool=self._pool)
 
             # Test connection
             await self._client.ping()
@@ -38,6 +85,7 @@ class RedisService:
             logger.error(f"Falha na conexão Redis: {str(e)}")
             self._client = None
             self.connected = False
+            self.breaker.registrar_falha()
             return False
 
     async def disconnect(self):
@@ -47,29 +95,71 @@ class RedisService:
                 if self._pubsub:
                     await self._pubsub.close()
                 await self._client.close()
+                await self._pool.disconnect()
+                if self._client_binario:
+                    await self._client_binario.close()
+                    await self._client_binario.connection_pool.disconnect()
+                if self._client_streams:
+                    await self._client_streams.close()
+                    await self._client_streams.connection_pool.disconnect()
                 logger.info("Conexão Redis encerrada")
             except Exception as e:
                 logger.error(f"Erro ao desconectar Redis: {str(e)}")
             finally:
                 self._client = None
+                self._client_binario = None
+                self._client_streams = None
+                self._pool = None
                 self._pubsub = None
                 self.connected = False
 
-    async def publish(self, channel: str, message: str) -> bool:
+    async def publish(self, channel: str, message: Union[str, bytes]) -> bool:
         """
         Publica mensagem em um canal Redis
         Retorna True se bem sucedido, False caso contrário
         """
-        if not self.connected and not await self.connect():
+        if not await self._disponivel():
             return False
 
         try:
             await self._client.publish(channel, message)
             logger.debug(f"Mensagem publicada no canal {channel}: {message[:100]}...")
+            self.breaker.registrar_sucesso()
             return True
         except Exception as e:
             logger.error(f"Erro ao publicar no Redis: {str(e)}")
-            self.connected = False
+            self._registrar_falha()
+            return False
+
+    async def publish_many(
+            self,
+            messages: List[Tuple[str, Union[str, bytes]]],
+            stream_entries: Optional[List[Tuple[str, Dict[str, str]]]] = None,
+            maxlen: Optional[int] = None
+    ) -> bool:
+        """
+        Publica várias mensagens em um único round trip (pipeline sem transação).
+        Entradas de stream opcionais (XADD com trim aproximado) vão no mesmo pipeline.
+        Retorna True se bem sucedido, False caso contrário
+        """
+        if not messages and not stream_entries:
+            return True
+        if not await self._disponivel():
+            return False
+
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for channel, message in messages:
+                    pipe.publish(channel, message)
+                for stream, fields in stream_entries or []:
+                    pipe.xadd(stream, fields, maxlen=maxlen, approximate=True)
+                await pipe.execute()
+            logger.debug(f"{len(messages)} mensagens publicadas em pipeline")
+            self.breaker.registrar_sucesso()
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao publicar lote no Redis: {str(e)}")
+            self._registrar_falha()
             return False
 
     async def subscribe(self, channel: str) -> bool:
@@ -77,19 +167,46 @@ class RedisService:
         Inscreve em um canal Redis
         Retorna True se bem sucedido, False caso contrário
         """
-        if not self.connected and not await self.connect():
+        if not await self._disponivel():
             return False
 
         try:
             self._pubsub = self._client.pubsub()
             await self._pubsub.subscribe(channel)
             logger.info(f"Inscrito no canal Redis: {channel}")
+            self.breaker.registrar_sucesso()
             return True
         except Exception as e:
             logger.error(f"Erro ao inscrever no Redis: {str(e)}")
-            self.connected = False
+            self._registrar_falha()
             return False
 
+    async def create_pubsub(self, *channels: str, binario: bool = False):
+        """
+        Cria um PubSub próprio já inscrito nos canais (independente do `subscribe` compartilhado).
+        Com `binario=True` as mensagens chegam como bytes, sem decodificação UTF-8
+        (necessário para payloads no formato binário de eventos).
+        Retorna None se o Redis estiver indisponível.
+        """
+        if not await self._disponivel():
+            return None
+
+        try:
+            if binario:
+                if self._client_binario is None:
+                    self._client_binario = redis.Redis(connection_pool=self._criar_pool(4, decode_responses=False))
+                pubsub = self._client_binario.pubsub(ignore_subscribe_messages=True)
+            else:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(*channels)
+            logger.info(f"PubSub inscrito nos canais: {', '.join(channels)}")
+            self.breaker.registrar_sucesso()
+            return pubsub
+        except Exception as e:
+            logger.error(f"Erro ao criar PubSub no Redis: {str(e)}")
+            self._registrar_falha()
+            return None
+
     async def listen(self) -> AsyncIterator[Optional[dict]]:
         """
         Gera mensagens recebidas dos canais inscritos
@@ -107,7 +224,7 @@ class RedisService:
 
     async def set_key(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
         """Armazena um valor com TTL opcional"""
-        if not self.connected and not await self.connect():
+        if not await self._disponivel():
             return False
 
         try:
@@ -115,39 +232,235 @@ class RedisService:
                 await self._client.setex(key, ttl, value)
             else:
                 await self._client.set(key, value)
+            self.breaker.registrar_sucesso()
             return True
         except Exception as e:
             logger.error(f"Erro ao definir chave Redis: {str(e)}")
-            self.connected = False
+            self._registrar_falha()
             return False
 
     async def get_key(self, key: str) -> Optional[str]:
         """Obtém um valor armazenado"""
-        if not self.connected and not await self.connect():
+        if not await self._disponivel():
             return None
 
         try:
-            return await self._client.get(key)
+            resultado = await self._client.get(key)
+            self.breaker.registrar_sucesso()
+            return resultado
         except Exception as e:
             logger.error(f"Erro ao obter chave Redis: {str(e)}")
-            self.connected = False
+            self._registrar_falha()
+            return None
+
+    async def set_key_if_absent(self, key: str, value: str, ttl_ms: int) -> bool:
+        """
+        Armazena o valor apenas se a chave não existir (SET NX PX).
+        Usado como lock distribuído simples; retorna True se a chave foi criada.
+        """
+        if not await self._disponivel():
+            return False
+
+        try:
+            criada = await self._client.set(key, value, nx=True, px=ttl_ms)
+            self.breaker.registrar_sucesso()
+            return bool(criada)
+        except Exception as e:
+            logger.error(f"Erro ao definir chave Redis (NX): {str(e)}")
+            self._registrar_falha()
+            return False
+
+    async def incr(self, key: str, ttl: Optional[int] = None) -> Optional[int]:
+        """
+        Incrementa um contador atômico, retornando o novo valor. Com `ttl`
+        (segundos), a chave expira; o prazo é definido só quando ela é criada.
+        """
+        if not await self._disponivel():
+            return None
+
+        try:
+            if ttl:
+                async with self._client.pipeline(transaction=True) as pipe:
+                    pipe.incr(key)
+                    pipe.expire(key, ttl, nx=True)
+                    resultado, _ = await pipe.execute()
+            else:
+                resultado = await self._client.incr(key)
+            self.breaker.registrar_sucesso()
+            return resultado
+        except Exception as e:
+            logger.error(f"Erro ao incrementar chave Redis: {str(e)}")
+            self._registrar_falha()
+            return None
+
+    async def eval_script(self, script: str, keys: List[str], args: List[Union[str, int, float]]) -> Optional[list]:
+        """
+        Executa um script Lua de forma atômica. O script é registrado uma vez e
+        chamado por EVALSHA (o redis-py reenvia o código se o servidor o perdeu).
+        Retorna None se o Redis estiver indisponível.
+        """
+        if not await self._disponivel():
+            return None
+
+        try:
+            registrado = self._scripts.get(script)
+            if registrado is None:
+                registrado = self._scripts[script] = self._client.register_script(script)
+            resultado = await registrado(keys=keys, args=args, client=self._client)
+            self.breaker.registrar_sucesso()
+            return resultado
+        except Exception as e:
+            logger.error(f"Erro ao executar script Lua no Redis: {str(e)}")
+            self._registrar_falha()
+            return None
+
+    async def delete_key_if_value(self, key: str, value: str) -> bool:
+        """
+        Remove a chave só se ela ainda guardar `value` (compare-and-delete atômico).
+        Usado para liberar locks: um lock expirado e readquirido por outro worker
+        não é apagado por quem o perdeu.
+        """
+        resultado = await self.eval_script(_SCRIPT_REMOVER_SE_IGUAL, [key], [value])
+        return bool(resultado)
+
+    async def stream_group_create(self, stream: str, group: str) -> bool:
+        """
+        Cria o consumer group (e o stream, se preciso) a partir das próximas entradas.
+        Um grupo já existente não é erro.
+        """
+        if not await self._disponivel():
+            return False
+
+        try:
+            await self._client.xgroup_create(stream, group, id="$", mkstream=True)
+            self.breaker.registrar_sucesso()
+            return True
+        except redis.ResponseError as e:
+            # Erro de comando: o Redis respondeu, então não conta como falha de disponibilidade
+            self.breaker.registrar_sucesso()
+            if "BUSYGROUP" in str(e):
+                return True
+            logger.error(f"Erro ao criar consumer group Redis: {str(e)}")
+            return False
+        except Exception as e:
+            logger.error(f"Erro ao criar consumer group Redis: {str(e)}")
+            self._registrar_falha()
+            return False
+
+    async def stream_read_group(
+            self, stream: str, group: str, consumer: str, start: str = ">",
+            count: Optional[int] = None, block_ms: Optional[int] = None
+    ) -> Optional[List[Tuple[str, Optional[Dict[str, str]]]]]:
+        """
+        Lê entradas do stream como `consumer` do grupo (XREADGROUP).
+        `start=">"` entrega entradas novas; `start="0"` reentrega as pendentes do próprio consumidor.
+        Retorna None se o Redis estiver indisponível.
+
+        Com `block_ms` a conexão fica presa até a espera acabar, então a leitura
+        usa um pool próprio, limitado a REDIS_STREAM_MAX_CONNECTIONS leituras
+        simultâneas. Sem vaga em REDIS_STREAM_ESPERA_CONEXAO a leitura volta vazia
+        (a tela lê de novo): pool cheio não é falha do Redis e não conta no circuito.
+        """
+        if not await self._disponivel():
+            return None
+        if not block_ms:
+            return await self._ler_stream(self._client, stream, group, consumer, start, count, block_ms)
+
+        try:
+            await asyncio.wait_for(self._vagas_streams.acquire(), settings.REDIS_STREAM_ESPERA_CONEXAO)
+        except asyncio.TimeoutError:
+            logger.warning(f"Sem conexão livre para leitura bloqueante do stream {stream}")
+            return []
+        try:
+            if self._client_streams is None:
+                self._client_streams = redis.Redis(connection_pool=self._criar_pool(
+                    settings.REDIS_STREAM_MAX_CONNECTIONS, decode_responses=True
+                ))
+            return await self._ler_stream(self._client_streams, stream, group, consumer, start, count, block_ms)
+        finally:
+            self._vagas_streams.release()
+
+    async def _ler_stream(
+            self, cliente, stream: str, group: str, consumer: str, start: str,
+            count: Optional[int], block_ms: Optional[int]
+    ) -> Optional[List[Tuple[str, Optional[Dict[str, str]]]]]:
+        try:
+            resposta = await cliente.xreadgroup(
+                group, consumer, {stream: start}, count=count, block=block_ms
+            )
+            self.breaker.registrar_sucesso()
+            return [entrada for _, entradas in resposta or [] for entrada in entradas]
+        except MaxConnectionsError as e:
+            # Pool esgotado: o Redis está de pé, só faltou conexão neste worker
+            logger.warning(f"Pool Redis esgotado ao ler stream: {str(e)}")
+            return []
+        except Exception as e:
+            logger.error(f"Erro ao ler stream Redis: {str(e)}")
+            self._registrar_falha()
+            return None
+
+    async def stream_ack(self, stream: str, group: str, *ids: str) -> Optional[int]:
+        """Confirma entradas processadas (XACK); retorna quantas estavam pendentes"""
+        if not ids:
+            return 0
+        if not await self._disponivel():
+            return None
+
+        try:
+            resultado = await self._client.xack(stream, group, *ids)
+            self.breaker.registrar_sucesso()
+            return resultado
+        except Exception as e:
+            logger.error(f"Erro ao confirmar entradas do stream Redis: {str(e)}")
+            self._registrar_falha()
+            return None
+
+    async def stream_autoclaim(
+            self, stream: str, group: str, consumer: str, min_idle_ms: int, count: Optional[int] = None
+    ) -> Optional[List[Tuple[str, Optional[Dict[str, str]]]]]:
+        """
+        Transfere para `consumer` as entradas pendentes há mais de `min_idle_ms`
+        em outros consumidores (XAUTOCLAIM), por exemplo de uma tela que caiu.
+        """
+        if not await self._disponivel():
+            return None
+
+        try:
+            resposta = await self._client.xautoclaim(
+                stream, group, consumer, min_idle_ms, start_id="0-0", count=count
+            )
+            self.breaker.registrar_sucesso()
+            return list(resposta[1])
+        except Exception as e:
+            logger.error(f"Erro ao reassumir entradas do stream Redis: {str(e)}")
+            self._registrar_falha()
             return None
 
     async def delete_key(self, key: str) -> bool:
         """Remove uma chave"""
-        if not self.connected and not await self.connect():
+        if not await self._disponivel():
             return False
 
         try:
-            return await self._client.delete(key) > 0
+            resultado = await self._client.delete(key) > 0
+            self.breaker.registrar_sucesso()
+            return resultado
         except Exception as e:
             logger.error(f"Erro ao deletar chave Redis: {str(e)}")
-            self.connected = False
+            self._registrar_falha()
             return False
 
 
+def _criar_redis_service():
+    """Backend escolhido por REDIS_BACKEND: "redis" (servidor) ou "memoria" (um processo, sem servidor)."""
+    if settings.REDIS_BACKEND == "memoria":
+        from app.services.memory_broker import InMemoryRedisService
+        return InMemoryRedisService()
+    return RedisService()
+
+
 # Instância singleton do serviço
-redis_service = RedisService()
+redis_service = _criar_redis_service()
 
 
 # Funções para injeção de dependência
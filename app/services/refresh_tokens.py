@@ -0,0 +1,154 @@
+from asyncio.log import logger
+
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from app.core import security
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.services.redis_service import RedisService, redis_service
+
+refresh_rotacoes = Counter("refresh_tokens_rotacionados_total", "Refresh tokens trocados por um novo par")
+refresh_reutilizados = Counter(
+    "refresh_tokens_reutilizados_total", "Refresh tokens apresentados de novo (família revogada)"
+)
+refresh_emissoes_recusadas = Counter(
+    "refresh_tokens_emissoes_recusadas_total", "Emissões de tokens recusadas por falta da época no Redis"
+)
+
+
+class SessaoInvalida(Exception):
+    """Refresh token expirado, revogado ou reutilizado."""
+
+
+class SessoesIndisponiveis(Exception):
+    """O Redis não respondeu; não é possível confirmar o uso único do refresh token."""
+
+
+class RefreshTokenStore:
+    """
+    Refresh tokens rotativos e revogação de sessões, no Redis.
+
+    Cada login abre uma família (`fam`); cada uso do refresh token o consome
+    (INCR em `auth:refresh:uso:{jti}`) e emite outro da mesma família. Um token
+    já consumido que volta a aparecer indica vazamento: a família inteira é
+    revogada e quem estiver com o token legítimo precisa logar de novo.
+
+    Revogar todas as sessões de um usuário incrementa a época dele
+    (`auth:epoca:{sub}`). Access e refresh tokens carregam a época da emissão
+    (`epc`); tokens de época anterior são recusados. A verificação do access
+    token continua sem estado: a época é um inteiro por usuário, mantido em
+    cache local por AUTH_EPOCA_CACHE_SEGUNDOS.
+    """
+
+    def __init__(self, redis: RedisService = redis_service):
+        self.redis = redis
+        self._epocas: Dict[str, Tuple[int, float]] = {}
+
+    @staticmethod
+    def _chave_epoca(sub: str) -> str:
+        return f"auth:epoca:{sub}"
+
+    async def epoca(self, sub: str, usar_cache: bool = True) -> Optional[int]:
+        """Época atual do usuário; None se o Redis não respondeu e não há valor em cache."""
+        em_cache = self._epocas.get(sub)
+        if usar_cache and em_cache and time.monotonic() - em_cache[1] < settings.AUTH_EPOCA_CACHE_SEGUNDOS:
+            return em_cache[0]
+        valor = await self.redis.get_key(self._chave_epoca(sub))
+        if valor is None:
+            if not self.redis.connected:
+                return em_cache[0] if em_cache else None
+            valor = 0
+        epoca = int(valor)
+        self._epocas[sub] = (epoca, time.monotonic())
+        return epoca
+
+    async def token_revogado(self, payload: dict) -> bool:
+        """
+        Indica se um access token já decodificado foi revogado pela época.
+        Com o Redis fora e sem cache, o token é aceito (até expirar) para não
+        derrubar o salão junto com o Redis.
+        """
+        sub = payload.get("sub")
+        epoca = await self.epoca(sub) if sub else None
+        return epoca is not None and int(payload.get("epc") or 0) < epoca
+
+    async def emitir(
+            self, sub: str, claims: Optional[Dict[str, Any]] = None, familia: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        Emite o par (access, refresh) de uma família nova (login) ou existente
+        (rotação). `claims` (papel e escopos) vão nos dois tokens; mudanças de
+        papel revogam a época, então a rotação pode copiá-los sem ir ao banco.
+        Sem a época atual (Redis fora), não emite: um token com época 0 valeria
+        mesmo depois de uma revogação de sessões.
+        """
+        epoca = await self.epoca(sub, usar_cache=False)
+        if epoca is None:
+            refresh_emissoes_recusadas.inc()
+            raise SessoesIndisponiveis("Armazenamento de sessões indisponível")
+        refresh = security.create_refresh_token(
+            sub, jti=uuid.uuid4().hex, familia=familia or uuid.uuid4().hex, epoca=epoca, claims=claims
+        )
+        return security.create_access_token(sub, epoca=epoca, claims=claims), refresh
+
+    def _decodificar(self, refresh_token: str) -> dict:
+        payload = security.decode_token(refresh_token)
+        if (
+            payload is None or payload.get("type") != security.TIPO_REFRESH
+            or not payload.get("sub") or not payload.get("jti") or not payload.get("fam")
+        ):
+            raise SessaoInvalida("Refresh token inválido")
+        return payload
+
+    @staticmethod
+    def _ttl_restante(payload: dict) -> int:
+        return max(int(payload["exp"] - time.time()), 1)
+
+    async def rotacionar(self, refresh_token: str) -> Tuple[str, str]:
+        """Consome o refresh token e devolve um novo par (access, refresh) da mesma família."""
+        payload = self._decodificar(refresh_token)
+        sub, familia = payload["sub"], payload["fam"]
+
+        epoca = await self.epoca(sub, usar_cache=False)
+        if epoca is None:
+            raise SessoesIndisponiveis("Armazenamento de sessões indisponível")
+        if int(payload.get("epc") or 0) < epoca:
+            raise SessaoInvalida("Sessão revogada")
+        if await self.redis.get_key(f"auth:refresh:revogada:{familia}") is not None:
+            raise SessaoInvalida("Sessão revogada")
+
+        usos = await self.redis.incr(f"auth:refresh:uso:{payload['jti']}", ttl=self._ttl_restante(payload))
+        if usos is None:
+            raise SessoesIndisponiveis("Armazenamento de sessões indisponível")
+        if usos > 1:
+            refresh_reutilizados.inc()
+            logger.warning(f"Refresh token reutilizado (usuário {sub}); família {familia} revogada")
+            await self._revogar_familia(familia)
+            raise SessaoInvalida("Refresh token já utilizado")
+
+        refresh_rotacoes.inc()
+        claims = {chave: payload[chave] for chave in security.CLAIMS_AUTORIZACAO if chave in payload}
+        return await self.emitir(sub, claims, familia)
+
+    async def _revogar_familia(self, familia: str) -> None:
+        # Vale até o último refresh possível da família expirar
+        await self.redis.set_key(
+            f"auth:refresh:revogada:{familia}", "1", ttl=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+        )
+
+    async def revogar(self, refresh_token: str) -> None:
+        """Logout: revoga a família do refresh token (esta sessão/dispositivo)."""
+        payload = self._decodificar(refresh_token)
+        await self._revogar_familia(payload["fam"])
+
+    async def revogar_usuario(self, sub: str) -> Optional[int]:
+        """Revoga todas as sessões do usuário; retorna a nova época (None se o Redis falhou)."""
+        epoca = await self.redis.incr(self._chave_epoca(sub))
+        if epoca is not None:
+            self._epocas[sub] = (epoca, time.monotonic())
+        return epoca
+
+
+refresh_token_store = RefreshTokenStore()
@@ -0,0 +1,217 @@
+"""
+Sincronização dos tablets que ficaram sem rede (POST /sync).
+
+Sem Wi-Fi, o tablet enfileira as operações (abrir mesa, criar pedido,
+adicionar item, registrar pagamento), cada uma com o UUID que ele mesmo gerou
+para o registro criado. Ao voltar, envia a fila inteira numa requisição:
+
+- as operações são aplicadas na ordem, todas na mesma transação (commit a
+  cada SYNC_OPERACOES_POR_TRANSACAO), cada uma num SAVEPOINT: a que falha é
+  rejeitada sozinha, e as que dependem dela também;
+- os UUIDs do cliente viram os ids no servidor, então operações seguintes do
+  lote os referenciam e um lote reenviado (resposta perdida) volta como
+  "repetida", sem duplicar nada. Os ids já existentes são consultados de uma
+  vez, uma consulta por tabela;
+- abrir uma mesa que outro tablet já abriu reaproveita a comanda ativa: o
+  resultado traz o id dela, e os pedidos do lote que apontavam para a comanda
+  do cliente vão para ela.
+
+A resposta traz também o que mudou no servidor desde o `cursor` da última
+sincronização (mesas, comandas e seus pedidos, itens e pagamentos), pelo
+carimbo de tempo de cada registro. O cursor devolvido recua
+SYNC_MARGEM_CURSOR_SEGUNDOS para não perder registros de transações que
+começaram antes e confirmaram depois; alguns registros podem vir repetidos na
+próxima vez. Sem cursor, ou com um mais antigo que SYNC_CURSOR_MAX_HORAS, vem o
+estado completo do salão. Remoções não aparecem no delta; pedidos e itens
+cancelados aparecem pelo status.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram
+from app.crud.crud_comanda import comanda as crud_comanda
+from app.crud.crud_mesa import mesa as crud_mesa
+from app.crud.crud_pagamento import pagamento as crud_pagamento
+from app.crud.crud_pedido import crud_pedido
+from app.models.comanda import Comanda, StatusComanda
+from app.models.mesa import Mesa, StatusMesa
+from app.models.pagamento import Pagamento
+from app.models.pedido import ItemPedido, Pedido
+from app.schemas.sincronizacao_schemas import (
+    ComandaSincronizacao, ItemPedidoSincronizacao, MesaSincronizacao, PagamentoSincronizacao, PedidoSincronizacao
+)
+from app.schemas.token_schemas import UsuarioToken
+
+sync_operacoes = Counter(
+    "sync_operacoes_total", "Operações recebidas dos tablets na sincronização offline", ["tipo", "resultado"]
+)
+sync_lote_segundos = Histogram(
+    "sync_lote_segundos", "Tempo para aplicar um lote de operações offline",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+APLICADA = "aplicada"
+REPETIDA = "repetida"
+REJEITADA = "rejeitada"
+
+# Registro criado por cada tipo de operação (o id da operação é o id dele)
+MODELO_DA_OPERACAO = {
+    "abrir_mesa": Comanda,
+    "criar_pedido": Pedido,
+    "adicionar_item": ItemPedido,
+    "registrar_pagamento": Pagamento,
+}
+
+# Comandas que o tablet acompanha no estado completo
+STATUS_COMANDA_EM_ANDAMENTO = (StatusComanda.ABERTA, StatusComanda.FECHADA, StatusComanda.PAGA_PARCIALMENTE)
+
+
+def _carimbo(modelo):
+    # Mesmo critério das ETags: data_atualizacao só é preenchida após o primeiro UPDATE
+    return func.coalesce(modelo.data_atualizacao, modelo.data_criacao)
+
+
+class SincronizadorOffline:
+
+    def _existentes(self, db: Session, operacoes: List[Any]) -> Set[uuid.UUID]:
+        """Ids do lote que já existem no servidor: uma consulta por tabela, não por operação."""
+        por_modelo: Dict[Any, List[uuid.UUID]] = {}
+        for operacao in operacoes:
+            por_modelo.setdefault(MODELO_DA_OPERACAO[operacao.tipo], []).append(operacao.id)
+        existentes: Set[uuid.UUID] = set()
+        for modelo, ids in por_modelo.items():
+            existentes.update(db.execute(select(modelo.id).where(modelo.id.in_(ids))).scalars())
+        return existentes
+
+    def _executar(
+            self, db: Session, operacao: Any, usuario: UsuarioToken, ids: Dict[uuid.UUID, uuid.UUID]
+    ) -> uuid.UUID:
+        """Aplica uma operação sem commit; retorna o id do registro no servidor."""
+        if operacao.tipo == "abrir_mesa":
+            ativa = crud_comanda.get_comanda_ativa_by_mesa(db, mesa_id=operacao.id_mesa)
+            if ativa:
+                return ativa.id
+            mesa = crud_mesa.get(db, id=operacao.id_mesa)
+            if not mesa:
+                raise ValueError("Mesa não encontrada.")
+            if mesa.status == StatusMesa.RESERVADA:
+                raise ValueError(f"Mesa está {mesa.status.value} e não pode ser aberta.")
+            comanda = crud_comanda.create_comanda_para_mesa(
+                db, mesa_id=mesa.id, id_cliente_associado=operacao.id_cliente_associado, id=operacao.id, commit=False
+            )
+            return comanda.id
+
+        if operacao.tipo == "criar_pedido":
+            obj_in = operacao.model_copy(update={"id_comanda": ids.get(operacao.id_comanda, operacao.id_comanda)})
+            pedido = crud_pedido.create(
+                db, obj_in=obj_in, id_usuario_registrou=usuario.id, id=operacao.id, commit=False
+            )
+            return pedido.id
+
+        if operacao.tipo == "adicionar_item":
+            item = crud_pedido.adicionar_item(
+                db, pedido_id=operacao.id_pedido, obj_in=operacao, id=operacao.id, commit=False
+            )
+            return item.id
+
+        if "cashier" not in usuario.escopos:
+            raise ValueError("Registrar pagamento exige o escopo cashier.")
+        obj_in = operacao.model_copy(update={"id_comanda": ids.get(operacao.id_comanda, operacao.id_comanda)})
+        pagamento = crud_pagamento.create(
+            db, obj_in=obj_in, id_usuario_registrou=usuario.id, id=operacao.id, commit=False
+        )
+        return pagamento.id
+
+    def aplicar(self, db: Session, operacoes: List[Any], usuario: UsuarioToken) -> List[dict]:
+        """
+        Aplica as operações na ordem e confirma. Retorna o resultado de cada uma.
+        Os CRUDs marcam mesas e comandas alteradas: cada commit invalida os
+        caches e regrava as comandas digitais delas (ver pos_commit).
+        """
+        inicio = time.perf_counter()
+        existentes = self._existentes(db, operacoes) if operacoes else set()
+        ids: Dict[uuid.UUID, uuid.UUID] = {} # id do cliente -> id no servidor, quando diferem
+        rejeitadas: Set[uuid.UUID] = set()
+        resultados: List[dict] = []
+        nao_confirmadas = 0
+
+        for operacao in operacoes:
+            resultado = {"id_cliente": operacao.id, "tipo": operacao.tipo, "resultado": REJEITADA, "id": None, "erro": None}
+            dependencias = {getattr(operacao, campo, None) for campo in ("id_comanda", "id_pedido")} & rejeitadas
+            if operacao.id in existentes:
+                resultado.update(resultado=REPETIDA, id=operacao.id)
+            elif dependencias:
+                resultado["erro"] = f"Depende da operação {dependencias.pop()}, rejeitada."
+            else:
+                try:
+                    with db.begin_nested():
+                        id_servidor = self._executar(db, operacao, usuario, ids)
+                    resultado.update(resultado=APLICADA, id=id_servidor)
+                    existentes.add(operacao.id)
+                    if id_servidor != operacao.id:
+                        ids[operacao.id] = id_servidor
+                    nao_confirmadas += 1
+                except ValueError as e:
+                    resultado["erro"] = str(e)
+                except IntegrityError:
+                    # Outra requisição gravou o mesmo id (lote reenviado em paralelo) ou a referência não existe
+                    modelo = MODELO_DA_OPERACAO[operacao.tipo]
+                    if db.execute(select(modelo.id).where(modelo.id == operacao.id)).first():
+                        resultado.update(resultado=REPETIDA, id=operacao.id)
+                    else:
+                        resultado["erro"] = "Conflito ao gravar a operação."
+            if resultado["resultado"] == REJEITADA:
+                rejeitadas.add(operacao.id)
+            sync_operacoes.inc(tipo=operacao.tipo, resultado=resultado["resultado"])
+            resultados.append(resultado)
+
+            if nao_confirmadas >= settings.SYNC_OPERACOES_POR_TRANSACAO:
+                db.commit()
+                nao_confirmadas = 0
+
+        db.commit()
+        if operacoes:
+            sync_lote_segundos.observe(time.perf_counter() - inicio)
+        return resultados
+
+    def _linhas(self, db: Session, modelo, schema, *criterios) -> List[Any]:
+        campos = [getattr(modelo, nome) for nome in schema.model_fields if nome != "atualizado_em"]
+        return db.execute(
+            select(*campos, _carimbo(modelo).label("atualizado_em")).where(*criterios).order_by(_carimbo(modelo))
+        ).all()
+
+    def delta(self, db: Session, cursor: Optional[datetime]) -> dict:
+        """Mudanças desde o cursor (ou o estado completo) e o cursor da próxima sincronização."""
+        agora = db.execute(select(func.now())).scalar_one()
+        completo = cursor is None or cursor < agora - timedelta(hours=settings.SYNC_CURSOR_MAX_HORAS)
+        if completo:
+            em_andamento = select(Comanda.id).where(Comanda.status_comanda.in_(STATUS_COMANDA_EM_ANDAMENTO))
+            filtros = {
+                Mesa: (),
+                Comanda: (Comanda.id.in_(em_andamento),),
+                Pedido: (Pedido.id_comanda.in_(em_andamento),),
+                ItemPedido: (ItemPedido.id_comanda.in_(em_andamento),),
+                Pagamento: (Pagamento.id_comanda.in_(em_andamento),),
+            }
+        else:
+            filtros = {modelo: (_carimbo(modelo) > cursor,) for modelo in (Mesa, Comanda, Pedido, ItemPedido, Pagamento)}
+
+        return {
+            "cursor": agora - timedelta(seconds=settings.SYNC_MARGEM_CURSOR_SEGUNDOS),
+            "completo": completo,
+            "mesas": self._linhas(db, Mesa, MesaSincronizacao, *filtros[Mesa]),
+            "comandas": self._linhas(db, Comanda, ComandaSincronizacao, *filtros[Comanda]),
+            "pedidos": self._linhas(db, Pedido, PedidoSincronizacao, *filtros[Pedido]),
+            "itens_pedido": self._linhas(db, ItemPedido, ItemPedidoSincronizacao, *filtros[ItemPedido]),
+            "pagamentos": self._linhas(db, Pagamento, PagamentoSincronizacao, *filtros[Pagamento]),
+        }
+
+
+sincronizador_offline = SincronizadorOffline()
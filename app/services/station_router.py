@@ -0,0 +1,318 @@
+"""
+Roteamento dos itens de pedido para as estações (cozinha, bar...) e fila
+priorizada de cada estação.
+
+Cada pedido novo é dividido pelos itens: a categoria do produto define a
+estação (KDS_ESTACOES; categorias sem regra vão para KDS_ESTACAO_PADRAO). Em
+cada estação os itens ficam num heap ordenado pelo horário em que o preparo
+deveria começar:
+
+    inicio = recebido_em + (maior preparo do pedido - preparo do item)
+             - KDS_PESO_ESPERA_MESA * espera da mesa
+
+Assim os itens demorados de um pedido começam antes e os rápidos são
+segurados para ficarem prontos juntos, e mesas que já esperam por itens
+anteriores passam à frente.
+
+O estado é mantido em memória por worker a partir dos eventos do canal de
+pedidos (RealtimeHub.observar) e recarregado do banco na inicialização; não
+há consultas ao banco por item roteado. Remoções são preguiçosas: o item sai
+do índice na hora e a entrada do heap é descartada quando chega ao topo.
+"""
+from asyncio.log import logger
+
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+from app.models.comanda import Comanda
+from app.models.pedido import ItemPedido, Pedido, StatusPedido
+from app.models.produto import Produto
+from app.schemas.evento_schemas import CANAL_PEDIDOS, Evento, TipoEvento
+
+fila_profundidade = Gauge("kds_fila_profundidade", "Itens abertos na fila da estação", ["estacao"])
+fila_espera = Gauge("kds_fila_espera_segundos", "Espera do item mais antigo da fila da estação", ["estacao"])
+itens_roteados = Counter("kds_itens_roteados_total", "Itens de pedido roteados para a estação", ["estacao"])
+
+# Status em que o item deixa a fila de produção
+STATUS_FORA_DA_FILA = {
+    StatusPedido.PRONTO_PARA_ENTREGA.value,
+    StatusPedido.ENTREGUE_NA_MESA.value,
+    StatusPedido.SAIU_PARA_ENTREGA_EXTERNA.value,
+    StatusPedido.ENTREGUE_CLIENTE_EXTERNO.value,
+    StatusPedido.CANCELADO.value,
+}
+# Saídas da fila que contam como preparo concluído (cancelamentos não entram nas estatísticas)
+STATUS_CONCLUIDO = STATUS_FORA_DA_FILA - {StatusPedido.CANCELADO.value}
+
+EstimadorPreparo = Callable[[Optional[str], Optional[str], str], float]
+ObservadorConclusao = Callable[["ItemFila", float], None]
+
+
+@dataclass
+class ItemFila:
+    id: UUID
+    id_pedido: UUID
+    id_mesa: Optional[UUID]
+    id_produto: Optional[str]
+    categoria: Optional[str]
+    quantidade: int
+    estacao: str
+    status: str
+    recebido_em: float
+    tempo_preparo: float
+    prioridade: float
+
+
+def preparo_por_categoria(id_produto: Optional[str], categoria: Optional[str], estacao: str) -> float:
+    """Estimativa padrão do tempo de preparo (segundos), pela categoria do produto."""
+    return float(settings.KDS_TEMPO_PREPARO_SEGUNDOS.get(categoria, settings.KDS_TEMPO_PREPARO_PADRAO))
+
+
+class FilaEstacao:
+    """Heap de (prioridade, sequência, id do item) com remoção preguiçosa."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._heap: List[Tuple[float, int, UUID]] = []
+        # Em ordem de chegada: o primeiro é o item mais antigo da estação
+        self.itens: Dict[UUID, ItemFila] = {}
+        self._sequencia = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.itens)
+
+    def inserir(self, item: ItemFila) -> None:
+        self.itens[item.id] = item
+        heapq.heappush(self._heap, (item.prioridade, next(self._sequencia), item.id))
+
+    def remover(self, id_item: UUID) -> Optional[ItemFila]:
+        item = self.itens.pop(id_item, None)
+        if item is not None:
+            self._limpar_topo()
+            if len(self._heap) > 2 * len(self.itens) + 64:
+                # Muitas entradas mortas no meio do heap: reconstrói em O(n)
+                self._heap = [entrada for entrada in self._heap if entrada[2] in self.itens]
+                heapq.heapify(self._heap)
+        return item
+
+    def _limpar_topo(self) -> None:
+        while self._heap and self._heap[0][2] not in self.itens:
+            heapq.heappop(self._heap)
+
+    def proximo(self) -> Optional[ItemFila]:
+        self._limpar_topo()
+        return self.itens[self._heap[0][2]] if self._heap else None
+
+    def ordenados(self, limite: Optional[int] = None) -> List[ItemFila]:
+        """
+        Itens abertos em ordem de prioridade (sem retirar da fila). Com limite,
+        percorre a árvore do heap a partir da raiz: O(limite · log limite) em vez
+        de ordenar a fila inteira.
+        """
+        if not limite:
+            return [self.itens[id_item] for _, _, id_item in sorted(self._heap) if id_item in self.itens]
+        heap = self._heap
+        resultado: List[ItemFila] = []
+        fronteira = [(heap[0], 0)] if heap else []
+        while fronteira and len(resultado) < limite:
+            (_, _, id_item), indice = heapq.heappop(fronteira)
+            item = self.itens.get(id_item)
+            if item is not None:
+                resultado.append(item)
+            for filho in (2 * indice + 1, 2 * indice + 2):
+                if filho < len(heap):
+                    heapq.heappush(fronteira, (heap[filho], filho))
+        return resultado
+
+    def espera_mais_antiga(self, agora: float) -> float:
+        primeiro = next(iter(self.itens.values()), None)
+        return max(agora - primeiro.recebido_em, 0.0) if primeiro else 0.0
+
+
+class RoteadorEstacoes:
+    def __init__(self, estimador: EstimadorPreparo = preparo_por_categoria, relogio: Callable[[], float] = time.time):
+        self.estimador = estimador
+        self._relogio = relogio
+        # Chamados com (item, concluído_em) quando um item sai da fila pronto
+        self.ao_concluir: List[ObservadorConclusao] = []
+        self.filas: Dict[str, FilaEstacao] = {nome: FilaEstacao(nome) for nome in settings.KDS_ESTACOES}
+        self._estacao_da_categoria: Dict[str, str] = {
+            categoria: estacao
+            for estacao, categorias in settings.KDS_ESTACOES.items()
+            for categoria in categorias
+        }
+        self._itens: Dict[UUID, ItemFila] = {}
+        self._itens_do_pedido: Dict[UUID, Set[UUID]] = {}
+        # Itens abertos por mesa (id -> recebido_em), para a espera da mesa
+        self._itens_da_mesa: Dict[UUID, Dict[UUID, float]] = {}
+
+    def estacao_da_categoria(self, categoria: Optional[str]) -> str:
+        return self._estacao_da_categoria.get(categoria, settings.KDS_ESTACAO_PADRAO)
+
+    def _fila(self, estacao: str) -> FilaEstacao:
+        fila = self.filas.get(estacao)
+        if fila is None:
+            fila = self.filas[estacao] = FilaEstacao(estacao)
+        return fila
+
+    def espera_da_mesa(self, id_mesa: Optional[UUID], agora: float) -> float:
+        """Há quanto tempo a mesa espera pelo item aberto mais antigo (0 se não espera)."""
+        abertos = self._itens_da_mesa.get(id_mesa) if id_mesa else None
+        return max(agora - min(abertos.values()), 0.0) if abertos else 0.0
+
+    # Roteamento
+
+    def rotear_pedido(
+            self, id_pedido: UUID, id_mesa: Optional[UUID], recebido_em: float, itens: Iterable[dict]
+    ) -> Dict[str, List[ItemFila]]:
+        """
+        Divide os itens de um pedido pelas estações e os enfileira. Cada item é
+        um dict com id, id_produto, categoria, quantidade e, opcionalmente, status.
+        Itens já enfileirados são ignorados (eventos repetidos ou recarga do banco).
+        """
+        novos = [item for item in itens if UUID(str(item["id"])) not in self._itens]
+        if not novos:
+            return {}
+        agora = self._relogio()
+        espera_mesa = self.espera_da_mesa(id_mesa, agora)
+        preparos = []
+        for item in novos:
+            estacao = self.estacao_da_categoria(item.get("categoria"))
+            preparo = self.estimador(item.get("id_produto"), item.get("categoria"), estacao)
+            preparos.append((estacao, preparo))
+        maior_preparo = max(preparo for _, preparo in preparos)
+
+        roteados: Dict[str, List[ItemFila]] = {}
+        for item, (estacao, preparo) in zip(novos, preparos):
+            item_fila = ItemFila(
+                id=UUID(str(item["id"])),
+                id_pedido=id_pedido,
+                id_mesa=id_mesa,
+                id_produto=item.get("id_produto"),
+                categoria=item.get("categoria"),
+                quantidade=int(item.get("quantidade") or 1),
+                estacao=estacao,
+                status=item.get("status") or StatusPedido.RECEBIDO.value,
+                recebido_em=recebido_em,
+                tempo_preparo=preparo,
+                prioridade=recebido_em + (maior_preparo - preparo) - settings.KDS_PESO_ESPERA_MESA * espera_mesa,
+            )
+            self._fila(estacao).inserir(item_fila)
+            self._itens[item_fila.id] = item_fila
+            self._itens_do_pedido.setdefault(id_pedido, set()).add(item_fila.id)
+            if id_mesa:
+                self._itens_da_mesa.setdefault(id_mesa, {})[item_fila.id] = recebido_em
+            roteados.setdefault(estacao, []).append(item_fila)
+            itens_roteados.inc(estacao=estacao)
+        return roteados
+
+    def _remover(self, id_item: UUID) -> Optional[ItemFila]:
+        item = self._itens.pop(id_item, None)
+        if item is None:
+            return None
+        self.filas[item.estacao].remover(id_item)
+        do_pedido = self._itens_do_pedido.get(item.id_pedido)
+        if do_pedido is not None:
+            do_pedido.discard(id_item)
+            if not do_pedido:
+                del self._itens_do_pedido[item.id_pedido]
+        da_mesa = self._itens_da_mesa.get(item.id_mesa) if item.id_mesa else None
+        if da_mesa is not None:
+            da_mesa.pop(id_item, None)
+            if not da_mesa:
+                del self._itens_da_mesa[item.id_mesa]
+        return item
+
+    def atualizar_item(self, id_item: UUID, status: Optional[str], em: Optional[float] = None) -> Optional[ItemFila]:
+        """Aplica o novo status de um item; itens prontos, entregues ou cancelados saem da fila."""
+        if status in STATUS_FORA_DA_FILA:
+            item = self._remover(id_item)
+            if item is not None and status in STATUS_CONCLUIDO:
+                concluido_em = em if em is not None else self._relogio()
+                for observador in self.ao_concluir:
+                    observador(item, concluido_em)
+            return item
+        item = self._itens.get(id_item)
+        if item is not None and status:
+            item.status = status
+        return item
+
+    def atualizar_pedido(self, id_pedido: UUID, status: Optional[str], em: Optional[float] = None) -> None:
+        """O status geral do pedido vale para todos os seus itens ainda abertos."""
+        for id_item in list(self._itens_do_pedido.get(id_pedido, ())):
+            self.atualizar_item(id_item, status, em)
+
+    def processar_evento(self, evento: Evento) -> None:
+        """Observador do RealtimeHub: mantém as filas a partir dos eventos de pedidos."""
+        if evento.canal != CANAL_PEDIDOS or evento.id_pedido is None:
+            return
+        if evento.tipo in (TipoEvento.PEDIDO_CRIADO, TipoEvento.ITEM_ADICIONADO) and evento.dados.get("itens"):
+            self.rotear_pedido(evento.id_pedido, evento.id_mesa, evento.timestamp.timestamp(), evento.dados["itens"])
+        elif evento.tipo == TipoEvento.ITEM_STATUS_ATUALIZADO and evento.id_item_pedido:
+            self.atualizar_item(evento.id_item_pedido, evento.status, evento.timestamp.timestamp())
+        elif evento.tipo == TipoEvento.PEDIDO_STATUS_ATUALIZADO:
+            self.atualizar_pedido(evento.id_pedido, evento.status, evento.timestamp.timestamp())
+
+    # Consulta
+
+    def fila(self, estacao: str, limite: Optional[int] = None) -> List[ItemFila]:
+        fila = self.filas.get(estacao)
+        return fila.ordenados(limite) if fila else []
+
+    def atualizar_metricas(self) -> Dict[str, Dict[str, float]]:
+        """Profundidade e espera de cada estação; também atualiza os gauges."""
+        agora = self._relogio()
+        resumo = {}
+        for nome, fila in self.filas.items():
+            espera = fila.espera_mais_antiga(agora)
+            fila_profundidade.set(len(fila), estacao=nome)
+            fila_espera.set(round(espera, 3), estacao=nome)
+            resumo[nome] = {
+                "profundidade": len(fila),
+                "em_preparo": sum(1 for item in fila.itens.values() if item.status == StatusPedido.EM_PREPARO.value),
+                "espera_segundos": round(espera, 3),
+            }
+        return resumo
+
+    # Carga inicial
+
+    def reconstruir(self, db: Session) -> None:
+        """Enfileira os itens ainda abertos dos pedidos em andamento, do mais antigo ao mais novo."""
+        linhas = (
+            db.query(ItemPedido.id, ItemPedido.id_pedido, ItemPedido.id_produto, ItemPedido.quantidade,
+                     ItemPedido.status_item_pedido, Produto.categoria, Pedido.data_criacao, Comanda.id_mesa)
+            .join(Pedido, ItemPedido.id_pedido == Pedido.id)
+            .join(Produto, ItemPedido.id_produto == Produto.id)
+            .outerjoin(Comanda, Pedido.id_comanda == Comanda.id)
+            .filter(ItemPedido.status_item_pedido.in_((StatusPedido.RECEBIDO, StatusPedido.EM_PREPARO)))
+            .order_by(Pedido.data_criacao.asc())
+            .all()
+        )
+        pedidos: Dict[UUID, Tuple[Optional[UUID], float, List[dict]]] = {}
+        for linha in linhas:
+            _, _, itens = pedidos.setdefault(
+                linha.id_pedido, (linha.id_mesa, linha.data_criacao.timestamp() if linha.data_criacao else self._relogio(), [])
+            )
+            itens.append({
+                "id": linha.id, "id_produto": str(linha.id_produto), "categoria": linha.categoria,
+                "quantidade": linha.quantidade, "status": getattr(linha.status_item_pedido, "value", None),
+            })
+        for id_pedido, (id_mesa, recebido_em, itens) in pedidos.items():
+            self.rotear_pedido(id_pedido, id_mesa, recebido_em, itens)
+        logger.info(f"Filas das estações carregadas com {len(self._itens)} itens abertos")
+
+    async def inicializar(self, db: AsyncSession) -> None:
+        """Carrega as filas na inicialização do worker."""
+        await db.run_sync(self.reconstruir)
+
+
+roteador_estacoes = RoteadorEstacoes()
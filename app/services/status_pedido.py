@@ -0,0 +1,37 @@
+"""
+Regras de status dos pedidos e itens, com os status do modelo (os gravados no
+banco). Usadas pelo CRUD, pelos endpoints de status e pelo lote.
+"""
+from typing import Optional
+
+from app.models.pedido import StatusPedido
+
+# Status em que o pedido não aparece mais nas telas de produção
+STATUS_PEDIDO_FINALIZADOS = (
+    StatusPedido.ENTREGUE_NA_MESA, StatusPedido.ENTREGUE_CLIENTE_EXTERNO, StatusPedido.CANCELADO
+)
+STATUS_PEDIDO_ENTREGUES = (StatusPedido.ENTREGUE_NA_MESA, StatusPedido.ENTREGUE_CLIENTE_EXTERNO)
+
+# Transições permitidas: as regras de PedidoService._validar_transicao_status (pedido
+# finalizado não muda; cada status só avança para os seguintes ou é cancelado),
+# escritas com os status do modelo
+TRANSICOES_STATUS_PERMITIDAS = {
+    StatusPedido.RECEBIDO: {StatusPedido.EM_PREPARO, StatusPedido.PRONTO_PARA_ENTREGA, StatusPedido.CANCELADO},
+    StatusPedido.EM_PREPARO: {
+        StatusPedido.PRONTO_PARA_ENTREGA, StatusPedido.ENTREGUE_NA_MESA,
+        StatusPedido.SAIU_PARA_ENTREGA_EXTERNA, StatusPedido.CANCELADO
+    },
+    StatusPedido.PRONTO_PARA_ENTREGA: {
+        StatusPedido.ENTREGUE_NA_MESA, StatusPedido.SAIU_PARA_ENTREGA_EXTERNA, StatusPedido.CANCELADO
+    },
+    StatusPedido.SAIU_PARA_ENTREGA_EXTERNA: {StatusPedido.ENTREGUE_CLIENTE_EXTERNO, StatusPedido.CANCELADO},
+}
+
+
+def validar_transicao_status(status_atual: StatusPedido, status_novo: StatusPedido) -> Optional[str]:
+    """Retorna a mensagem de erro se a transição não for permitida."""
+    if status_atual in STATUS_PEDIDO_FINALIZADOS:
+        return f"Já está {status_atual.value} e não pode ser alterado"
+    if status_novo not in TRANSICOES_STATUS_PERMITIDAS.get(status_atual, ()):
+        return f"Transição de {status_atual.value} para {status_novo.value} não permitida"
+    return None
@@ -0,0 +1,58 @@
+"""
+Custo de codificação/decodificação e tamanho na rede: JSON x formato binário de eventos.
+
+Uso: python -m benchmarks.event_encoding --repeticoes 20000
+"""
+import argparse
+import timeit
+import uuid
+
+from app.schemas.evento_schemas import Evento, TipoEvento
+from app.services.event_codec import codificar_binario, decodificar_binario
+
+
+def eventos_exemplo():
+    return {
+        "item (kds)": Evento(
+            tipo=TipoEvento.ITEM_STATUS_ATUALIZADO, id_pedido=uuid.uuid4(), id_item_pedido=uuid.uuid4(),
+            id_comanda=uuid.uuid4(), id_mesa=uuid.uuid4(), status="Em Preparo", categorias=["Pratos"]
+        ),
+        "pedido (kds)": Evento(
+            tipo=TipoEvento.PEDIDO_CRIADO, id_pedido=uuid.uuid4(), id_comanda=uuid.uuid4(),
+            id_mesa=uuid.uuid4(), status="Recebido", categorias=["Bebidas", "Porções"]
+        ),
+        "comanda (salão)": Evento(
+            tipo=TipoEvento.PAGAMENTO_REGISTRADO, canal="comandas_updates", id_comanda=uuid.uuid4(),
+            id_mesa=uuid.uuid4(), status="Paga Parcialmente",
+            dados={"valor_total_calculado": "182.50", "valor_pago": "100.00", "valor_fiado": "0"}
+        ),
+    }
+
+
+def medir(repeticoes: int) -> None:
+    print(f"{'evento':<18}{'formato':<10}{'bytes':>7}{'codificar µs':>15}{'decodificar µs':>17}")
+    for nome, evento in eventos_exemplo().items():
+        json_payload = evento.model_dump_json()
+        bin_payload = codificar_binario(evento)
+        assert decodificar_binario(bin_payload) == Evento.model_validate_json(json_payload)
+
+        casos = (
+            ("json", len(json_payload.encode()), evento.model_dump_json,
+             lambda: Evento.model_validate_json(json_payload)),
+            ("binario", len(bin_payload), lambda: codificar_binario(evento),
+             lambda: decodificar_binario(bin_payload)),
+        )
+        for formato, tamanho, codificar, decodificar in casos:
+            t_cod = timeit.timeit(codificar, number=repeticoes) / repeticoes * 1e6
+            t_dec = timeit.timeit(decodificar, number=repeticoes) / repeticoes * 1e6
+            print(f"{nome:<18}{formato:<10}{tamanho:>7}{t_cod:>15.2f}{t_dec:>17.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=20000)
+    medir(parser.parse_args().repeticoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Custo de assinar e verificar um access token: HS256 x ES256.
+
+"ES256 (cache)" é o caminho de app.core.jwt_keys (chave construída uma vez por
+kid); "ES256 (PEM)" reconstrói a chave a cada verificação, como acontece ao
+passar o PEM direto para jose.jwt.decode.
+
+Uso: python -m benchmarks.jwt_signing --repeticoes 2000
+"""
+import argparse
+import time
+import timeit
+import uuid
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwk, jwt
+
+
+def _claims() -> dict:
+    return {
+        "sub": "garcom@restaurante.com", "uid": str(uuid.uuid4()), "role": "waiter", "scopes": ["waiter"],
+        "su": False, "type": "access", "epc": 0, "exp": int(time.time()) + 3600,
+    }
+
+
+def medir(repeticoes: int) -> None:
+    privada = ec.generate_private_key(ec.SECP256R1())
+    pem_privada = privada.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    pem_publica = privada.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    chave_privada = jwk.construct(pem_privada, "ES256")
+    chave_publica = jwk.construct(pem_publica, "ES256")
+    segredo = "s" * 64
+    claims = _claims()
+
+    token_hs = jwt.encode(claims, segredo, algorithm="HS256")
+    token_es = jwt.encode(claims, chave_privada, algorithm="ES256", headers={"kid": "k1"})
+    casos = (
+        ("HS256", lambda: jwt.encode(claims, segredo, algorithm="HS256"),
+         lambda: jwt.decode(token_hs, segredo, algorithms=["HS256"]), len(token_hs)),
+        ("ES256 (cache)", lambda: jwt.encode(claims, chave_privada, algorithm="ES256", headers={"kid": "k1"}),
+         lambda: jwt.decode(token_es, chave_publica, algorithms=["ES256"]), len(token_es)),
+        ("ES256 (PEM)", lambda: jwt.encode(claims, pem_privada, algorithm="ES256", headers={"kid": "k1"}),
+         lambda: jwt.decode(token_es, pem_publica, algorithms=["ES256"]), len(token_es)),
+    )
+    print(f"{'algoritmo':<16}{'bytes':>7}{'assinar µs':>13}{'verificar µs':>15}{'verificações/s':>17}")
+    for nome, assinar, verificar, tamanho in casos:
+        t_assinar = timeit.timeit(assinar, number=repeticoes) / repeticoes * 1e6
+        t_verificar = timeit.timeit(verificar, number=repeticoes) / repeticoes * 1e6
+        print(f"{nome:<16}{tamanho:>7}{t_assinar:>13.1f}{t_verificar:>15.1f}{1e6 / t_verificar:>17,.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    medir(parser.parse_args().repeticoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Vazão do fan-out das telas da cozinha/bar (KDS) em uma máquina, sem servidor Redis.
+
+Publica eventos de pedido pelo broker em memória e mede quanto tempo o
+RealtimeHub leva para entregá-los a N telas conectadas, além da vazão da fila
+durável (streams com consumer group).
+
+Uso: python -m benchmarks.kds_fanout --telas 200 --eventos 5000
+"""
+import argparse
+import asyncio
+import time
+
+from app.schemas.evento_schemas import CANAL_PEDIDOS, Evento, TipoEvento
+from app.services.memory_broker import InMemoryRedisService
+from app.services.realtime import Assinatura, RealtimeHub
+
+
+async def medir_fanout(telas: int, eventos: int, lote: int) -> None:
+    broker = InMemoryRedisService()
+    hub = RealtimeHub(redis=broker)
+    assinaturas = [hub.assinar(Assinatura(CANAL_PEDIDOS, tamanho=eventos)) for _ in range(telas)]
+    await asyncio.sleep(0)  # deixa o hub se inscrever no broker
+
+    recebidos = 0
+    concluido = asyncio.Event()
+
+    async def tela(assinatura: Assinatura) -> None:
+        nonlocal recebidos
+        for _ in range(eventos):
+            await assinatura.fila.get()
+        recebidos += eventos
+        if recebidos == telas * eventos:
+            concluido.set()
+
+    consumidores = [asyncio.create_task(tela(a)) for a in assinaturas]
+    mensagem = Evento(tipo=TipoEvento.PEDIDO_CRIADO, categorias=["Pratos"]).model_dump_json()
+
+    inicio = time.perf_counter()
+    for i in range(0, eventos, lote):
+        await broker.publish_many([(CANAL_PEDIDOS, mensagem)] * min(lote, eventos - i))
+        await asyncio.sleep(0)
+    await concluido.wait()
+    duracao = time.perf_counter() - inicio
+
+    entregas = telas * eventos
+    descartados = sum(a.descartados for a in assinaturas)
+    print(f"fan-out: {telas} telas x {eventos} eventos = {entregas} entregas em {duracao:.3f}s "
+          f"({entregas / duracao:,.0f} entregas/s, {eventos / duracao:,.0f} eventos/s), descartados={descartados}")
+
+    for consumidor in consumidores:
+        consumidor.cancel()
+    await hub.parar()
+
+
+async def medir_stream(eventos: int, lote: int) -> None:
+    broker = InMemoryRedisService()
+    await broker.stream_group_create("kds:stream:cozinha", "kds")
+    campos = {"evento": Evento(tipo=TipoEvento.PEDIDO_CRIADO).model_dump_json()}
+
+    inicio = time.perf_counter()
+    for i in range(0, eventos, lote):
+        await broker.publish_many([], stream_entries=[("kds:stream:cozinha", campos)] * min(lote, eventos - i),
+                                  maxlen=eventos)
+    lidos = 0
+    while lidos < eventos:
+        entradas = await broker.stream_read_group("kds:stream:cozinha", "kds", "tela-1", count=lote)
+        await broker.stream_ack("kds:stream:cozinha", "kds", *(id_entrada for id_entrada, _ in entradas))
+        lidos += len(entradas)
+    duracao = time.perf_counter() - inicio
+    print(f"stream: {eventos} entradas gravadas, lidas e confirmadas em {duracao:.3f}s "
+          f"({eventos / duracao:,.0f} entradas/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--telas", type=int, default=100)
+    parser.add_argument("--eventos", type=int, default=2000)
+    parser.add_argument("--lote", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(medir_fanout(args.telas, args.eventos, args.lote))
+    asyncio.run(medir_stream(args.eventos, args.lote))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Custo do bcrypt por fator de custo e efeito de uma leva de logins no event loop.
+
+Para cada custo, mede o tempo de um hash e simula N logins simultâneos (troca de
+turno): verificação síncrona no loop x pool limitado de app.core.security. O
+"atraso máx. do loop" é o maior atraso de um tick de 5 ms agendado durante a leva;
+é o que as outras requisições (e telas em tempo real) sentem.
+
+Uso: python -m benchmarks.password_hashing --custos 10 11 12 13 --logins 40
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from passlib.context import CryptContext
+
+from app.core import security
+
+
+async def _atraso_maximo_do_loop(parar: asyncio.Event, atrasos: List[float]) -> None:
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.005)
+        atrasos.append(time.perf_counter() - inicio - 0.005)
+
+
+async def _leva_de_logins(contexto: CryptContext, hash_senha: str, logins: int, fora_do_loop: bool):
+    parar = asyncio.Event()
+    atrasos: List[float] = []
+    monitor = asyncio.create_task(_atraso_maximo_do_loop(parar, atrasos))
+    await asyncio.sleep(0.01)
+
+    async def login_no_loop() -> None:
+        contexto.verify("senha-do-turno", hash_senha)
+        await asyncio.sleep(0)
+
+    inicio = time.perf_counter()
+    if fora_do_loop:
+        # Mesmo caminho de security.verificar_senha, sem o rehash para o custo configurado
+        await asyncio.gather(*(
+            security._em_thread_bcrypt("verificar", contexto.verify, "senha-do-turno", hash_senha)
+            for _ in range(logins)
+        ))
+    else:
+        await asyncio.gather(*(login_no_loop() for _ in range(logins)))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    await monitor
+    return duracao, max(atrasos, default=0.0)
+
+
+def medir(custos: List[int], logins: int) -> None:
+    print(f"pool de bcrypt: {security.settings.SENHA_HASH_CONCORRENCIA} threads")
+    print(f"{'custo':>5}{'hash ms':>10}{'modo':>10}{'leva s':>9}{'atraso máx. do loop ms':>25}")
+    for custo in custos:
+        contexto = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=custo)
+        inicio = time.perf_counter()
+        hash_senha = contexto.hash("senha-do-turno")
+        t_hash = (time.perf_counter() - inicio) * 1000
+        for fora_do_loop in (False, True):
+            duracao, atraso = asyncio.run(_leva_de_logins(contexto, hash_senha, logins, fora_do_loop))
+            modo = "pool" if fora_do_loop else "no loop"
+            print(f"{custo:>5}{t_hash:>10.1f}{modo:>10}{duracao:>9.2f}{atraso * 1000:>25.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--custos", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--logins", type=int, default=40)
+    args = parser.parse_args()
+    medir(args.custos, args.logins)
+
+
+if __name__ == "__main__":
+    main()
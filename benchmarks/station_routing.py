@@ -0,0 +1,90 @@
+"""
+Custo do roteamento dos itens para as estações e da fila priorizada com
+milhares de itens abertos ao mesmo tempo.
+
+Cria pedidos (eventos PEDIDO_CRIADO, como chegam pelo RealtimeHub) distribuídos
+por mesas, consulta o topo das filas e depois conclui todos os itens por
+eventos de status, medindo cada fase.
+
+Uso: python -m benchmarks.station_routing --pedidos 5000 --mesas 80
+"""
+import argparse
+import random
+import time
+import uuid
+
+from app.core.config import settings
+from app.schemas.evento_schemas import Evento, TipoEvento
+from app.services.station_router import RoteadorEstacoes
+
+
+def eventos_de_pedidos(pedidos: int, mesas: int, semente: int):
+    aleatorio = random.Random(semente)
+    categorias = [categoria for lista in settings.KDS_ESTACOES.values() for categoria in lista]
+    ids_mesas = [uuid.uuid4() for _ in range(mesas)]
+    produtos = {categoria: [str(uuid.uuid4()) for _ in range(8)] for categoria in categorias}
+    eventos = []
+    for _ in range(pedidos):
+        itens = []
+        for _ in range(aleatorio.randint(1, 5)):
+            categoria = aleatorio.choice(categorias)
+            itens.append({
+                "id": str(uuid.uuid4()), "id_produto": aleatorio.choice(produtos[categoria]),
+                "categoria": categoria, "quantidade": aleatorio.randint(1, 3),
+            })
+        eventos.append(Evento(
+            tipo=TipoEvento.PEDIDO_CRIADO, id_pedido=uuid.uuid4(), id_comanda=uuid.uuid4(),
+            id_mesa=aleatorio.choice(ids_mesas), status="Recebido", dados={"itens": itens},
+        ))
+    return eventos
+
+
+def medir(pedidos: int, mesas: int, consultas: int) -> None:
+    roteador = RoteadorEstacoes()
+    eventos = eventos_de_pedidos(pedidos, mesas, semente=42)
+    total_itens = sum(len(evento.dados["itens"]) for evento in eventos)
+
+    inicio = time.perf_counter()
+    for evento in eventos:
+        roteador.processar_evento(evento)
+    duracao = time.perf_counter() - inicio
+    print(f"roteamento: {pedidos} pedidos / {total_itens} itens em {duracao:.3f}s "
+          f"({total_itens / duracao:,.0f} itens/s, {duracao / pedidos * 1e6:.1f} µs/pedido)")
+
+    for nome, resumo in roteador.atualizar_metricas().items():
+        print(f"  {nome:<10} profundidade={resumo['profundidade']:>6}")
+
+    inicio = time.perf_counter()
+    for i in range(consultas):
+        roteador.fila(list(roteador.filas)[i % len(roteador.filas)], 20)
+    duracao = time.perf_counter() - inicio
+    print(f"topo da fila (20 itens): {duracao / consultas * 1e6:.1f} µs/consulta")
+
+    # Conclui os itens na ordem da fila, como a cozinha faria, com eventos de item
+    conclusoes = []
+    for estacao in roteador.filas:
+        for item in roteador.fila(estacao):
+            conclusoes.append(Evento(
+                tipo=TipoEvento.ITEM_STATUS_ATUALIZADO, id_pedido=item.id_pedido,
+                id_item_pedido=item.id, status="Pronto para Entrega",
+            ))
+    inicio = time.perf_counter()
+    for evento in conclusoes:
+        roteador.processar_evento(evento)
+    duracao = time.perf_counter() - inicio
+    restantes = sum(len(fila) for fila in roteador.filas.values())
+    print(f"conclusão: {len(conclusoes)} itens em {duracao:.3f}s "
+          f"({len(conclusoes) / duracao:,.0f} itens/s), restantes={restantes}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=5000)
+    parser.add_argument("--mesas", type=int, default=80)
+    parser.add_argument("--consultas", type=int, default=2000)
+    args = parser.parse_args()
+    medir(args.pedidos, args.mesas, args.consultas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from app.core.circuit_breaker import CircuitBreaker, EstadoCircuito
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+def _circuito(relogio, limite_falhas=3, tempo_espera=10.0, prazo_sonda=5.0):
+    return CircuitBreaker(
+        "teste", limite_falhas=limite_falhas, tempo_espera=tempo_espera, prazo_sonda=prazo_sonda, relogio=relogio
+    )
+
+
+def test_abre_depois_do_limite_de_falhas_consecutivas():
+    circuito = _circuito(Relogio())
+    circuito.registrar_falha()
+    circuito.registrar_falha()
+    circuito.registrar_sucesso()  # sucesso zera a contagem
+    circuito.registrar_falha()
+    circuito.registrar_falha()
+    assert circuito.estado == EstadoCircuito.FECHADO
+    assert circuito.permite()
+
+    circuito.registrar_falha()
+    assert circuito.estado == EstadoCircuito.ABERTO
+    assert not circuito.permite()
+
+
+def test_semiaberto_libera_uma_sonda_e_fecha_com_sucesso():
+    relogio = Relogio()
+    circuito = _circuito(relogio, limite_falhas=1)
+    circuito.registrar_falha()
+    relogio.agora = 9.9
+    assert not circuito.permite()
+
+    relogio.agora = 10.0
+    assert circuito.permite()
+    assert circuito.estado == EstadoCircuito.SEMIABERTO
+    assert not circuito.permite()  # só uma sonda por vez
+
+    circuito.registrar_sucesso()
+    assert circuito.estado == EstadoCircuito.FECHADO
+    assert circuito.permite()
+
+
+def test_falha_da_sonda_reabre_por_mais_um_periodo():
+    relogio = Relogio()
+    circuito = _circuito(relogio, limite_falhas=2)
+    circuito.registrar_falha()
+    circuito.registrar_falha()
+    relogio.agora = 10.0
+    assert circuito.permite()
+
+    circuito.registrar_falha()  # no semiaberto, uma falha basta
+    assert circuito.estado == EstadoCircuito.ABERTO
+    relogio.agora = 19.9
+    assert not circuito.permite()
+    relogio.agora = 20.0
+    assert circuito.permite()
+
+
+def test_sonda_sem_resultado_conta_como_falha_depois_do_prazo():
+    relogio = Relogio()
+    circuito = _circuito(relogio, limite_falhas=1)
+    circuito.registrar_falha()
+    relogio.agora = 10.0
+    assert circuito.permite()  # sonda cancelada ou que retornou cedo: nem sucesso nem falha
+
+    relogio.agora = 14.9
+    assert not circuito.permite()
+    assert circuito.estado == EstadoCircuito.SEMIABERTO
+
+    relogio.agora = 15.0
+    assert not circuito.permite()
+    assert circuito.estado == EstadoCircuito.ABERTO
+
+    relogio.agora = 25.0
+    assert circuito.permite()  # nova sonda depois de mais um período
+    circuito.registrar_sucesso()
+    assert circuito.estado == EstadoCircuito.FECHADO
@@ -0,0 +1,82 @@
+import os
+import uuid
+from decimal import Decimal
+
+import pytest
+
+if not os.environ.get("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL não configurada", allow_module_level=True)
+crud_pedido = pytest.importorskip("app.crud.crud_pedido").crud_pedido
+
+from app.models.comanda import Comanda
+from app.models.mesa import Mesa
+from app.models.pedido import ItemPedido, Pedido, StatusPedido
+from app.models.produto import Produto
+
+
+def _pedido(db, status=StatusPedido.RECEBIDO, itens=1):
+    mesa = Mesa(numero_identificador=f"M{uuid.uuid4().hex[:6]}")
+    produto = Produto(nome="Prato", preco_unitario=Decimal("10.00"), categoria="Pratos")
+    db.add_all([mesa, produto])
+    db.flush()
+    comanda = Comanda(id_mesa=mesa.id)
+    db.add(comanda)
+    db.flush()
+    pedido = Pedido(id_comanda=comanda.id, status_geral_pedido=status)
+    db.add(pedido)
+    db.flush()
+    for _ in range(itens):
+        db.add(ItemPedido(
+            id_pedido=pedido.id, id_comanda=comanda.id, id_produto=produto.id, quantidade=1,
+            preco_unitario_no_momento=Decimal("10.00"), preco_total_item=Decimal("10.00"), status_item_pedido=status
+        ))
+    db.commit()
+    return pedido
+
+
+def test_lote_rejeita_transicoes_invalidas_sem_impedir_as_demais(db):
+    valido = _pedido(db)
+    entregue = _pedido(db, status=StatusPedido.ENTREGUE_NA_MESA)
+    inexistente = uuid.uuid4()
+
+    resultado = crud_pedido.update_status_lote(db, pedidos={
+        valido.id: StatusPedido.EM_PREPARO,
+        entregue.id: StatusPedido.EM_PREPARO,
+        inexistente: StatusPedido.EM_PREPARO,
+    }, itens={})
+
+    assert [entrada["id"] for entrada in resultado["atualizados"]] == [valido.id]
+    rejeitados = {entrada["id"]: entrada["erro"] for entrada in resultado["rejeitados"]}
+    assert set(rejeitados) == {entregue.id, inexistente}
+    assert "não pode ser alterado" in rejeitados[entregue.id]
+    db.expire_all()
+    assert db.get(Pedido, valido.id).status_geral_pedido == StatusPedido.EM_PREPARO
+    assert all(item.status_item_pedido == StatusPedido.EM_PREPARO for item in db.get(Pedido, valido.id).itens)
+    assert db.get(Pedido, entregue.id).status_geral_pedido == StatusPedido.ENTREGUE_NA_MESA
+
+
+def test_lote_mesmo_status_e_item_do_pedido_no_lote(db):
+    pedido = _pedido(db, itens=2)
+    outro = _pedido(db)
+    item_do_pedido = pedido.itens[0].id
+    item_de_outro = outro.itens[0].id
+
+    resultado = crud_pedido.update_status_lote(db, pedidos={pedido.id: StatusPedido.EM_PREPARO}, itens={
+        item_do_pedido: StatusPedido.PRONTO_PARA_ENTREGA,
+        item_de_outro: StatusPedido.RECEBIDO,
+    })
+
+    assert [(entrada["tipo"], entrada["id"]) for entrada in resultado["atualizados"]] == [("pedido", pedido.id)]
+    rejeitados = {entrada["id"]: entrada["erro"] for entrada in resultado["rejeitados"]}
+    # Repetir o status atual não é erro nem atualização; item cujo pedido está no lote é recusado
+    assert list(rejeitados) == [item_do_pedido]
+    assert rejeitados[item_do_pedido] == "O pedido do item está no mesmo lote"
+
+
+def test_status_unico_recebido_para_em_preparo(db):
+    pedido = _pedido(db, itens=2)
+
+    atualizado = crud_pedido.update_status_geral(db, pedido_id=pedido.id, novo_status=StatusPedido.EM_PREPARO)
+
+    assert atualizado.status_geral_pedido == StatusPedido.EM_PREPARO
+    assert all(item.status_item_pedido == StatusPedido.EM_PREPARO for item in atualizado.itens)
@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+
+from app.schemas.evento_schemas import CANAL_COMANDAS, CANAL_MESAS, CANAL_PEDIDOS, Evento, TipoEvento
+from app.services.event_bus import EventBus, coalescer_eventos
+
+
+class RedisFalso:
+    """Guarda cada pipeline publicado em vez de enviar ao Redis."""
+
+    def __init__(self):
+        self.pipelines = []
+
+    async def publish_many(self, mensagens, stream_entries=None, maxlen=None):
+        self.pipelines.append(mensagens)
+        return True
+
+
+def _mesa(id_mesa, status, **dados):
+    return Evento(tipo=TipoEvento.MESA_ATUALIZADA, canal=CANAL_MESAS, id_mesa=id_mesa, status=status, dados=dados)
+
+
+def test_duas_atualizacoes_da_mesma_mesa_viram_uma_mensagem():
+    redis = RedisFalso()
+    bus = EventBus(redis=redis, coalescer=True)
+    mesa = uuid.uuid4()
+
+    ok = asyncio.run(bus.publicar_lote([_mesa(mesa, "Ocupada"), _mesa(mesa, "Disponível")]))
+
+    assert ok
+    assert len(redis.pipelines) == 1
+    [(canal, _)] = redis.pipelines[0]
+    assert canal == CANAL_MESAS
+
+
+def test_ultimo_estado_prevalece_e_tipo_especifico_e_preservado():
+    comanda, mesa = uuid.uuid4(), uuid.uuid4()
+    pagamento = Evento(
+        tipo=TipoEvento.PAGAMENTO_REGISTRADO, canal=CANAL_COMANDAS, id_comanda=comanda, id_mesa=mesa,
+        status="Paga Parcialmente", dados={"valor_pago": "10.00", "metodo_pagamento": "Dinheiro"}
+    )
+    atualizada = Evento(
+        tipo=TipoEvento.COMANDA_ATUALIZADA, canal=CANAL_COMANDAS, id_comanda=comanda, id_mesa=mesa,
+        status="Paga Totalmente", dados={"valor_pago": "30.00"}
+    )
+    pedido = Evento(tipo=TipoEvento.PEDIDO_CRIADO, canal=CANAL_PEDIDOS, id_pedido=uuid.uuid4(), id_comanda=comanda)
+
+    resultado = coalescer_eventos([pagamento, pedido, atualizada])
+
+    assert [evento.tipo for evento in resultado] == [TipoEvento.PEDIDO_CRIADO, TipoEvento.PAGAMENTO_REGISTRADO]
+    mesclado = resultado[1]
+    assert mesclado.status == "Paga Totalmente"
+    assert mesclado.dados == {"valor_pago": "30.00", "metodo_pagamento": "Dinheiro"}
+
+
+def test_entidades_diferentes_e_eventos_da_cozinha_nao_sao_mesclados():
+    eventos = [
+        _mesa(uuid.uuid4(), "Ocupada"),
+        _mesa(uuid.uuid4(), "Ocupada"),
+        Evento(tipo=TipoEvento.PEDIDO_CRIADO, canal=CANAL_PEDIDOS, id_pedido=uuid.uuid4()),
+        Evento(tipo=TipoEvento.PEDIDO_CRIADO, canal=CANAL_PEDIDOS, id_pedido=uuid.uuid4()),
+    ]
+
+    assert coalescer_eventos(eventos) == eventos
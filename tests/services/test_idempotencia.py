@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+from app.core import security
+from app.core.config import settings
+from app.services.idempotencia import ArmazenamentoIdempotencia, IdempotenciaMiddleware
+from app.services.memory_broker import InMemoryRedisService
+
+ROTA = f"{settings.API_V1_STR}/pedidos"
+
+
+class Endpoint:
+    """App ASGI de teste: conta as execuções e responde com o status configurado."""
+
+    def __init__(self, status: int = 201, liberar: asyncio.Event = None):
+        self.status = status
+        self.liberar = liberar
+        self.execucoes = 0
+
+    async def __call__(self, scope, receive, send):
+        await receive()
+        self.execucoes += 1
+        if self.liberar is not None:
+            await self.liberar.wait()
+        corpo = json.dumps({"execucao": self.execucoes}).encode()
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": corpo})
+
+
+async def _requisicao(middleware, corpo=b'{"id_comanda": "1"}', token=None, chave=b"chave-1"):
+    headers = [(b"idempotency-key", chave)]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    scope = {"type": "http", "method": "POST", "path": ROTA, "query_string": b"", "headers": headers}
+    mensagens = []
+
+    async def receive():
+        return {"type": "http.request", "body": corpo, "more_body": False}
+
+    async def send(mensagem):
+        mensagens.append(mensagem)
+
+    await middleware(scope, receive, send)
+    inicio = mensagens[0]
+    return inicio["status"], dict(inicio["headers"]), b"".join(m.get("body", b"") for m in mensagens[1:])
+
+
+async def _preparar(endpoint: Endpoint) -> IdempotenciaMiddleware:
+    redis = InMemoryRedisService()
+    await redis.connect()
+    return IdempotenciaMiddleware(endpoint, armazenamento=ArmazenamentoIdempotencia(redis=redis))
+
+
+def test_repeticao_devolve_a_resposta_gravada_sem_executar_de_novo():
+    async def cenario():
+        endpoint = Endpoint()
+        middleware = await _preparar(endpoint)
+        token = security.create_access_token("garcom@bar.com")
+        primeira = await _requisicao(middleware, token=token)
+        segunda = await _requisicao(middleware, token=token)
+        return endpoint, primeira, segunda
+
+    endpoint, (status1, headers1, corpo1), (status2, headers2, corpo2) = asyncio.run(cenario())
+    assert endpoint.execucoes == 1
+    assert (status1, corpo1) == (status2, corpo2) == (201, b'{"execucao": 1}')
+    assert b"idempotent-replayed" not in headers1
+    assert headers2[b"idempotent-replayed"] == b"true"
+
+
+def test_mesma_chave_com_outro_corpo_responde_422():
+    async def cenario():
+        endpoint = Endpoint()
+        middleware = await _preparar(endpoint)
+        token = security.create_access_token("garcom@bar.com")
+        await _requisicao(middleware, token=token)
+        return endpoint, await _requisicao(middleware, corpo=b'{"id_comanda": "2"}', token=token)
+
+    endpoint, (status, _, _) = asyncio.run(cenario())
+    assert status == 422
+    assert endpoint.execucoes == 1
+
+
+def test_repeticao_durante_a_execucao_responde_409_apos_a_espera(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCIA_ESPERA_MAX_SEGUNDOS", 0.05)
+
+    async def cenario():
+        liberar = asyncio.Event()
+        endpoint = Endpoint(liberar=liberar)
+        middleware = await _preparar(endpoint)
+        token = security.create_access_token("garcom@bar.com")
+        primeira = asyncio.create_task(_requisicao(middleware, token=token))
+        await asyncio.sleep(0.01)
+        repeticao = await _requisicao(middleware, token=token)
+        liberar.set()
+        return endpoint, await primeira, repeticao
+
+    endpoint, (status1, _, _), (status2, headers2, _) = asyncio.run(cenario())
+    assert status1 == 201
+    assert status2 == 409
+    assert headers2[b"retry-after"] == b"1"
+    assert endpoint.execucoes == 1
+
+
+def test_chaves_sao_separadas_por_usuario():
+    async def cenario():
+        endpoint = Endpoint()
+        middleware = await _preparar(endpoint)
+        await _requisicao(middleware, token=security.create_access_token("garcom@bar.com"))
+        await _requisicao(middleware, token=security.create_access_token("caixa@bar.com"))
+        return endpoint
+
+    assert asyncio.run(cenario()).execucoes == 2
+
+
+def test_sem_access_token_valido_nada_e_reservado():
+    async def cenario():
+        endpoint = Endpoint(status=401)
+        middleware = await _preparar(endpoint)
+        refresh = security.create_refresh_token("garcom@bar.com", jti="j1", familia="f1")
+        respostas = [
+            await _requisicao(middleware),
+            await _requisicao(middleware, token="invalido"),
+            await _requisicao(middleware, token=refresh),
+        ]
+        return endpoint, middleware, respostas
+
+    endpoint, middleware, respostas = asyncio.run(cenario())
+    assert [status for status, _, _ in respostas] == [401, 401, 401]
+    assert endpoint.execucoes == 3
+    assert not middleware.armazenamento.redis._valores
+
+
+def test_respostas_401_e_403_nao_sao_gravadas():
+    async def cenario():
+        endpoint = Endpoint(status=403)
+        middleware = await _preparar(endpoint)
+        token = security.create_access_token("garcom@bar.com")
+        await _requisicao(middleware, token=token)
+        endpoint.status = 201
+        return endpoint, await _requisicao(middleware, token=token)
+
+    endpoint, (status, headers, _) = asyncio.run(cenario())
+    assert status == 201
+    assert b"idempotent-replayed" not in headers
+    assert endpoint.execucoes == 2
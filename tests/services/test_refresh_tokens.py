@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.services.memory_broker import InMemoryRedisService
+from app.services.refresh_tokens import RefreshTokenStore, SessaoInvalida, SessoesIndisponiveis
+
+
+def _store() -> RefreshTokenStore:
+    redis = InMemoryRedisService()
+    asyncio.run(redis.connect())
+    return RefreshTokenStore(redis=redis)
+
+
+def test_rotacao_emite_novo_par_da_mesma_familia():
+    store = _store()
+
+    async def cenario():
+        _, refresh = await store.emitir("garcom@bar.com")
+        _, novo_refresh = await store.rotacionar(refresh)
+        return store._decodificar(refresh), store._decodificar(novo_refresh)
+
+    antigo, novo = asyncio.run(cenario())
+    assert novo["fam"] == antigo["fam"]
+    assert novo["jti"] != antigo["jti"]
+
+
+def test_reuso_do_refresh_token_revoga_a_familia():
+    store = _store()
+
+    async def cenario():
+        _, refresh = await store.emitir("garcom@bar.com")
+        _, refresh_legitimo = await store.rotacionar(refresh)
+        with pytest.raises(SessaoInvalida, match="já utilizado"):
+            await store.rotacionar(refresh)
+        # Quem tem o token legítimo da família também perde a sessão
+        with pytest.raises(SessaoInvalida, match="revogada"):
+            await store.rotacionar(refresh_legitimo)
+        # Outras famílias do usuário (outros dispositivos) seguem valendo
+        _, outro_dispositivo = await store.emitir("garcom@bar.com")
+        await store.rotacionar(outro_dispositivo)
+
+    asyncio.run(cenario())
+
+
+def test_sem_epoca_no_redis_nao_emite_tokens():
+    store = _store()
+
+    async def cenario():
+        await store.redis.disconnect()
+        with pytest.raises(SessoesIndisponiveis):
+            await store.emitir("garcom@bar.com")
+
+    asyncio.run(cenario())
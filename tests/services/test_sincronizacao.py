@@ -0,0 +1,101 @@
+import os
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+if not os.environ.get("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL não configurada", allow_module_level=True)
+sincronizacao = pytest.importorskip("app.services.sincronizacao")
+
+from app.models.comanda import Comanda
+from app.models.mesa import Mesa, StatusMesa
+from app.models.pedido import ItemPedido, Pedido
+from app.models.produto import Produto
+from app.models.usuario import Usuario
+from app.schemas.sincronizacao_schemas import SincronizacaoRequest
+from app.schemas.token_schemas import UsuarioToken
+
+APLICADA, REJEITADA, REPETIDA = sincronizacao.APLICADA, sincronizacao.REJEITADA, sincronizacao.REPETIDA
+sincronizador_offline = sincronizacao.sincronizador_offline
+
+
+def _salao(db):
+    mesa = Mesa(numero_identificador="M1")
+    reservada = Mesa(numero_identificador="M2", status=StatusMesa.RESERVADA)
+    produto = Produto(nome="Prato", preco_unitario=Decimal("10.00"), categoria="Pratos")
+    usuario = Usuario(email="garcom@bar.com", hashed_password="x")
+    db.add_all([mesa, reservada, produto, usuario])
+    db.commit()
+    garcom = UsuarioToken(id=usuario.id, email=usuario.email, papel="waiter", escopos=["waiter"])
+    return mesa, reservada, produto, garcom
+
+
+def _operacoes(*operacoes):
+    return SincronizacaoRequest.model_validate({"operacoes": list(operacoes)}).operacoes
+
+
+def _contar(db, modelo):
+    return db.scalar(select(func.count(modelo.id)))
+
+
+def test_lote_reenviado_volta_como_repetida_sem_duplicar(db):
+    mesa, _, produto, garcom = _salao(db)
+    comanda, pedido, item = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    operacoes = _operacoes(
+        {"tipo": "abrir_mesa", "id": str(comanda), "id_mesa": str(mesa.id)},
+        {"tipo": "criar_pedido", "id": str(pedido), "id_comanda": str(comanda),
+         "itens": [{"id": str(item), "id_produto": str(produto.id), "quantidade": 2}]},
+    )
+
+    primeira = sincronizador_offline.aplicar(db, operacoes, garcom)
+    reenvio = sincronizador_offline.aplicar(db, operacoes, garcom)
+
+    assert [r["resultado"] for r in primeira] == [APLICADA, APLICADA]
+    assert [r["resultado"] for r in reenvio] == [REPETIDA, REPETIDA]
+    assert [r["id"] for r in reenvio] == [comanda, pedido]
+    assert (_contar(db, Comanda), _contar(db, Pedido), _contar(db, ItemPedido)) == (1, 1, 1)
+
+
+def test_operacoes_que_dependem_de_uma_rejeitada_sao_rejeitadas(db):
+    mesa, reservada, produto, garcom = _salao(db)
+    rejeitada, dependente, neta, valida = uuid.uuid4(), uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    operacoes = _operacoes(
+        {"tipo": "abrir_mesa", "id": str(rejeitada), "id_mesa": str(reservada.id)},
+        {"tipo": "criar_pedido", "id": str(dependente), "id_comanda": str(rejeitada),
+         "itens": [{"id_produto": str(produto.id)}]},
+        {"tipo": "adicionar_item", "id": str(neta), "id_pedido": str(dependente), "id_produto": str(produto.id)},
+        {"tipo": "abrir_mesa", "id": str(valida), "id_mesa": str(mesa.id)},
+        {"tipo": "registrar_pagamento", "id": str(uuid.uuid4()), "id_comanda": str(valida),
+         "valor_pago": "10.00", "metodo_pagamento": "Dinheiro"},
+    )
+
+    resultados = sincronizador_offline.aplicar(db, operacoes, garcom)
+
+    assert [r["resultado"] for r in resultados] == [REJEITADA, REJEITADA, REJEITADA, APLICADA, REJEITADA]
+    assert "reservada" in resultados[0]["erro"].lower()
+    assert str(rejeitada) in resultados[1]["erro"]
+    assert str(dependente) in resultados[2]["erro"]
+    assert "cashier" in resultados[4]["erro"]
+    assert _contar(db, Comanda) == 1
+    assert _contar(db, Pedido) == 0
+
+
+def test_mesa_ja_aberta_reaproveita_a_comanda_ativa(db):
+    mesa, _, produto, garcom = _salao(db)
+    ativa = Comanda(id_mesa=mesa.id)
+    db.add(ativa)
+    db.commit()
+    comanda_do_tablet, pedido = uuid.uuid4(), uuid.uuid4()
+    operacoes = _operacoes(
+        {"tipo": "abrir_mesa", "id": str(comanda_do_tablet), "id_mesa": str(mesa.id)},
+        {"tipo": "criar_pedido", "id": str(pedido), "id_comanda": str(comanda_do_tablet),
+         "itens": [{"id_produto": str(produto.id)}]},
+    )
+
+    resultados = sincronizador_offline.aplicar(db, operacoes, garcom)
+
+    assert [r["resultado"] for r in resultados] == [APLICADA, APLICADA]
+    assert resultados[0]["id"] == ativa.id
+    assert db.get(Pedido, pedido).id_comanda == ativa.id
@@ -0,0 +1,37 @@
+import pytest
+
+from app.models.pedido import StatusPedido
+from app.services.status_pedido import TRANSICOES_STATUS_PERMITIDAS, validar_transicao_status
+
+
+@pytest.mark.parametrize("atual, novo", [
+    (StatusPedido.RECEBIDO, StatusPedido.EM_PREPARO),
+    (StatusPedido.RECEBIDO, StatusPedido.CANCELADO),
+    (StatusPedido.EM_PREPARO, StatusPedido.PRONTO_PARA_ENTREGA),
+    (StatusPedido.PRONTO_PARA_ENTREGA, StatusPedido.ENTREGUE_NA_MESA),
+    (StatusPedido.SAIU_PARA_ENTREGA_EXTERNA, StatusPedido.ENTREGUE_CLIENTE_EXTERNO),
+])
+def test_transicao_permitida(atual, novo):
+    assert validar_transicao_status(atual, novo) is None
+
+
+@pytest.mark.parametrize("atual, novo", [
+    (StatusPedido.EM_PREPARO, StatusPedido.RECEBIDO),
+    (StatusPedido.PRONTO_PARA_ENTREGA, StatusPedido.EM_PREPARO),
+    (StatusPedido.RECEBIDO, StatusPedido.ENTREGUE_CLIENTE_EXTERNO),
+])
+def test_transicao_nao_permitida(atual, novo):
+    assert "não permitida" in validar_transicao_status(atual, novo)
+
+
+@pytest.mark.parametrize("finalizado", [
+    StatusPedido.ENTREGUE_NA_MESA, StatusPedido.ENTREGUE_CLIENTE_EXTERNO, StatusPedido.CANCELADO
+])
+def test_status_finalizado_nao_muda(finalizado):
+    assert "não pode ser alterado" in validar_transicao_status(finalizado, StatusPedido.EM_PREPARO)
+
+
+def test_tabela_usa_os_status_do_modelo():
+    for atual, seguintes in TRANSICOES_STATUS_PERMITIDAS.items():
+        assert isinstance(atual, StatusPedido)
+        assert all(isinstance(status, StatusPedido) for status in seguintes)